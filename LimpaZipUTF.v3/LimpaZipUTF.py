@@ -11,11 +11,42 @@ Nome obrigatório: LimpaZipUTF
 
 import os
 import shutil
+import hashlib
+import json
+import re
+import fnmatch
+import configparser
+import copy
+import tempfile
 from pathlib import Path
-from typing import Set, Dict, List
+from typing import Set, Dict, List, Iterator, Iterable, Tuple, Optional, Callable
 import zipfile
 import subprocess
 import sys
+import errno
+import time
+import threading
+import queue
+import bisect
+import mmap
+import zlib
+import select
+import signal
+import struct
+import functools
+import abc
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+# Opcionais: se instalados, .7z e .rar são lidos sem abrir outro processo
+try:
+    import py7zr
+except ImportError:
+    py7zr = None
+
+try:
+    import rarfile
+except ImportError:
+    rarfile = None
 
 
 # Extensões de arquivos que Vamos MANTER e EXTRAIR
@@ -79,26 +110,1229 @@ ARQUIVO_ORGANIZADOR = 'LimpaZipUTF.py'
 # você pode mudar o nome se quiser
 PASTA_ZIPS = 'ZIPS'
 
+# Pasta (dentro da raiz) onde ficam os índices do LimpaZipUTF
+# Ela nunca é varrida, movida ou organizada
+PASTA_ESTADO = '.limpazip'
+
+# Tamanho do buffer reaproveitado ao descompactar ZIPs (1 MB)
+# A memória usada não depende do tamanho do arquivo compactado
+TAMANHO_BUFFER_ZIP = 1024 * 1024
+
+#Uma regra da política de limpeza, lida da seção [politica] do .config:
+#  caches_grandes = remover *.cache tamanho>50MB
+#  logs_velhos = remover *.log idade>30d
+#  sempre_pdf = manter *.pdf
+#Sem padrão, vale para qualquer nome. Todos os critérios precisam bater.
+class RegraPolitica:
+    __slots__ = ('nome', 'acao', '_padrao', 'tamanho_min', 'tamanho_max', 'idade_min', 'idade_max')
+
+    UNIDADES_TAMANHO = {'b': 1, 'kb': 1024, 'mb': 1024 ** 2, 'gb': 1024 ** 3}
+    UNIDADES_IDADE = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+    def __init__(self, nome: str, texto: str):
+        self.nome = nome
+        self.tamanho_min = self.tamanho_max = None
+        self.idade_min = self.idade_max = None
+        palavras = texto.split()
+        if not palavras or palavras[0].lower() not in ('remover', 'manter'):
+            raise ValueError(f"Regra '{nome}': deve começar com 'remover' ou 'manter'")
+        self.acao = palavras[0].lower()
+
+        padroes = []
+        for palavra in palavras[1:]:
+            criterio = re.fullmatch(r'(tamanho|idade)([<>])(\d+(?:\.\d+)?)([a-zA-Z]*)', palavra)
+            if criterio is None:
+                padroes.append(palavra.lower())
+                continue
+            campo, sinal, numero, unidade = criterio.groups()
+            unidades = self.UNIDADES_TAMANHO if campo == 'tamanho' else self.UNIDADES_IDADE
+            unidade = unidade.lower() or ('b' if campo == 'tamanho' else 'd')
+            if unidade not in unidades:
+                raise ValueError(f"Regra '{nome}': unidade desconhecida em '{palavra}'")
+            valor = float(numero) * unidades[unidade]
+            setattr(self, f"{campo}_{'min' if sinal == '>' else 'max'}", valor)
+        self._padrao = re.compile('|'.join(fnmatch.translate(padrao) for padrao in padroes)) if padroes else None
+
+    @property
+    def usa_stat(self) -> bool:
+        return not (self.tamanho_min is None and self.tamanho_max is None and
+                    self.idade_min is None and self.idade_max is None)
+
+    def corresponde(self, nome_minusculo: str, tamanho: Optional[int], mtime: Optional[float]) -> bool:
+        # Critério sem o dado necessário (ex.: idade de um membro sem data) não bate
+        if self._padrao is not None and not self._padrao.match(nome_minusculo):
+            return False
+        if self.tamanho_min is not None or self.tamanho_max is not None:
+            if tamanho is None:
+                return False
+            if self.tamanho_min is not None and tamanho <= self.tamanho_min:
+                return False
+            if self.tamanho_max is not None and tamanho >= self.tamanho_max:
+                return False
+        if self.idade_min is not None or self.idade_max is not None:
+            if mtime is None:
+                return False
+            idade = time.time() - mtime
+            if self.idade_min is not None and idade <= self.idade_min:
+                return False
+            if self.idade_max is not None and idade >= self.idade_max:
+                return False
+        return True
+
+
+#Seleção de membros dos compactados: só o que for de uma das categorias
+#OU casar com um dos padrões glob (testado no nome e no caminho do membro).
+class SeletorMembros:
+    def __init__(self, categorias: Optional[List[str]] = None, padroes: Optional[List[str]] = None):
+        self.categorias = frozenset(categorias or ())
+        self.padroes = list(padroes or [])
+        self._padrao = None
+        if self.padroes:
+            self._padrao = re.compile('|'.join(fnmatch.translate(padrao.lower()) for padrao in self.padroes))
+
+    def vazio(self) -> bool:
+        return not self.categorias and self._padrao is None
+
+    def aceita(self, nome_membro: str, categoria: Optional[str]) -> bool:
+        if self.vazio():
+            return True
+        if categoria is not None and categoria in self.categorias:
+            return True
+        if self._padrao is not None:
+            nome_minusculo = nome_membro.replace('\\', '/').lower()
+            return bool(self._padrao.match(nome_minusculo) or self._padrao.match(nome_minusculo.rsplit('/', 1)[-1]))
+        return False
+
+
+class Regras:
+    """
+    Regras de limpeza/organização compiladas UMA vez em tabelas planas.
+    Cada arquivo é classificado com consultas O(1) a um único dicionário
+    (nome em minúsculas → lixo, extensão → categoria), sem percorrer listas.
+    """
+
+    def __init__(self, categorias: Dict[str, Set[str]], nomes_remover: Set[str],
+                 padroes_remover: Optional[List[str]] = None,
+                 tamanho_minimo_bytes: Optional[int] = None, tamanho_maximo_mb: Optional[float] = None,
+                 politica: Optional[List[RegraPolitica]] = None, manter_mais_recente: bool = False):
+        self.categorias = list(categorias)
+        self.extensoes_por_categoria = {categoria: set(extensoes) for categoria, extensoes in categorias.items()}
+
+        # Tabela única: chaves '.ext' apontam para a categoria; nomes de lixo apontam para None
+        self._tabela: Dict[str, Optional[str]] = {}
+        for categoria, extensoes in categorias.items():
+            for extensao in extensoes:
+                self._tabela.setdefault(extensao.lower(), categoria)
+        self.extensoes_permitidas = frozenset(self._tabela)
+        for nome in nomes_remover:
+            self._tabela[nome.lower()] = None
+        self.nomes_remover = frozenset(nome.lower() for nome in nomes_remover)
+
+        # Todos os padrões glob viram UMA expressão regular
+        self.padroes_remover = list(padroes_remover or [])
+        self._padroes = None
+        if self.padroes_remover:
+            self._padroes = re.compile('|'.join(fnmatch.translate(padrao.lower()) for padrao in self.padroes_remover))
+
+        self.tamanho_minimo = tamanho_minimo_bytes
+        self.tamanho_maximo = int(tamanho_maximo_mb * 1024 * 1024) if tamanho_maximo_mb else None
+        self.usa_tamanho = self.tamanho_minimo is not None or self.tamanho_maximo is not None
+
+        # Política: a primeira regra que bate decide; sem nenhuma, valem as regras acima
+        self.politica = list(politica or [])
+        self.manter_mais_recente = manter_mais_recente
+        # Precisa do stat (um só, do DirEntry da varredura) para classificar?
+        self.usa_stat = self.usa_tamanho or any(regra.usa_stat for regra in self.politica)
+
+        # Extração seletiva: quais membros dos compactados são extraídos (None = todos os úteis)
+        self.selecao: Optional[SeletorMembros] = None
+
+    def com_selecao(self, selecao: SeletorMembros) -> 'Regras':
+        """Cópia destas regras que só extrai dos compactados os membros escolhidos."""
+        regras = copy.copy(self)
+        regras.selecao = selecao
+        return regras
+
+    def manter_membro(self, nome_membro: str, tamanho: Optional[int] = None, mtime: Optional[float] = None) -> bool:
+        """Se um membro de compactado deve ser extraído (útil e, havendo seleção, escolhido)."""
+        nome = nome_membro.replace('\\', '/').rsplit('/', 1)[-1]
+        categoria = self.classificar(nome, tamanho, mtime)
+        if categoria is None:
+            return False
+        if self.selecao is None or os.path.splitext(nome)[1].lower() in {'.zip', '.rar', '.7z'}:
+            # Compactados internos sempre passam: --varrer-zips ainda procura dentro deles
+            return True
+        return self.selecao.aceita(nome_membro, self.categoria(nome))
+
+    def categoria(self, nome: str) -> Optional[str]:
+        """Categoria só pela extensão (None se a extensão não é permitida)."""
+        return self._tabela.get(os.path.splitext(nome)[1].lower())
+
+    def classificar(self, nome: str, tamanho: Optional[int] = None, mtime: Optional[float] = None) -> Optional[str]:
+        """Devolve a categoria se o arquivo deve ser mantido, ou None se é lixo."""
+        return self.avaliar(nome, tamanho, mtime)[0]
+
+    def avaliar(self, nome: str, tamanho: Optional[int] = None,
+                mtime: Optional[float] = None) -> Tuple[Optional[str], Optional[str]]:
+        """Como classificar, mas também devolve o nome da regra da política que decidiu (ou None)."""
+        nome_minusculo = nome.lower()
+        for regra in self.politica:
+            if regra.corresponde(nome_minusculo, tamanho, mtime):
+                if regra.acao == 'remover':
+                    return None, regra.nome
+                return self._tabela.get(os.path.splitext(nome_minusculo)[1]) or 'Outros', regra.nome
+        return self._classificar_nome(nome_minusculo, tamanho), None
+
+    def _classificar_nome(self, nome_minusculo: str, tamanho: Optional[int]) -> Optional[str]:
+        if nome_minusculo in self.nomes_remover:
+            return None
+        if self._padroes is not None and self._padroes.match(nome_minusculo):
+            return None
+        if tamanho is not None:
+            if self.tamanho_minimo is not None and tamanho < self.tamanho_minimo:
+                return None
+            if self.tamanho_maximo is not None and tamanho > self.tamanho_maximo:
+                return None
+        return self._tabela.get(os.path.splitext(nome_minusculo)[1])
+
+
+# Regras embutidas no script (as listas lá em cima)
+REGRAS_PADRAO = Regras(CATEGORIAS_EXTENSOES, ARQUIVOS_PARA_REMOVER)
+
+#Carrega regras de um arquivo .config (formato INI). Exemplo:
+#  [categorias]
+#  Documentos = .pdf .doc .docx
+#  Código = .java .py
+#  [remover]
+#  nomes = thumbs.db desktop.ini
+#  padroes = *.tmp ~$*
+#  [limites]
+#  tamanho_minimo_bytes = 1
+#  tamanho_maximo_mb = 500
+#  [politica]
+#  caches_grandes = remover *.cache tamanho>50MB
+#  manter_mais_recente = sim
+#Seções ausentes usam as listas embutidas no script.
+def carregar_regras(caminho: Optional[str] = None) -> Regras:
+    """
+    Args:
+        caminho: Caminho do arquivo .config (None = regras embutidas)
+
+    Returns:
+        Regras compiladas
+    """
+    if caminho is None:
+        return REGRAS_PADRAO
+
+    if not os.path.isfile(caminho):
+        raise ValueError(f"Arquivo de regras não encontrado: {caminho}")
+
+    config = configparser.ConfigParser()
+    config.optionxform = str  # mantém 'Código' com maiúscula
+    config.read(caminho, encoding='utf-8')
+
+    categorias = CATEGORIAS_EXTENSOES
+    if config.has_section('categorias'):
+        categorias = {categoria: {extensao.lower() if extensao.startswith('.') else f".{extensao.lower()}"
+                                  for extensao in valor.split()}
+                      for categoria, valor in config.items('categorias')}
+        # Compactados sempre são mantidos (é deles que sai o conteúdo de ZIPS)
+        cobertas = set().union(*categorias.values()) if categorias else set()
+        faltando = {'.zip', '.rar', '.7z'} - cobertas
+        if faltando:
+            categorias.setdefault('Compactados', set()).update(faltando)
+
+    nomes = ARQUIVOS_PARA_REMOVER
+    padroes = []
+    if config.has_section('remover'):
+        nomes = set(config.get('remover', 'nomes', fallback=' '.join(sorted(ARQUIVOS_PARA_REMOVER))).split())
+        padroes = config.get('remover', 'padroes', fallback='').split()
+
+    minimo = config.getint('limites', 'tamanho_minimo_bytes', fallback=None)
+    maximo = config.getfloat('limites', 'tamanho_maximo_mb', fallback=None)
+
+    politica = []
+    mais_recente = False
+    if config.has_section('politica'):
+        for nome, valor in config.items('politica'):
+            if nome == 'manter_mais_recente':
+                mais_recente = config.getboolean('politica', nome)
+            else:
+                politica.append(RegraPolitica(nome, valor))
+
+    return Regras(categorias, nomes, padroes, minimo, maximo, politica, mais_recente)
+
+# Instrumentação: tempo e quantidade de cada operação (varredura, classificação,
+# stat, mover, remover, rmdir, extração) e histogramas de latência de movimentos e
+# extrações. Desligada por padrão: desligada, cada ponto medido custa uma chamada.
+LIMITES_HISTOGRAMA = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 60)
+
+class _CronometroNulo:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *erro):
+        return False
+
+_CRONOMETRO_NULO = _CronometroNulo()
+
+class _Cronometro:
+    __slots__ = ('metricas', 'nome', 'histograma', 'inicio')
+
+    def __init__(self, metricas: 'Metricas', nome: str, histograma: bool):
+        self.metricas = metricas
+        self.nome = nome
+        self.histograma = histograma
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *erro):
+        self.metricas.observar(self.nome, time.perf_counter() - self.inicio, self.histograma)
+        return False
+
+class Metricas:
+    """Contadores, tempos acumulados e histogramas por operação (seguro entre threads)."""
+
+    def __init__(self):
+        self.ativo = False
+        self._trava = threading.Lock()
+        self.zerar()
+
+    def zerar(self):
+        self.contadores: Dict[str, int] = {}
+        self.segundos: Dict[str, float] = {}
+        self.histogramas: Dict[str, List[int]] = {}
+
+    def cronometro(self, nome: str, histograma: bool = False):
+        if not self.ativo:
+            return _CRONOMETRO_NULO
+        return _Cronometro(self, nome, histograma)
+
+    def contar(self, nome: str, quantidade: int = 1):
+        if self.ativo:
+            with self._trava:
+                self.contadores[nome] = self.contadores.get(nome, 0) + quantidade
+
+    def observar(self, nome: str, segundos: float, histograma: bool = False):
+        with self._trava:
+            self.contadores[nome] = self.contadores.get(nome, 0) + 1
+            self.segundos[nome] = self.segundos.get(nome, 0.0) + segundos
+            if histograma:
+                baldes = self.histogramas.get(nome)
+                if baldes is None:
+                    baldes = self.histogramas[nome] = [0] * (len(LIMITES_HISTOGRAMA) + 1)
+                baldes[bisect.bisect_left(LIMITES_HISTOGRAMA, segundos)] += 1
+
+    def instantaneo(self) -> dict:
+        with self._trava:
+            return {
+                'contadores': dict(self.contadores),
+                'segundos': dict(self.segundos),
+                'histogramas': {nome: list(baldes) for nome, baldes in self.histogramas.items()},
+            }
+
+    # Junta as medidas feitas em outro processo (pool de descompactação)
+    def mesclar(self, dados: dict):
+        with self._trava:
+            for nome, valor in dados['contadores'].items():
+                self.contadores[nome] = self.contadores.get(nome, 0) + valor
+            for nome, valor in dados['segundos'].items():
+                self.segundos[nome] = self.segundos.get(nome, 0.0) + valor
+            for nome, baldes in dados['histogramas'].items():
+                atuais = self.histogramas.setdefault(nome, [0] * len(baldes))
+                for i, valor in enumerate(baldes):
+                    atuais[i] += valor
+
+    def exportar_json(self) -> str:
+        dados = self.instantaneo()
+        dados['histogramas'] = {
+            nome: {'limites_s': list(LIMITES_HISTOGRAMA) + ['+Inf'], 'baldes': baldes}
+            for nome, baldes in dados['histogramas'].items()
+        }
+        return json.dumps(dados, indent=2, ensure_ascii=False)
+
+    # Formato "textfile" do Prometheus (node_exporter --collector.textfile)
+    def exportar_prometheus(self) -> str:
+        dados = self.instantaneo()
+        linhas = [
+            '# HELP limpazip_operacoes_total Quantidade de operações por tipo',
+            '# TYPE limpazip_operacoes_total counter',
+        ]
+        linhas += [f'limpazip_operacoes_total{{operacao="{nome}"}} {valor}'
+                   for nome, valor in sorted(dados['contadores'].items())]
+        linhas += [
+            '# HELP limpazip_segundos_total Tempo total gasto em cada tipo de operação',
+            '# TYPE limpazip_segundos_total counter',
+        ]
+        linhas += [f'limpazip_segundos_total{{operacao="{nome}"}} {valor:.6f}'
+                   for nome, valor in sorted(dados['segundos'].items())]
+        if dados['histogramas']:
+            linhas += [
+                '# HELP limpazip_latencia_segundos Latência de cada operação individual',
+                '# TYPE limpazip_latencia_segundos histogram',
+            ]
+        for nome, baldes in sorted(dados['histogramas'].items()):
+            acumulado = 0
+            for limite, valor in zip(list(LIMITES_HISTOGRAMA) + ['+Inf'], baldes):
+                acumulado += valor
+                linhas.append(f'limpazip_latencia_segundos_bucket{{operacao="{nome}",le="{limite}"}} {acumulado}')
+            linhas.append(f'limpazip_latencia_segundos_sum{{operacao="{nome}"}} {dados["segundos"].get(nome, 0.0):.6f}')
+            linhas.append(f'limpazip_latencia_segundos_count{{operacao="{nome}"}} {acumulado}')
+        return '\n'.join(linhas) + '\n'
+
+    def salvar(self, caminho: str):
+        """Grava em Prometheus se o arquivo terminar em .prom, senão em JSON."""
+        texto = self.exportar_prometheus() if caminho.endswith('.prom') else self.exportar_json()
+        temporario = caminho + '.tmp'
+        with open(temporario, 'w', encoding='utf-8') as f:
+            f.write(texto)
+        os.replace(temporario, caminho)
+
+METRICAS = Metricas()
+
+# Decorador: mede o tempo de cada chamada da função como a operação `nome`
+def _medido(nome: str, histograma: bool = False):
+    def decorador(funcao):
+        @functools.wraps(funcao)
+        def medida(*args, **kwargs):
+            with METRICAS.cronometro(nome, histograma):
+                return funcao(*args, **kwargs)
+        return medida
+    return decorador
+
 # Verifica se um arquivo deve ser mantido
-def deve_manter_arquivo(caminho: Path) -> bool:
-    if caminho.name.lower() in ARQUIVOS_PARA_REMOVER:
+def deve_manter_arquivo(caminho: Path, regras: Optional[Regras] = None) -> bool:
+    return _deve_manter_nome(caminho.name, regras)
+
+# Mesma regra, mas a partir só do nome (evita criar um Path por arquivo)
+def _deve_manter_nome(nome: str, regras: Optional[Regras] = None) -> bool:
+    return (regras or REGRAS_PADRAO).classificar(nome) is not None
+
+# Caminho relativo à raiz sem criar objetos Path (muito mais barato que relative_to)
+def _relativo(caminho: str, raiz_str: str) -> str:
+    prefixo = os.path.join(raiz_str, '')
+    if caminho.startswith(prefixo):
+        return caminho[len(prefixo):]
+    return os.path.relpath(caminho, raiz_str)
+
+
+# Lista UMA pasta com os.scandir, separando subpastas do resto.
+# Os DirEntry guardam tipo (e no Windows também o stat) sem syscalls extras.
+@_medido('varredura')
+def _listar_pasta(caminho: str) -> Tuple[List[os.DirEntry], List[str]]:
+    arquivos = []
+    subpastas = []
+    try:
+        with os.scandir(caminho) as it:
+            for entrada in it:
+                try:
+                    # Não segue links simbólicos de pastas (igual ao rglob)
+                    if entrada.is_dir(follow_symlinks=False):
+                        subpastas.append(entrada.path)
+                    else:
+                        arquivos.append(entrada)
+                except OSError:
+                    arquivos.append(entrada)
+    except OSError as e:
+        print(f"⚠️  Erro ao listar {caminho}: {e}")
+    # Ordem por nome (e não a do sistema de arquivos): a varredura serial e a
+    # paralela geram a mesma sequência, e os nomes de colisão na raiz não mudam
+    arquivos.sort(key=lambda entrada: entrada.name)
+    subpastas.sort()
+    METRICAS.contar('arquivos_varridos', len(arquivos))
+    return arquivos, subpastas
+
+
+#Percorre a árvore UMA única vez, em pós-ordem, usando os.scandir.
+#Gera ('arquivo', DirEntry) para cada entrada que não é pasta e
+#('pasta', caminho) quando todo o conteúdo da pasta já foi gerado.
+def percorrer_arvore(pasta_raiz: str, ignorar: Set[str] = frozenset(), varredores: int = 1,
+                     contagens: Optional[Dict[str, int]] = None) -> Iterator[Tuple[str, object]]:
+    """
+    Args:
+        pasta_raiz: Caminho da pasta raiz (a raiz não gera evento 'pasta')
+        ignorar: Nomes de subpastas da raiz que não devem ser percorridas
+        varredores: Threads listando pastas ao mesmo tempo (1 = serial).
+            A sequência gerada é a mesma nos dois casos
+        contagens: Se informado, recebe pasta → quantidade de entradas listadas nela,
+            antes do primeiro evento de dentro da pasta. Quem consome desconta o que
+            tirar de lá e sabe se a pasta ficou vazia sem listá-la de novo
+
+    Returns:
+        Iterador de tuplas (tipo, valor)
+    """
+    pasta_raiz = str(pasta_raiz)
+    arquivos, subpastas = _listar_pasta(pasta_raiz)
+    if ignorar:
+        subpastas = [caminho for caminho in subpastas if os.path.basename(caminho) not in ignorar]
+    if contagens is not None:
+        contagens[pasta_raiz] = len(arquivos) + len(subpastas)
+    if varredores > 1 and subpastas:
+        yield from _percorrer_em_paralelo(pasta_raiz, arquivos, subpastas, varredores, contagens)
+        return
+    for entrada in arquivos:
+        yield 'arquivo', entrada
+
+    # Pilha explícita: sem recursão, funciona com árvores muito profundas
+    pilha = [(pasta_raiz, iter(subpastas))]
+    while pilha:
+        caminho, pendentes = pilha[-1]
+        proxima = next(pendentes, None)
+        if proxima is None:
+            pilha.pop()
+            if pilha:
+                yield 'pasta', caminho
+            continue
+
+        arquivos, subpastas = _listar_pasta(proxima)
+        if contagens is not None:
+            contagens[proxima] = len(arquivos) + len(subpastas)
+        for entrada in arquivos:
+            yield 'arquivo', entrada
+        pilha.append((proxima, iter(subpastas)))
+
+#Versão paralela de percorrer_arvore: as listagens das próximas pastas (na
+#ordem da varredura serial) são antecipadas num pool de threads. A latência de
+#metadados (NFS/SMB, disco giratório) se sobrepõe e os eventos saem na mesma
+#ordem da varredura serial. A memória fica limitada por pasta, não por
+#subárvore: no máximo LISTAGENS_ANTECIPADAS × varredores listagens esperando.
+LISTAGENS_ANTECIPADAS = 4
+
+def _percorrer_em_paralelo(pasta_raiz: str, arquivos: List[os.DirEntry], subpastas: List[str],
+                           varredores: int, contagens: Optional[Dict[str, int]] = None) -> Iterator[Tuple[str, object]]:
+    limite = varredores * LISTAGENS_ANTECIPADAS
+    futuros = {}
+    # [pasta, subpastas dela, índice da próxima subpasta a entrar]
+    pilha = [[pasta_raiz, subpastas, 0]]
+
+    with ThreadPoolExecutor(max_workers=varredores) as pool:
+        # Dispara as próximas listagens: primeiro as subpastas da pasta mais funda
+        # (as próximas da varredura), depois as irmãs pendentes dos níveis de cima
+        def antecipar():
+            for _, pendentes, indice in reversed(pilha[-limite:]):
+                for caminho in pendentes[indice:indice + limite]:
+                    if len(futuros) >= limite:
+                        return
+                    if caminho not in futuros:
+                        futuros[caminho] = pool.submit(_listar_pasta, caminho)
+
+        try:
+            antecipar()
+            for entrada in arquivos:
+                yield 'arquivo', entrada
+
+            while pilha:
+                topo = pilha[-1]
+                caminho, pendentes, indice = topo
+                if indice >= len(pendentes):
+                    pilha.pop()
+                    if pilha:
+                        yield 'pasta', caminho
+                    continue
+
+                proxima = pendentes[indice]
+                topo[2] += 1
+                futuro = futuros.pop(proxima, None)
+                arquivos_proxima, subpastas_proxima = futuro.result() if futuro is not None else _listar_pasta(proxima)
+                if contagens is not None:
+                    contagens[proxima] = len(arquivos_proxima) + len(subpastas_proxima)
+                pilha.append([proxima, subpastas_proxima, 0])
+                antecipar()
+                for entrada in arquivos_proxima:
+                    yield 'arquivo', entrada
+        finally:
+            # Varredura abandonada no meio: o que nem começou não roda mais
+            for futuro in futuros.values():
+                futuro.cancel()
+
+# Calcula o SHA-256 de um arquivo (ou só dos primeiros `limite` bytes)
+def _hash_arquivo(caminho: str, limite: Optional[int] = None) -> str:
+    h = hashlib.sha256()
+    restante = limite
+    with open(caminho, 'rb') as f:
+        while restante is None or restante > 0:
+            bloco = f.read(TAMANHO_BUFFER_ZIP if restante is None else min(TAMANHO_BUFFER_ZIP, restante))
+            if not bloco:
+                break
+            h.update(bloco)
+            if restante is not None:
+                restante -= len(bloco)
+    return h.hexdigest()
+
+
+# Nome que ainda não existe na pasta: nome, nome_copia, nome_copia2, nome_copia3...
+# `reservados` guarda nomes já prometidos (necessário na simulação, onde nada é movido)
+def _nome_livre(pasta: Path, nome: str, reservados: Optional[Set[str]] = None) -> str:
+    base, extensao = os.path.splitext(nome)
+    candidato = nome
+    contador = 1
+    while (reservados is not None and candidato in reservados) or (pasta / candidato).exists():
+        candidato = f"{base}_copia{extensao}" if contador == 1 else f"{base}_copia{contador}{extensao}"
+        contador += 1
+    if reservados is not None:
+        reservados.add(candidato)
+    return candidato
+
+
+class IndiceConteudo:
+    """
+    Índice persistente do conteúdo dos arquivos já organizados, usado para deduplicar:
+    os da raiz e os do primeiro nível de `pastas` (as categorias e ZIPS, para onde
+    a organização leva tudo). As chaves são caminhos relativos com '/'.
+    Comparação em três etapas: tamanho → hash dos primeiros 64 KB → hash completo.
+    Os hashes ficam salvos em .limpazip/indice_conteudo.json e só são recalculados
+    quando o tamanho ou a data de modificação do arquivo mudam (um arquivo que a
+    organização só mudou de pasta leva os hashes junto).
+    """
+
+    TAMANHO_BLOCO_PARCIAL = 64 * 1024
+
+    def __init__(self, pasta_raiz: Path, pastas: Iterable[str] = ()):
+        self.pasta_raiz = Path(pasta_raiz)
+        self.caminho = self.pasta_raiz / PASTA_ESTADO / 'indice_conteudo.json'
+        self.entradas: Dict[str, dict] = {}
+        self.por_tamanho: Dict[int, Set[str]] = {}
+
+        salvas = {}
+        if self.caminho.exists():
+            try:
+                with open(self.caminho, 'r', encoding='utf-8') as f:
+                    salvas = json.load(f).get('arquivos', {})
+            except (OSError, ValueError):
+                salvas = {}
+        # Mesmo nome, tamanho e mtime em outra pasta: foi só movido (ex: raiz → Documentos)
+        movidas = {(chave.rsplit('/', 1)[-1], antiga.get('tamanho'), antiga.get('mtime_ns')): antiga
+                   for chave, antiga in salvas.items()}
+
+        # Sincroniza com o que existe agora (hashes antigos só valem se nada mudou)
+        for prefixo in [''] + [f"{pasta}/" for pasta in pastas]:
+            try:
+                with os.scandir(self.pasta_raiz / prefixo) as it:
+                    entradas = [entrada for entrada in it if entrada.is_file()]
+            except OSError:
+                continue  # categoria ainda não criada
+            for entrada in entradas:
+                chave = prefixo + entrada.name
+                st = entrada.stat()
+                antiga = salvas.get(chave)
+                if not antiga or antiga.get('tamanho') != st.st_size or antiga.get('mtime_ns') != st.st_mtime_ns:
+                    antiga = movidas.get((entrada.name, st.st_size, st.st_mtime_ns))
+                self.adicionar(chave, st)
+                if antiga:
+                    self.entradas[chave]['parcial'] = antiga.get('parcial')
+                    self.entradas[chave]['completo'] = antiga.get('completo')
+
+    def adicionar(self, nome: str, st: os.stat_result, caminho_atual: Optional[str] = None):
+        """Registra `nome` (relativo à raiz). Na simulação o conteúdo ainda está em `caminho_atual`."""
+        self.entradas[nome] = {'tamanho': st.st_size, 'mtime_ns': st.st_mtime_ns, 'parcial': None, 'completo': None}
+        if caminho_atual is not None:
+            self.entradas[nome]['caminho'] = caminho_atual
+        self.por_tamanho.setdefault(st.st_size, set()).add(nome)
+
+    def descartar(self, nome: str) -> Optional[dict]:
+        """Tira `nome` do índice (o arquivo vai sair de onde estava) e devolve a entrada dele."""
+        entrada = self.entradas.pop(nome, None)
+        if entrada is not None:
+            self.por_tamanho.get(entrada['tamanho'], set()).discard(nome)
+        return entrada
+
+    def _hash(self, nome: str, tipo: str) -> str:
+        entrada = self.entradas[nome]
+        if entrada[tipo] is None:
+            limite = self.TAMANHO_BLOCO_PARCIAL if tipo == 'parcial' else None
+            entrada[tipo] = _hash_arquivo(entrada.get('caminho') or str(self.pasta_raiz / nome), limite)
+        return entrada[tipo]
+
+    def procurar_duplicado(self, caminho: str, st: os.stat_result) -> Optional[str]:
+        """Devolve o caminho relativo do arquivo indexado com conteúdo idêntico, ou None."""
+        candidatos = self.por_tamanho.get(st.st_size)
+        if not candidatos:
+            return None
+
+        parcial = _hash_arquivo(caminho, self.TAMANHO_BLOCO_PARCIAL)
+        completo = parcial if st.st_size <= self.TAMANHO_BLOCO_PARCIAL else None
+        for nome in sorted(candidatos):
+            try:
+                if self._hash(nome, 'parcial') != parcial:
+                    continue
+                if completo is None:
+                    completo = _hash_arquivo(caminho)
+                if self._hash(nome, 'completo' if st.st_size > self.TAMANHO_BLOCO_PARCIAL else 'parcial') == completo:
+                    return nome
+            except OSError:
+                continue
+        return None
+
+    def salvar(self):
+        self.caminho.parent.mkdir(exist_ok=True)
+        temporario = self.caminho.with_suffix('.tmp')
+        with open(temporario, 'w', encoding='utf-8') as f:
+            json.dump({'versao': 1, 'arquivos': self.entradas}, f, separators=(',', ':'))
+        os.replace(str(temporario), str(self.caminho))
+
+
+class Manifesto:
+    """
+    Registro persistente do que já foi processado, em .limpazip/manifesto.json.
+    Guarda, por caminho relativo, tamanho, mtime e SHA-256 do conteúdo, e os
+    compactados já descompactados. Em uma nova execução os arquivos inalterados
+    são pulados sem nenhum trabalho além do stat (o hash só é calculado uma vez,
+    quando o arquivo é registrado pela primeira vez ou depois de mudar).
+    """
+
+    def __init__(self, pasta_raiz: Path):
+        self.pasta_raiz = Path(pasta_raiz)
+        self.caminho = self.pasta_raiz / PASTA_ESTADO / 'manifesto.json'
+        self.arquivos: Dict[str, list] = {}
+        self.compactados: Dict[str, list] = {}
+        self.alterado = False
+        self._vistos: Set[str] = set()
+        self._trava = threading.Lock()  # o modo pipeline registra de várias threads
+
+        if self.caminho.exists():
+            try:
+                with open(self.caminho, 'r', encoding='utf-8') as f:
+                    dados = json.load(f)
+                self.arquivos = dados.get('arquivos', {})
+                self.compactados = dados.get('compactados', {})
+            except (OSError, ValueError):
+                print(f"⚠️  Manifesto ilegível, começando do zero: {self.caminho}")
+
+    @staticmethod
+    def _chave(relativo: str) -> str:
+        # Sempre com '/', para o mesmo manifesto servir no Windows e no Linux
+        return relativo.replace(os.sep, '/')
+
+    def inalterado(self, relativo: str, st: os.stat_result, marcar: bool = True) -> bool:
+        """Com `marcar=False` só consulta (ex: na estimativa), sem contar como visto."""
+        chave = self._chave(relativo)
+        registro = self.arquivos.get(chave)
+        if registro is not None and registro[0] == st.st_size and registro[1] == st.st_mtime_ns:
+            if marcar:
+                self._vistos.add(chave)
+            return True
+        return False
+
+    def registrar(self, relativo: str, st: os.stat_result, hash_conteudo: Optional[str] = None):
+        """Registra um arquivo; sem `hash_conteudo`, reaproveita o anterior (se nada mudou) ou calcula."""
+        chave = self._chave(relativo)
+        if hash_conteudo is None:
+            anterior = self.arquivos.get(chave)
+            if anterior is not None and anterior[:2] == [st.st_size, st.st_mtime_ns] and anterior[2]:
+                hash_conteudo = anterior[2]
+            else:
+                # Fora da trava: no modo pipeline várias threads registram ao mesmo tempo
+                try:
+                    with METRICAS.cronometro('hash_manifesto'):
+                        hash_conteudo = _hash_arquivo(str(self.pasta_raiz / relativo))
+                except OSError:
+                    hash_conteudo = None
+        with self._trava:
+            self.arquivos[chave] = [st.st_size, st.st_mtime_ns, hash_conteudo]
+            self._vistos.add(chave)
+            self.alterado = True
+
+    def registrar_pasta(self, pasta: Path):
+        """Registra todos os arquivos de uma pasta (ex: um _quak recém descompactado)."""
+        raiz_str = str(self.pasta_raiz)
+        for tipo, valor in percorrer_arvore(str(pasta)):
+            if tipo == 'arquivo' and valor.is_file():
+                self.registrar(_relativo(valor.path, raiz_str), valor.stat())
+
+    def compactado_extraido(self, nome: str, st: os.stat_result) -> bool:
+        registro = self.compactados.get(nome)
+        return registro is not None and registro == [st.st_size, st.st_mtime_ns]
+
+    def registrar_compactado(self, nome: str, st: os.stat_result):
+        with self._trava:
+            self.compactados[nome] = [st.st_size, st.st_mtime_ns]
+            self.alterado = True
+
+    def descartar_nao_vistos(self, nao_percorridas: Iterable[str] = ()):
+        """
+        Depois de uma varredura: esquece arquivos que não existem mais. Só o que a
+        varredura percorreu conta; as entradas dentro de `nao_percorridas` (subpastas
+        da raiz que ela pulou) não foram vistas, mas não somem por isso.
+        """
+        puladas = set(nao_percorridas)
+        for chave in [chave for chave in self.arquivos if chave not in self._vistos]:
+            if '/' in chave and chave.split('/', 1)[0] in puladas:
+                continue
+            del self.arquivos[chave]
+            self.alterado = True
+
+    def salvar(self):
+        if not self.alterado:
+            return
+        self.caminho.parent.mkdir(exist_ok=True)
+        temporario = self.caminho.with_suffix('.tmp')
+        with open(temporario, 'w', encoding='utf-8') as f:
+            json.dump({'versao': 1, 'arquivos': self.arquivos, 'compactados': self.compactados},
+                      f, separators=(',', ':'))
+        os.replace(str(temporario), str(self.caminho))
+        self.alterado = False
+
+
+class Plano:
+    """
+    Plano de operações serializado em JSON Lines (uma operação por linha).
+    As operações são gravadas em streaming, sem guardar o plano na memória:
+      {"op":"mover","de":"Aula 1/a.pdf","para":"a.pdf"}
+      {"op":"remover","de":"Cache/thumbs.db","bytes":1234}
+      {"op":"vincular","de":"b/a.pdf","para":"a_copia.pdf","original":"a.pdf"}
+      {"op":"extrair","de":"p.zip","para":"ZIPS/p_quak"}
+      {"op":"rmdir","de":"Aula 1"}
+    Caminhos são relativos à raiz e sempre usam '/'.
+    """
+
+    VERSAO = 1
+
+    def __init__(self, caminho: str, pasta_raiz: Path):
+        self.caminho = caminho
+        self.total = 0
+        # Nomes que as operações deixam na raiz (dict: ordem de chegada, sem repetir)
+        self.nomes_na_raiz: Dict[str, None] = {}
+        self._arquivo = open(caminho, 'w', encoding='utf-8')
+        self._escrever({'plano': 'LimpaZipUTF', 'versao': self.VERSAO,
+                        'raiz': str(Path(pasta_raiz).resolve()), 'criado': time.strftime('%Y-%m-%dT%H:%M:%S')})
+
+    def _escrever(self, dados: dict):
+        self._arquivo.write(json.dumps(dados, ensure_ascii=False, separators=(',', ':')))
+        self._arquivo.write('\n')
+
+    def registrar(self, op: str, de: str, para: Optional[str] = None, **extras):
+        dados = {'op': op, 'de': de.replace(os.sep, '/')}
+        if para is not None:
+            dados['para'] = para.replace(os.sep, '/')
+            if op in ('mover', 'vincular') and '/' not in dados['para']:
+                self.nomes_na_raiz[dados['para']] = None
+        elif op == 'remover':
+            # Arquivo que chegou na raiz e depois saiu (cópia mais velha substituída)
+            self.nomes_na_raiz.pop(dados['de'], None)
+        dados.update(extras)
+        self._escrever(dados)
+        self.total += 1
+
+    def fechar(self):
+        self._arquivo.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.fechar()
+
+    @staticmethod
+    def ler(caminho: str) -> Tuple[dict, Iterator[dict]]:
+        """Devolve (cabeçalho, iterador de operações) sem carregar o arquivo inteiro."""
+        arquivo = open(caminho, 'r', encoding='utf-8')
+        cabecalho = json.loads(arquivo.readline() or '{}')
+        if cabecalho.get('plano') != 'LimpaZipUTF':
+            arquivo.close()
+            raise ValueError(f"Arquivo não é um plano do LimpaZipUTF: {caminho}")
+
+        def operacoes():
+            with arquivo:
+                for linha in arquivo:
+                    if linha.strip():
+                        yield json.loads(linha)
+
+        return cabecalho, operacoes()
+
+
+#Registro em disco de cada arquivo tratado (JSON Lines, um por linha).
+#As estatísticas só guardam contadores; quem quiser a lista completa de
+#movimentos e remoções usa --registro, e ela nunca fica inteira na memória.
+class RegistroArquivos:
+    """
+    Cada execução começa com uma linha de cabeçalho e acrescenta ao arquivo:
+      {"registro":"LimpaZipUTF","raiz":"/dados","inicio":"2024-03-01T10:00:00","simulacao":false}
+      {"etapa":"extrair","op":"mover","de":"Aula 1/a.pdf","para":"a.pdf"}
+      {"etapa":"extrair","op":"remover","de":"Cache/thumbs.db","bytes":1234}
+      {"etapa":"organizar","op":"mover","de":"a.pdf","para":"Documentos/a.pdf"}
+    """
+
+    def __init__(self, caminho: str, pasta_raiz: Path, modo_simulacao: bool = True,
+                 cabecalho: Optional[dict] = None):
+        self.caminho = caminho
+        self.total = 0
+        self._trava = threading.Lock()
+        self._arquivo = open(caminho, 'a', encoding='utf-8', buffering=TAMANHO_BUFFER_ZIP)
+        self._escrever(cabecalho or {'registro': 'LimpaZipUTF', 'raiz': str(Path(pasta_raiz).resolve()),
+                                     'inicio': time.strftime('%Y-%m-%dT%H:%M:%S'), 'simulacao': modo_simulacao})
+
+    def _escrever(self, dados: dict):
+        self._arquivo.write(json.dumps(dados, ensure_ascii=False, separators=(',', ':')) + '\n')
+
+    def registrar(self, etapa: str, op: str, de: str, para: Optional[str] = None, **extras):
+        dados = {'etapa': etapa, 'op': op, 'de': de.replace(os.sep, '/')}
+        if para is not None:
+            dados['para'] = para.replace(os.sep, '/')
+        dados.update(extras)
+        # O pipeline registra de várias threads
+        with self._trava:
+            self._escrever(dados)
+            self.total += 1
+
+    # Marca que uma etapa (ou um trecho do plano) terminou
+    def checkpoint(self, etapa: str, **dados):
+        with self._trava:
+            self._escrever(dict({'checkpoint': etapa}, **dados))
+
+    def fechar(self):
+        with self._trava:
+            self._arquivo.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.fechar()
+
+
+#Diário da execução em .limpazip/diario.jsonl, para retomar (--retomar) uma
+#execução que morreu no meio. Mesmo formato do RegistroArquivos, mais
+#checkpoints por etapa e uma linha {"fim":true} quando tudo termina.
+#fsync em lotes: no pior caso as últimas operações se perdem do diário,
+#mas todas as etapas podem ser refeitas sem estragar nada (ver _movimento_pela_metade).
+class Diario(RegistroArquivos):
+    LOTE_FSYNC = 1000
+    INTERVALO_FSYNC = 1.0  # segundos
+
+    def __init__(self, pasta_raiz: Path, modo: str, retomada: bool = False,
+                 espelho: Optional[RegistroArquivos] = None, **extras):
+        """
+        Args:
+            pasta_raiz: Pasta raiz (o diário fica em PASTA_ESTADO dentro dela)
+            modo: 'direto', 'pipeline' ou 'aplicar'
+            retomada: Continua a execução interrompida em vez de começar outra
+            espelho: Registro do usuário (--registro) que recebe as mesmas operações
+            extras: Gravados no cabeçalho (ex.: plano=caminho do plano)
+        """
+        pasta_estado = Path(pasta_raiz) / PASTA_ESTADO
+        pasta_estado.mkdir(exist_ok=True)
+        caminho = pasta_estado / 'diario.jsonl'
+
+        # A execução anterior terminou: o diário dela não serve mais para nada
+        anterior = Diario.ler(pasta_raiz)
+        if not retomada and anterior is not None and anterior['terminada']:
+            caminho.unlink()
+
+        cabecalho = dict({'diario': 'LimpaZipUTF', 'modo': modo, 'retomada': retomada,
+                          'inicio': time.strftime('%Y-%m-%dT%H:%M:%S')}, **extras)
+        super().__init__(str(caminho), pasta_raiz, False, cabecalho)
+        self.espelho = espelho
+        self._pendentes = 0
+        self._ultimo_fsync = time.monotonic()
+        self.sincronizar()
+
+    def registrar(self, etapa: str, op: str, de: str, para: Optional[str] = None, **extras):
+        super().registrar(etapa, op, de, para, **extras)
+        if self.espelho is not None:
+            self.espelho.registrar(etapa, op, de, para, **extras)
+        self._pendentes += 1
+        if self._pendentes >= self.LOTE_FSYNC or time.monotonic() - self._ultimo_fsync >= self.INTERVALO_FSYNC:
+            self.sincronizar()
+
+    def sincronizar(self):
+        with self._trava:
+            self._arquivo.flush()
+            os.fsync(self._arquivo.fileno())
+            self._pendentes = 0
+            self._ultimo_fsync = time.monotonic()
+
+    def checkpoint(self, etapa: str, **dados):
+        super().checkpoint(etapa, **dados)
+        if self.espelho is not None:
+            self.espelho.checkpoint(etapa, **dados)
+        self.sincronizar()
+
+    def terminar(self):
+        with self._trava:
+            self._escrever({'fim': True})
+        self.sincronizar()
+        self.fechar()
+
+    @staticmethod
+    def ler(pasta_raiz: Path) -> Optional[dict]:
+        """
+        Resume a última execução do diário sem carregar as operações:
+        {'modo', 'cabecalho', 'checkpoints': {etapa: dados}, 'operacoes', 'terminada'}
+        ou None se não houver diário.
+        """
+        caminho = Path(pasta_raiz) / PASTA_ESTADO / 'diario.jsonl'
+        if not caminho.exists():
+            return None
+        resumo = None
+        with open(caminho, 'r', encoding='utf-8') as arquivo:
+            for linha in arquivo:
+                try:
+                    dados = json.loads(linha)
+                except ValueError:
+                    # Última linha cortada pela queda do processo
+                    continue
+                if 'diario' in dados:
+                    if resumo is None or not dados.get('retomada'):
+                        resumo = {'modo': dados.get('modo'), 'cabecalho': dados, 'checkpoints': {},
+                                  'operacoes': 0, 'terminada': False}
+                    else:
+                        resumo['terminada'] = False
+                elif resumo is None:
+                    continue
+                elif 'checkpoint' in dados:
+                    resumo['checkpoints'][dados['checkpoint']] = dados
+                elif dados.get('fim'):
+                    resumo['terminada'] = True
+                else:
+                    resumo['operacoes'] += 1
+        return resumo
+
+
+#Um movimento feito com link+unlink pode ter parado entre os dois: o arquivo
+#aparece na origem E no destino (mesmo inode). Ao retomar, termina o movimento
+#(apaga a origem) em vez de mover de novo como nome_copia.
+def _movimento_pela_metade(origem: str, destino: str) -> bool:
+    try:
+        st_origem = os.stat(origem)
+        if st_origem.st_nlink < 2:
+            return False
+        if not os.path.samestat(st_origem, os.stat(destino)):
+            return False
+    except OSError:
         return False
+    os.unlink(origem)
+    return True
+
+
+# Bytes pedidos ao kernel por chamada de copy_file_range/sendfile (64 MB)
+TAMANHO_BLOCO_COPIA = 64 * 1024 * 1024
+
+# Copia o conteúdo de um arquivo usando cópia no kernel quando possível
+# (copy_file_range → sendfile → leitura/escrita com buffer grande)
+def _copiar_conteudo(origem: str, destino: str, exclusivo: bool = True) -> int:
+    with open(origem, 'rb') as fo, open(destino, 'xb' if exclusivo else 'wb') as fd:
+        entrada, saida = fo.fileno(), fd.fileno()
+        tamanho = os.fstat(entrada).st_size
+        _pre_alocar(fd, tamanho)
+        copiados = 0
+
+        if hasattr(os, 'copy_file_range'):
+            try:
+                while True:
+                    lidos = os.copy_file_range(entrada, saida, TAMANHO_BLOCO_COPIA)
+                    if not lidos:
+                        break
+                    copiados += lidos
+            except OSError as e:
+                # Kernel/sistema de arquivos sem suporte: tenta o próximo método
+                if copiados or e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP):
+                    raise
+            else:
+                if copiados != tamanho:
+                    os.ftruncate(saida, copiados)
+                return copiados
+
+        if hasattr(os, 'sendfile') and sys.platform.startswith('linux'):
+            try:
+                while True:
+                    lidos = os.sendfile(saida, entrada, copiados, TAMANHO_BLOCO_COPIA)
+                    if not lidos:
+                        break
+                    copiados += lidos
+            except OSError as e:
+                if copiados or e.errno not in (errno.ENOSYS, errno.EINVAL):
+                    raise
+            else:
+                if copiados != tamanho:
+                    os.ftruncate(saida, copiados)
+                return copiados
+
+        buffer = bytearray(TAMANHO_BUFFER_ZIP)
+        visao = memoryview(buffer)
+        while True:
+            lidos = fo.readinto(buffer)
+            if not lidos:
+                break
+            fd.write(visao[:lidos])
+            copiados += lidos
+        fd.flush()
+        if copiados != tamanho:
+            os.ftruncate(saida, copiados)
+        return copiados
+
+
+# Pastas cujo st_dev fica em cache no Movedor (as menos usadas saem primeiro)
+LIMITE_CACHE_MOVEDOR = 4096
+
+class Movedor:
+    """
+    Camada única de movimentação de arquivos (substitui o shutil.move).
+    Compara o st_dev da pasta de origem com o da pasta de destino:
+      - mesmo sistema de arquivos: link+unlink (nunca sobrescreve) ou rename atômico
+      - sistemas diferentes: cópia no kernel (copy_file_range/sendfile) + remoção da origem
+    O st_dev de cada pasta fica num cache LRU de tamanho fixo (memória constante
+    mesmo com milhões de pastas); `esquecer()` limpa o cache depois de um remount.
+    Também conta quantos movimentos usaram o caminho lento e quantos bytes foram copiados.
+    """
+
+    def __init__(self):
+        self._dispositivos: Dict[str, int] = {}
+        # Pares com o mesmo st_dev que mesmo assim deram EXDEV (bind mount)
+        self._entre_montagens: Dict[Tuple[str, str], bool] = {}
+        self._trava = threading.Lock()
+        self.movimentos_rapidos = 0
+        self.movimentos_lentos = 0
+        self.bytes_copiados = 0
+
+    @staticmethod
+    def _lembrar(cache: dict, chave, valor):
+        # dict mantém a ordem de inserção: reinserir = mais recente, o primeiro = o mais antigo
+        cache.pop(chave, None)
+        cache[chave] = valor
+        if len(cache) > LIMITE_CACHE_MOVEDOR:
+            del cache[next(iter(cache))]
+
+    def _dispositivo(self, pasta: str) -> int:
+        with self._trava:
+            dispositivo = self._dispositivos.pop(pasta, None)
+            if dispositivo is not None:
+                self._dispositivos[pasta] = dispositivo
+                return dispositivo
+        dispositivo = os.stat(pasta).st_dev
+        with self._trava:
+            self._lembrar(self._dispositivos, pasta, dispositivo)
+        return dispositivo
+
+    def mesmo_disco(self, pasta_origem: str, pasta_destino: str) -> bool:
+        if (pasta_origem, pasta_destino) in self._entre_montagens:
+            return False
+        return self._dispositivo(pasta_origem) == self._dispositivo(pasta_destino)
+
+    def esquecer(self):
+        """Descarta o cache (pastas podem ter mudado de disco, num remount por exemplo)."""
+        with self._trava:
+            self._dispositivos.clear()
+            self._entre_montagens.clear()
+
+    @_medido('mover', histograma=True)
+    def mover(self, origem: str, destino: str, sobrescrever: bool = False):
+        """Move um arquivo. Sem `sobrescrever`, falha com FileExistsError se o destino existir."""
+        origem = str(origem)
+        destino = str(destino)
+        chave = (os.path.dirname(origem) or os.curdir, os.path.dirname(destino) or os.curdir)
+
+        if self.mesmo_disco(*chave):
+            try:
+                self._mover_mesmo_disco(origem, destino, sobrescrever)
+                with self._trava:
+                    self.movimentos_rapidos += 1
+                return
+            except OSError as e:
+                # Mesmo st_dev mas pontos de montagem diferentes (bind mount, por exemplo)
+                if e.errno != errno.EXDEV:
+                    raise
+                with self._trava:
+                    self._lembrar(self._entre_montagens, chave, False)
+
+        copiados = self._mover_entre_discos(origem, destino, sobrescrever)
+        with self._trava:
+            self.movimentos_lentos += 1
+            self.bytes_copiados += copiados
+
+    @staticmethod
+    def _mover_mesmo_disco(origem: str, destino: str, sobrescrever: bool):
+        if sobrescrever:
+            os.replace(origem, destino)
+            return
+
+        if os.name != 'nt':
+            # link() falha se o destino existir: movimento sem risco de sobrescrever
+            try:
+                os.link(origem, destino, follow_symlinks=False)
+            except FileExistsError:
+                raise
+            except (OSError, NotImplementedError) as e:
+                if getattr(e, 'errno', None) == errno.EXDEV:
+                    raise
+                # Sem suporte a hardlink (FAT, alguns compartilhamentos): usa rename
+            else:
+                os.unlink(origem)
+                return
+
+        if os.path.lexists(destino):
+            raise FileExistsError(errno.EEXIST, "Destino já existe", destino)
+        os.rename(origem, destino)
 
-    extensao = caminho.suffix.lower()
-    return extensao in EXTENSOES_PERMITIDAS
+    @staticmethod
+    def _mover_entre_discos(origem: str, destino: str, sobrescrever: bool) -> int:
+        if not sobrescrever and os.path.lexists(destino):
+            raise FileExistsError(errno.EEXIST, "Destino já existe", destino)
+
+        if os.path.islink(origem):
+            os.symlink(os.readlink(origem), destino)
+            os.unlink(origem)
+            return 0
+
+        # Copia para um temporário ao lado do destino: o destino nunca fica pela metade
+        temporario = f"{destino}.limpazip-tmp"
+        try:
+            copiados = _copiar_conteudo(origem, temporario, exclusivo=False)
+            shutil.copystat(origem, temporario)
+            if sobrescrever:
+                os.replace(temporario, destino)
+            else:
+                if os.path.lexists(destino):
+                    raise FileExistsError(errno.EEXIST, "Destino já existe", destino)
+                os.rename(temporario, destino)
+        except BaseException:
+            try:
+                os.unlink(temporario)
+            except OSError:
+                pass
+            raise
+        os.unlink(origem)
+        return copiados
+
+    def resumo(self) -> str:
+        return (f"{self.movimentos_rapidos} no mesmo disco, {self.movimentos_lentos} entre discos "
+                f"({self.bytes_copiados / (1024 * 1024):.2f} MB copiados)")
+
+
+# Movedor compartilhado pelas três etapas (o resumo aparece no fim da execução)
+MOVEDOR = Movedor()
 
 #EXTRAI arquivos úteis de subpastas para a raiz da pasta.
 #Remove apenas arquivos completamente inúteis.
-def extrair_e_organizar(pasta_raiz: str, modo_simulacao: bool = True, verbose: bool = True) -> dict:
+@_medido('etapa_extrair_e_organizar')
+def extrair_e_organizar(pasta_raiz: str, modo_simulacao: bool = True, verbose: bool = True,
+                        deduplicar: Optional[str] = None, manifesto: Optional[Manifesto] = None,
+                        regras: Optional[Regras] = None, plano: Optional[Plano] = None,
+                        ao_colocar_na_raiz: Optional[Callable[[str], None]] = None,
+                        registro: Optional[RegistroArquivos] = None, retomar: bool = False,
+                        varredores: int = 1, ignorar: Optional[Set[str]] = None) -> dict:
     """
     Args:
         pasta_raiz: Caminho da pasta raiz
         modo_simulacao: Se True, apenas mostra o que seria movido
         verbose: Se True, mostra detalhes
+        deduplicar: None, 'remover' ou 'hardlink'. Arquivos com conteúdo idêntico a um
+            que já está na raiz, numa categoria ou em ZIPS são apagados ou viram hardlink dele
+        manifesto: Se informado, arquivos já processados e inalterados são pulados
+        regras: Regras compiladas (None = regras embutidas no script)
+        plano: Se informado, cada operação (feita ou simulada) é gravada nele
+        ao_colocar_na_raiz: Chamada com o nome de cada arquivo útil que está (ou acabou
+            de chegar) na raiz, assim que ele é tratado. Usada pelo modo pipeline
+        registro: Se informado, cada arquivo movido/removido é gravado nele (em disco)
+        retomar: Termina movimentos que ficaram pela metade numa execução interrompida
+        varredores: Threads listando subpastas ao mesmo tempo (útil em NFS/SMB)
+        ignorar: Subpastas da raiz que não são percorridas (além de .limpazip)
     Returns:
-        Dicionário com estatísticas
+        Dicionário com estatísticas (só contadores: memória constante)
     """
     pasta_raiz = Path(pasta_raiz)
+    regras = regras or REGRAS_PADRAO
 
     if not pasta_raiz.exists():
         raise ValueError(f"Pasta não encontrada: {pasta_raiz}")
@@ -107,12 +1341,21 @@ def extrair_e_organizar(pasta_raiz: str, modo_simulacao: bool = True, verbose: b
         'arquivos_movidos': 0,
         'arquivos_removidos': 0,
         'pastas_vazias_removidas': 0,
-        'arquivos_movidos_lista': [],
-        'arquivos_removidos_lista': [],
+        'movidos_por_categoria': {},
         'espaco_liberado_mb': 0,
         'arquivos_compactados_encontrados': [],
+        'duplicados_removidos': 0,
+        'duplicados_vinculados': 0,
+        'espaco_duplicados_mb': 0,
+        'arquivos_inalterados': 0,
+        'removidos_por_regra': {},
+        'bytes_liberados': 0,
     }
 
+    indice = IndiceConteudo(pasta_raiz, [PASTA_ZIPS, *regras.categorias]) if deduplicar else None
+    # Na simulação nada é movido: os nomes prometidos ficam guardados aqui
+    nomes_reservados = set() if modo_simulacao else None
+
     print(f"\n{'[SIMULAÇÃO]' if modo_simulacao else '[EXECUÇÃO]'} Processando: {pasta_raiz}")
     print("-" * 120)
 
@@ -122,359 +1365,2620 @@ def extrair_e_organizar(pasta_raiz: str, modo_simulacao: bool = True, verbose: b
     =============================================================================
     '''
 
+    raiz_str = str(pasta_raiz)
+
+    # Política "manter só a cópia mais recente", decidida na própria varredura:
+    # nome → [mtime, nome na raiz, tamanho] da cópia mais nova já levada para a
+    # raiz. Uma cópia mais nova achada depois toma o lugar dela (a velha é
+    # removida); uma mais velha é removida direto.
+    recentes: Optional[Dict[str, list]] = {} if regras.manter_mais_recente else None
+
+    # Entradas que ainda restam em cada pasta aberta pela varredura. Cada arquivo
+    # que sai (movido/removido) e cada subpasta removida desconta 1 da pasta onde
+    # estava: quando a varredura fecha a pasta, zero = vazia, sem listar de novo.
+    # Na simulação a conta é a mesma, então ela (e o plano) já sabe o que vai sumir.
+    restantes: Dict[str, int] = {}
+
+    def saiu(caminho: str):
+        pasta = os.path.dirname(caminho)
+        if pasta in restantes:
+            restantes[pasta] -= 1
+
     # 1️⃣ PRIMEIRO PASSO: Procura arquivos úteis em subpastas e MOVE para a raiz
-    for item in pasta_raiz.rglob('*'):
+    # 2️⃣ SEGUNDO PASSO: Remove pastas vazias
+    # Os dois passos acontecem na MESMA varredura (pós-ordem): quando uma pasta
+    # termina de ser percorrida, todos os arquivos dela já foram tratados.
+    for tipo, valor in percorrer_arvore(raiz_str, {PASTA_ESTADO} | (ignorar or set()), varredores, restantes):
+        if tipo == 'pasta':
+            # Ainda tem algo dentro: nem tenta (nenhuma syscall)
+            if restantes.pop(valor, 1) != 0:
+                continue
+            if not modo_simulacao:
+                try:
+                    with METRICAS.cronometro('rmdir'):
+                        os.rmdir(valor)
+                except OSError:
+                    # Apareceu algo depois da listagem: a pasta fica (e conta na pasta de cima)
+                    continue
+            saiu(valor)
+            estatisticas['pastas_vazias_removidas'] += 1
+            if plano is not None:
+                plano.registrar('rmdir', _relativo(valor, raiz_str))
+            if registro is not None:
+                registro.registrar('extrair', 'rmdir', _relativo(valor, raiz_str))
+            if verbose:
+                print(f"📁 PASTA VAZIA REMOVIDA: {_relativo(valor, raiz_str)}")
+            continue
+
+        item = valor
         try:
             # Só processa arquivos (não pastas)
             if item.is_file():
+                nome = item.name
+                base, extensao = os.path.splitext(nome)
+                extensao = extensao.lower()
+                # Um único stat (o do DirEntry, guardado por ele) serve para tudo abaixo
+                st = None
+                with METRICAS.cronometro('classificacao'):
+                    if regras.usa_stat:
+                        st = item.stat()
+                        categoria, regra = regras.avaliar(nome, st.st_size, st.st_mtime)
+                    else:
+                        categoria, regra = regras.avaliar(nome)
+                    manter = categoria is not None
+
                 # Não mover arquivos que já estão na raiz
-                if item.parent == pasta_raiz:
-                    if deve_manter_arquivo(item):
-                        if item.suffix.lower() in {'.zip', '.rar', '.7z'}:
-                            estatisticas['arquivos_compactados_encontrados'].append(item.name)
+                if os.path.dirname(item.path) == raiz_str:
+                    if manter:
+                        if extensao in {'.zip', '.rar', '.7z'}:
+                            estatisticas['arquivos_compactados_encontrados'].append(nome)
+                        if ao_colocar_na_raiz is not None:
+                            ao_colocar_na_raiz(nome)
                     continue
 
-                # Verificar se é um arquivo útil
-                if deve_manter_arquivo(item):
-                    # Arquivos úteis: MOVER para a raiz
-                    novo_caminho = pasta_raiz / item.name
+                relativo = _relativo(item.path, raiz_str)
 
-                    # Se já existe na raiz, adiciona sufixo
-                    if novo_caminho.exists():
-                        novo_caminho = pasta_raiz / f"{item.stem}_copia{item.suffix}"
+                # Já processado numa execução anterior e não mudou desde então
+                if manifesto is not None and manifesto.inalterado(relativo, item.stat()):
+                    estatisticas['arquivos_inalterados'] += 1
+                    continue
 
-                    if verbose:
-                        print(f"📤 MOVENDO: {item.relative_to(pasta_raiz)} → {novo_caminho.name}")
+                # Um arquivo já indexado (numa categoria, em ZIPS) que a varredura encontra
+                # vai sair de lá: não pode ser o "original" de ninguém, nem de si mesmo
+                indexada = indice.descartar(relativo.replace(os.sep, '/')) if indice is not None else None
 
-                    estatisticas['arquivos_movidos'] += 1
-                    estatisticas['arquivos_movidos_lista'].append(f"{item.relative_to(pasta_raiz)} → {novo_caminho.name}")
+                substituida = None
+                if manter and recentes is not None:
+                    st = st or item.stat()
+                    anterior = recentes.get(nome)
+                    if anterior is not None:
+                        # Empate: fica a primeira na ordem da varredura
+                        if st.st_mtime <= anterior[0]:
+                            manter, regra = False, 'manter_mais_recente'
+                        else:
+                            substituida = anterior
 
-                    if not modo_simulacao:
-                        shutil.move(str(item), str(novo_caminho))
+                # Verificar se é um arquivo útil
+                if manter and indice is not None:
+                    # Conteúdo idêntico a um arquivo que já está na raiz?
+                    st = st or item.stat()
+                    original = indice.procurar_duplicado(item.path, st)
+                    if original is not None and deduplicar == 'hardlink':
+                        novo_nome = _nome_livre(pasta_raiz, nome, nomes_reservados)
+                        if not modo_simulacao:
+                            try:
+                                os.link(str(pasta_raiz / original), str(pasta_raiz / novo_nome))
+                            except OSError:
+                                # Sistema de arquivos sem hardlink: segue como movimento normal
+                                original = None
+                            else:
+                                os.unlink(item.path)
+                                # O índice guarda o stat do hardlink (mesmo inode do
+                                # original), e os hashes do original valem para ele
+                                indice.adicionar(novo_nome, os.stat(str(pasta_raiz / novo_nome)))
+                                for tipo in ('parcial', 'completo'):
+                                    indice.entradas[novo_nome][tipo] = indice.entradas[original][tipo]
+                        if original is not None:
+                            if verbose:
+                                print(f"🔗 DUPLICADO: {relativo} → {novo_nome} (hardlink de {original})")
+                            if plano is not None:
+                                plano.registrar('vincular', relativo, novo_nome, original=original)
+                            if registro is not None:
+                                registro.registrar('extrair', 'vincular', relativo, novo_nome, original=original)
+                            estatisticas['duplicados_vinculados'] += 1
+                            estatisticas['espaco_duplicados_mb'] += st.st_size / (1024 * 1024)
+                            estatisticas['bytes_liberados'] += st.st_size
+                            saiu(item.path)
+                            continue
+                    elif original is not None:
+                        if verbose:
+                            print(f"♻️  DUPLICADO: {relativo} = {original} (removido)")
+                        if plano is not None:
+                            plano.registrar('remover', relativo, bytes=st.st_size)
+                        if registro is not None:
+                            registro.registrar('extrair', 'remover', relativo, bytes=st.st_size, duplicado_de=original)
+                        if not modo_simulacao:
+                            with METRICAS.cronometro('remover'):
+                                os.unlink(item.path)
+                        estatisticas['duplicados_removidos'] += 1
+                        estatisticas['espaco_duplicados_mb'] += st.st_size / (1024 * 1024)
+                        estatisticas['bytes_liberados'] += st.st_size
+                        saiu(item.path)
+                        continue
+
+                if manter and retomar and not modo_simulacao and \
+                        _movimento_pela_metade(item.path, os.path.join(raiz_str, nome)):
+                    if verbose:
+                        print(f"🔁 CONCLUÍDO (execução interrompida): {relativo} → {nome}")
+                    estatisticas['arquivos_movidos'] += 1
+                    if registro is not None:
+                        registro.registrar('extrair', 'mover', relativo, nome, retomado=True)
+                    if recentes is not None:
+                        recentes[nome] = [st.st_mtime, nome, st.st_size]
+                    if extensao in {'.zip', '.rar', '.7z'}:
+                        estatisticas['arquivos_compactados_encontrados'].append(nome)
+                    saiu(item.path)
+                    continue
+
+                if manter:
+                    categoria = regras.categoria(nome) or 'Outros'
+                    por_categoria = estatisticas['movidos_por_categoria']
+                    if substituida is not None:
+                        # A cópia mais velha, já na raiz, sai e esta ocupa o nome dela
+                        # (conta como removida, não mais como movida)
+                        novo_caminho = pasta_raiz / substituida[1]
+                        tamanho = substituida[2]
+                        if verbose:
+                            print(f"🗑️  REMOVENDO: {substituida[1]} ({tamanho / (1024 * 1024):.2f} MB) "
+                                  f"[regra: manter_mais_recente]")
+                        if plano is not None:
+                            plano.registrar('remover', substituida[1], bytes=tamanho)
+                        if registro is not None:
+                            registro.registrar('extrair', 'remover', substituida[1], bytes=tamanho,
+                                               regra='manter_mais_recente')
+                        estatisticas['arquivos_movidos'] -= 1
+                        por_categoria[categoria] -= 1
+                        estatisticas['arquivos_removidos'] += 1
+                        estatisticas['espaco_liberado_mb'] += tamanho / (1024 * 1024)
+                        estatisticas['bytes_liberados'] += tamanho
+                        por_regra = estatisticas['removidos_por_regra']
+                        quantidade, total = por_regra.get('manter_mais_recente', (0, 0))
+                        por_regra['manter_mais_recente'] = (quantidade + 1, total + tamanho)
+                    else:
+                        # Arquivos úteis: MOVER para a raiz
+                        # Se já existe na raiz, adiciona sufixo (_copia, _copia2, ...)
+                        novo_caminho = pasta_raiz / _nome_livre(pasta_raiz, nome, nomes_reservados)
+
+                    if verbose:
+                        print(f"📤 MOVENDO: {relativo} → {novo_caminho.name}")
+
+                    estatisticas['arquivos_movidos'] += 1
+                    por_categoria[categoria] = por_categoria.get(categoria, 0) + 1
+
+                    if not modo_simulacao:
+                        MOVEDOR.mover(item.path, str(novo_caminho), sobrescrever=substituida is not None)
+                    saiu(item.path)
+                    if plano is not None:
+                        plano.registrar('mover', relativo, novo_caminho.name)
+                    if registro is not None:
+                        registro.registrar('extrair', 'mover', relativo, novo_caminho.name)
+
+                    if indice is not None:
+                        indice.adicionar(novo_caminho.name, st, item.path if modo_simulacao else None)
+                        if indexada is not None:
+                            # Mesmo conteúdo, só mudou de pasta: os hashes continuam valendo
+                            for tipo in ('parcial', 'completo'):
+                                indice.entradas[novo_caminho.name][tipo] = indexada[tipo]
 
                     # Registra arquivos compactados encontrados
-                    if item.suffix.lower() in {'.zip', '.rar', '.7z'}:
+                    if extensao in {'.zip', '.rar', '.7z'} and substituida is None:
                         estatisticas['arquivos_compactados_encontrados'].append(novo_caminho.name)
 
+                    if recentes is not None:
+                        recentes[nome] = [st.st_mtime, novo_caminho.name, st.st_size]
+                    elif ao_colocar_na_raiz is not None and not modo_simulacao:
+                        ao_colocar_na_raiz(novo_caminho.name)
+
                 else:
-                    # Arquivos inúteis: REMOVER
-                    tamanho_mb = item.stat().st_size / (1024 * 1024)
+                    # Arquivos inúteis: REMOVER (o stat da classificação, ou um do DirEntry só aqui)
+                    if st is None:
+                        with METRICAS.cronometro('stat'):
+                            st = item.stat()
+                    tamanho = st.st_size
+                    tamanho_mb = tamanho / (1024 * 1024)
+                    extras = {'regra': regra} if regra else {}
+                    if plano is not None:
+                        plano.registrar('remover', relativo, bytes=tamanho)
+                    if registro is not None:
+                        registro.registrar('extrair', 'remover', relativo, bytes=tamanho, **extras)
                     estatisticas['espaco_liberado_mb'] += tamanho_mb
+                    estatisticas['bytes_liberados'] += tamanho
                     estatisticas['arquivos_removidos'] += 1
-                    estatisticas['arquivos_removidos_lista'].append(str(item.relative_to(pasta_raiz)))
+                    if regra:
+                        por_regra = estatisticas['removidos_por_regra']
+                        quantidade, total = por_regra.get(regra, (0, 0))
+                        por_regra[regra] = (quantidade + 1, total + tamanho)
 
                     if verbose:
-                        print(f"🗑️  REMOVENDO: {item.relative_to(pasta_raiz)} ({tamanho_mb:.2f} MB)")
+                        motivo = f" [regra: {regra}]" if regra else ""
+                        print(f"🗑️  REMOVENDO: {relativo} ({tamanho_mb:.2f} MB){motivo}")
 
                     if not modo_simulacao:
-                        item.unlink()
+                        with METRICAS.cronometro('remover'):
+                            os.unlink(item.path)
+                    saiu(item.path)
 
         except Exception as e:
-            print(f"⚠️  Erro ao processar {item}: {e}")
+            print(f"⚠️  Erro ao processar {item.path}: {e}")
+            if registro is not None:
+                registro.registrar('extrair', 'erro', _relativo(item.path, raiz_str), erro=str(e))
 
-    # 2️⃣ SEGUNDO PASSO: Remove pastas vazias
-    if not modo_simulacao:
-        for pasta in sorted(pasta_raiz.rglob('*'), key=lambda p: len(p.parts), reverse=True):
-            if pasta.is_dir():
-                try:
-                    # Verifica se está vazia
-                    if not any(pasta.iterdir()):
-                        pasta.rmdir()
-                        estatisticas['pastas_vazias_removidas'] += 1
-                        if verbose:
-                            print(f"📁 PASTA VAZIA REMOVIDA: {pasta.relative_to(pasta_raiz)}")
-                except:
-                    pass
+    # Com a política da cópia mais recente, só no fim se sabe qual cópia ficou na raiz
+    if recentes is not None and ao_colocar_na_raiz is not None and not modo_simulacao:
+        for _, nome_na_raiz, _ in recentes.values():
+            ao_colocar_na_raiz(nome_na_raiz)
+
+    if indice is not None and not modo_simulacao:
+        indice.salvar()
+
+    if manifesto is not None:
+        # Só o que a varredura percorreu: no pipeline ZIPS e as categorias ficam de fora
+        manifesto.descartar_nao_vistos(ignorar or ())
 
     return estatisticas
 
+# Data de modificação de um membro do ZIP (para as regras de idade)
+def _data_membro(info: zipfile.ZipInfo) -> Optional[float]:
+    try:
+        return time.mktime(info.date_time + (0, 0, -1))
+    except (OverflowError, ValueError):
+        return None
+
+# Caminho seguro de um membro do ZIP dentro do destino
+# (mesmas proteções do extractall: sem raiz absoluta, sem drive, sem '..')
+def _destino_membro(nome_membro: str, pasta_destino: str) -> Optional[str]:
+    nome = nome_membro.replace('/', os.sep)
+    if os.altsep:
+        nome = nome.replace(os.altsep, os.sep)
+    nome = os.path.splitdrive(nome)[1]
+    partes = [parte for parte in nome.split(os.sep) if parte and parte not in ('.', '..')]
+    if os.sep == '\\':
+        # Windows: troca caracteres proibidos e remove pontos finais
+        partes = [parte.translate(str.maketrans(':<>|"?*', '_______')).rstrip('.') for parte in partes]
+        partes = [parte for parte in partes if parte]
+    if not partes:
+        return None
+    return os.path.join(pasta_destino, *partes)
+
+# Reserva o espaço do arquivo de uma vez (menos fragmentação, erro de disco cheio logo no início)
+def _pre_alocar(arquivo, tamanho: int):
+    if tamanho <= 0:
+        return
+    try:
+        if hasattr(os, 'posix_fallocate'):
+            os.posix_fallocate(arquivo.fileno(), 0, tamanho)
+        else:
+            os.ftruncate(arquivo.fileno(), tamanho)
+    except OSError:
+        pass
+
+#Descompacta um ZIP membro a membro, em streaming, com um buffer fixo reaproveitado.
+#Com regras, membros que seriam removidos como lixo nem chegam ao disco.
+def _extrair_zip_streaming(zip_ref: zipfile.ZipFile, pasta_destino: str,
+                           regras: Optional[Regras] = None) -> Tuple[int, int]:
+    """
+    Args:
+        zip_ref: ZipFile já aberto
+        pasta_destino: Pasta de destino
+        regras: Se informado, pula membros que as regras classificam como lixo
+            (ou que ficaram fora da extração seletiva)
+
+    Returns:
+        (membros extraídos, membros ignorados)
+    """
+    buffer = bytearray(TAMANHO_BUFFER_ZIP)
+    visao = memoryview(buffer)
+    pastas_criadas = set()
+    extraidos = 0
+    ignorados = 0
+
+    for info in zip_ref.infolist():
+        alvo = _destino_membro(info.filename, pasta_destino)
+        if alvo is None:
+            continue
+
+        if info.is_dir():
+            if alvo not in pastas_criadas:
+                os.makedirs(alvo, exist_ok=True)
+                pastas_criadas.add(alvo)
+            continue
+
+        if regras is not None and not regras.manter_membro(info.filename, info.file_size, _data_membro(info)):
+            ignorados += 1
+            continue
+
+        pasta_alvo = os.path.dirname(alvo)
+        if pasta_alvo not in pastas_criadas:
+            os.makedirs(pasta_alvo, exist_ok=True)
+            pastas_criadas.add(pasta_alvo)
+
+        with zip_ref.open(info) as origem, open(alvo, 'wb') as destino:
+            _pre_alocar(destino, info.file_size)
+            escritos = 0
+            while True:
+                lidos = origem.readinto(buffer)
+                if not lidos:
+                    break
+                destino.write(visao[:lidos])
+                escritos += lidos
+            if escritos != info.file_size:
+                destino.truncate(escritos)
+        extraidos += 1
+
+    return extraidos, ignorados
+
+#Limites contra bombas de ZIP e extrações gigantes.
+#Verificados pelo diretório central do ZIP ANTES de escrever qualquer byte.
+PROFUNDIDADE_MAXIMA_PADRAO = 3      # compactados dentro de compactados (com --varrer-zips)
+RAZAO_MAXIMA_PADRAO = 1000          # tamanho descompactado / compactado
+TAMANHO_MINIMO_RAZAO = 1024 * 1024  # arquivos pequenos podem ter razão alta sem perigo
+
+class LimiteExtracaoExcedido(ValueError):
+    """Compactado recusado pelos limites de extração (provável bomba de ZIP)."""
+
+class LimitesExtracao:
+    """
+    Limites de UM compactado da raiz, somando todos os compactados internos.
+    Cada compactado da raiz começa com um orçamento novo (`novo()`), então o
+    resultado é o mesmo rodando em sequência ou em paralelo.
+    """
+
+    def __init__(self, profundidade_maxima: int = PROFUNDIDADE_MAXIMA_PADRAO,
+                 bytes_maximos: Optional[int] = None, razao_maxima: Optional[float] = RAZAO_MAXIMA_PADRAO):
+        self.profundidade_maxima = profundidade_maxima
+        self.bytes_maximos = bytes_maximos
+        self.razao_maxima = razao_maxima
+        self.bytes_usados = 0
+        # Mensagem do primeiro compactado recusado (o de fora ou um interno)
+        self.recusado: Optional[str] = None
+
+    def novo(self) -> 'LimitesExtracao':
+        return LimitesExtracao(self.profundidade_maxima, self.bytes_maximos, self.razao_maxima)
+
+    def _razao_excedida(self, expandido: int, compactado: int) -> bool:
+        return self.razao_maxima is not None and expandido >= TAMANHO_MINIMO_RAZAO and \
+            expandido > compactado * self.razao_maxima
+
+    def reservar(self, tamanho: int, nome: str):
+        if self.bytes_maximos is not None and self.bytes_usados + tamanho > self.bytes_maximos:
+            raise LimiteExtracaoExcedido(
+                f"{nome}: expandiria para {(self.bytes_usados + tamanho) / (1024 * 1024):.2f} MB "
+                f"(limite {self.bytes_maximos / (1024 * 1024):.2f} MB)")
+        self.bytes_usados += tamanho
+
+    def verificar_membros(self, membros: List[Tuple[str, int, Optional[int]]], nome: str,
+                          tamanho_compactado: Optional[int] = None):
+        """
+        Args:
+            membros: (nome, tamanho expandido, tamanho compactado ou None) de cada arquivo
+            nome: Nome do compactado (para a mensagem de erro)
+            tamanho_compactado: Tamanho do compactado inteiro, quando os membros
+                não informam o próprio (7z sólido, por exemplo)
+        """
+        total_expandido = 0
+        total_compactado = 0
+        for nome_membro, expandido, compactado in membros:
+            if compactado is not None and self._razao_excedida(expandido, compactado):
+                raise LimiteExtracaoExcedido(
+                    f"{nome}: '{nome_membro}' tem razão de compressão acima de {self.razao_maxima:g}:1")
+            total_expandido += expandido
+            total_compactado += compactado or 0
+        if tamanho_compactado is not None:
+            total_compactado = tamanho_compactado
+        if self._razao_excedida(total_expandido, total_compactado):
+            raise LimiteExtracaoExcedido(f"{nome}: razão de compressão total acima de {self.razao_maxima:g}:1")
+        self.reservar(total_expandido, nome)
+
+    def verificar_zip(self, zip_ref: zipfile.ZipFile, nome: str, regras: Optional[Regras] = None):
+        # Só lê o diretório central. zipfile nunca devolve mais bytes do que
+        # o file_size declarado (e confere o CRC), então o que passa aqui é
+        # o máximo que vai ser escrito no disco. Com `regras`, conta só os
+        # membros que realmente serão extraídos.
+        self.verificar_membros([(info.filename, info.file_size, info.compress_size)
+                                for info in zip_ref.infolist() if not info.is_dir() and
+                                (regras is None or regras.manter_membro(info.filename, info.file_size,
+                                                                        _data_membro(info)))], nome)
+
+#Soma o tamanho dos arquivos de uma pasta (usado depois de 7z/unrar,
+#que não deixam ver o conteúdo antes de extrair)
+def _tamanho_pasta(pasta: str) -> int:
+    return sum(valor.stat(follow_symlinks=False).st_size
+               for tipo, valor in percorrer_arvore(pasta) if tipo == 'arquivo')
+
+#Apaga o que uma extração recusada pelos limites já tinha escrito
+#(a pasta inteira: quem chamou não deixa a bomba no disco)
+def _remover_extracao(pasta: Path):
+    shutil.rmtree(str(pasta), ignore_errors=True)
+
+#Descompactadores de .7z e .rar.
+#Cada backend sabe LISTAR (para conferir os limites antes de escrever) e EXTRAIR.
+#Os disponíveis são detectados uma vez só por processo e ficam em cache: programa
+#que não existe nunca é tentado, e bibliotecas (py7zr, rarfile) vêm antes dos
+#programas externos porque não pagam a criação de um processo por arquivo.
+TEMPO_MAXIMO_PROGRAMA = 600  # segundos para um 7z/unrar terminar
+
+class BackendCompactado(abc.ABC):
+    """
+    Base dos descompactadores. `listar` pode devolver None se não souber listar;
+    `indexar` é a mesma listagem com o CRC de cada membro (None se não houver).
+    `extrair` (obrigatório) recebe `membros` para extrair só esses (None = todos).
+    """
+    nome = ''
+    extensoes: frozenset = frozenset()
+
+    def disponivel(self) -> bool:
+        return True
+
+    def listar(self, caminho: Path) -> Optional[List[Tuple[str, int, Optional[int]]]]:
+        membros = self.indexar(caminho)
+        return None if membros is None else [(nome, tamanho, compactado) for nome, tamanho, compactado, _ in membros]
+
+    def indexar(self, caminho: Path) -> Optional[List[Tuple[str, int, Optional[int], Optional[int]]]]:
+        return None
+
+    @abc.abstractmethod
+    def extrair(self, caminho: Path, destino: Path, membros: Optional[List[str]] = None):
+        ...
+
+class BackendPy7zr(BackendCompactado):
+    nome = 'py7zr'
+    extensoes = frozenset({'.7z'})
+
+    def disponivel(self) -> bool:
+        return py7zr is not None
+
+    def indexar(self, caminho):
+        with py7zr.SevenZipFile(str(caminho), 'r') as arquivo:
+            # 7z sólido não tem tamanho compactado por membro: a razão usa o arquivo inteiro
+            return [(info.filename, info.uncompressed, None, getattr(info, 'crc32', None))
+                    for info in arquivo.list() if not info.is_directory]
+
+    def extrair(self, caminho, destino, membros=None):
+        with py7zr.SevenZipFile(str(caminho), 'r') as arquivo:
+            if membros is None:
+                arquivo.extractall(path=str(destino))
+            else:
+                arquivo.extract(path=str(destino), targets=membros)
+
+class BackendRarfile(BackendCompactado):
+    nome = 'rarfile'
+    extensoes = frozenset({'.rar'})
+
+    def disponivel(self) -> bool:
+        if rarfile is None:
+            return False
+        try:
+            # rarfile ainda precisa de unrar/unar/bsdtar por baixo
+            rarfile.tool_setup()
+            return True
+        except Exception:
+            return False
+
+    def indexar(self, caminho):
+        with rarfile.RarFile(str(caminho)) as arquivo:
+            return [(info.filename, info.file_size, info.compress_size, info.CRC)
+                    for info in arquivo.infolist() if not info.is_dir()]
+
+    def extrair(self, caminho, destino, membros=None):
+        # Uma chamada só, mesmo com seleção: num RAR sólido cada extract()
+        # separado descompactaria tudo de novo desde o começo
+        with rarfile.RarFile(str(caminho)) as arquivo:
+            arquivo.extractall(str(destino), members=membros)
+
+class BackendPrograma(BackendCompactado):
+    """7z ou unrar chamados como processo externo."""
+
+    def __init__(self, nome: str, candidatos: List[str], extensoes: Set[str]):
+        self.nome = nome
+        self.extensoes = frozenset(extensoes)
+        self.candidatos = candidatos
+        self.executavel = None
+
+    def disponivel(self) -> bool:
+        for candidato in self.candidatos:
+            encontrado = candidato if os.path.isfile(candidato) else shutil.which(candidato)
+            if encontrado:
+                self.executavel = encontrado
+                return True
+        return False
+
+    def _rodar(self, argumentos: List[str]) -> str:
+        # Sem terminal: uma pergunta do programa falha na hora em vez de esperar o timeout
+        return subprocess.run([self.executavel] + argumentos, check=True, capture_output=True,
+                              stdin=subprocess.DEVNULL,
+                              timeout=TEMPO_MAXIMO_PROGRAMA).stdout.decode('utf-8', 'replace')
+
+    def indexar(self, caminho):
+        if self.nome == 'unrar':
+            return self._listar_unrar(caminho)
+        return self._listar_7z(caminho)
+
+    @staticmethod
+    def _crc(texto: Optional[str]) -> Optional[int]:
+        try:
+            return int(texto, 16) if texto else None
+        except ValueError:
+            return None
+
+    def _listar_7z(self, caminho):
+        # Formato técnico (-slt): blocos "Chave = valor" separados por linha em branco,
+        # depois da linha "----------" (antes dela vem a descrição do próprio compactado)
+        membros = []
+        campos = {}
+        nos_membros = False
+        for linha in self._rodar(['l', '-slt', str(caminho)]).splitlines() + ['']:
+            if linha.startswith('----------'):
+                nos_membros = True
+                continue
+            if not nos_membros:
+                continue
+            if not linha.strip():
+                if 'Path' in campos and campos.get('Folder') != '+' and 'D' not in campos.get('Attributes', '')[:1]:
+                    compactado = campos.get('Packed Size', '')
+                    membros.append((campos['Path'], int(campos.get('Size') or 0),
+                                    int(compactado) if compactado.isdigit() else None, self._crc(campos.get('CRC'))))
+                campos = {}
+                continue
+            chave, separador, valor = linha.partition(' = ')
+            if separador:
+                campos[chave.strip()] = valor.strip()
+        return membros
+
+    def _listar_unrar(self, caminho):
+        # Formato técnico (lt): blocos "Chave: valor" começando em "Name:"
+        membros = []
+        campos = {}
+        for linha in self._rodar(['lt', '-c-', str(caminho)]).splitlines() + ['Name: ']:
+            chave, separador, valor = linha.strip().partition(': ')
+            if not separador:
+                continue
+            if chave == 'Name':
+                if campos.get('Type') == 'File':
+                    membros.append((campos['Name'], int(campos.get('Size') or 0),
+                                    int(campos['Packed size']) if campos.get('Packed size', '').isdigit() else None,
+                                    self._crc(campos.get('CRC32'))))
+                campos = {}
+            campos[chave] = valor
+        return membros
+
+    def extrair(self, caminho, destino, membros=None):
+        lista = None
+        try:
+            selecao = []
+            if membros is not None:
+                # Os nomes vão num arquivo de lista (@arquivo): não estoura a linha de comando
+                with tempfile.NamedTemporaryFile('w', encoding='utf-8', suffix='.txt', delete=False) as f:
+                    f.write('\n'.join(membros) + '\n')
+                    lista = f.name
+                selecao = [f'@{lista}']
+            # Sem perguntas (-y) e sobrescrevendo o que já existe no _quak (-o+ / -aoa)
+            if self.nome == 'unrar':
+                # unrar só entende o último argumento como pasta se terminar com a barra
+                self._rodar(['x', '-y', '-o+', str(caminho)] + selecao + [str(destino) + os.sep])
+            else:
+                self._rodar(['x', str(caminho), f'-o{str(destino)}', '-y', '-aoa'] +
+                            (['-scsUTF-8'] + selecao if selecao else []))
+        finally:
+            if lista is not None:
+                os.remove(lista)
+
+# Ordem de preferência: bibliotecas primeiro, depois os programas
+BACKENDS_COMPACTADOS: List[BackendCompactado] = [
+    BackendPy7zr(),
+    BackendRarfile(),
+    BackendPrograma('7z', ['7z', '7za', '7zz',
+                           'C:\\Program Files\\7-Zip\\7z.exe',
+                           'C:\\Program Files (x86)\\7-Zip\\7z.exe'], {'.7z', '.rar'}),
+    BackendPrograma('unrar', ['unrar',
+                              'C:\\Program Files\\WinRAR\\UnRAR.exe',
+                              'C:\\Program Files (x86)\\WinRAR\\UnRAR.exe'], {'.rar'}),
+]
+
+_backends_detectados: Optional[Dict[str, List[BackendCompactado]]] = None
+
+#Para plugar outro descompactador (antes dos embutidos). Refaz a detecção.
+def registrar_backend(backend: BackendCompactado):
+    global _backends_detectados
+    BACKENDS_COMPACTADOS.insert(0, backend)
+    _backends_detectados = None
+
+#Extensão → backends disponíveis, na ordem de preferência (detectado uma vez)
+def backends_disponiveis() -> Dict[str, List[BackendCompactado]]:
+    global _backends_detectados
+    if _backends_detectados is None:
+        detectados = {}
+        for backend in BACKENDS_COMPACTADOS:
+            if backend.disponivel():
+                for extensao in backend.extensoes:
+                    detectados.setdefault(extensao, []).append(backend)
+        _backends_detectados = detectados
+    return _backends_detectados
+
 #Descompacta um arquivo (ZIP, RAR ou 7Z).
 #Tenta diferentes métodos dependendo do tipo.
-def descompactar_arquivo(caminho_arquivo: Path, pasta_destino: Path, verbose: bool = True) -> bool:
+@_medido('extracao', histograma=True)
+def descompactar_arquivo(caminho_arquivo: Path, pasta_destino: Path, verbose: bool = True,
+                         filtrar: bool = False, regras: Optional[Regras] = None,
+                         limites: Optional[LimitesExtracao] = None) -> bool:
     
     """
     Args:
         caminho_arquivo: Caminho do arquivo a descompactar
         pasta_destino: Pasta de destino
         verbose: Se True, mostra detalhes
+        filtrar: Se True, não extrai membros que seriam removidos como lixo nem os que
+            ficaram fora da extração seletiva (regras.selecao)
+        regras: Regras usadas pelo filtro (None = regras embutidas no script)
+        limites: Limites de extração (None = limites padrão, só contra bombas de ZIP)
         
     Returns:
         True se sucesso, False se erro
     """
     
     extensao = caminho_arquivo.suffix.lower()
+    if limites is None:
+        limites = LimitesExtracao()
     
     try:
         if extensao == '.zip':
-            # Descompacta ZIP usando zipfile nativo
+            # Descompacta ZIP usando zipfile nativo, em streaming
             try:
                 with zipfile.ZipFile(str(caminho_arquivo), 'r') as zip_ref:
-                    zip_ref.extractall(str(pasta_destino))
+                    filtro = (regras or REGRAS_PADRAO) if filtrar else None
+                    limites.verificar_zip(zip_ref, caminho_arquivo.name, filtro)
+                    _, ignorados = _extrair_zip_streaming(zip_ref, str(pasta_destino), filtro)
                 if verbose:
-                    print(f"✅ ZIP descompactado com sucesso!")
+                    _emitir(f"✅ ZIP descompactado com sucesso!")
+                    if ignorados:
+                        _emitir(f"🧹 {ignorados} arquivo(s) inútil(eis) não extraído(s)")
                 return True
             except zipfile.BadZipFile:
-                print(f"❌ Arquivo .zip inválido ou corrompido")
+                _emitir(f"❌ Arquivo .zip inválido ou corrompido")
                 return False
                 
         elif extensao in {'.rar', '.7z'}:
-            # Tenta usar 7-Zip se disponível (melhor suporte para RAR)
+            backends = backends_disponiveis().get(extensao)
+            if not backends:
+                _emitir(f"⚠️  Nenhum descompactador disponível para {extensao}")
+                _emitir(f"    Instale: 7-Zip ou WinRAR (ou pip install {'py7zr' if extensao == '.7z' else 'rarfile'}) para descompactar {extensao}")
+                return False
+
+            ultimo_erro = None
+            # O orçamento dos limites é reservado UMA vez, não a cada backend tentado
+            reservado = False
+            tentou_extrair = False
+            for backend in backends:
+                if tentou_extrair:
+                    # O backend anterior falhou no meio: o próximo começa da pasta limpa
+                    _remover_extracao(pasta_destino)
+                    os.makedirs(str(pasta_destino), exist_ok=True)
+                    tentou_extrair = False
+                try:
+                    # Confere os limites pela listagem, antes de escrever qualquer coisa
+                    membros = backend.listar(caminho_arquivo)
+                    selecionados = None
+                    if membros is not None and filtrar:
+                        # Só o que passa no filtro: a lista vai para o backend extrair só isso
+                        filtro = regras or REGRAS_PADRAO
+                        aceitos = [membro for membro in membros if filtro.manter_membro(membro[0], membro[1])]
+                        ignorados = len(membros) - len(aceitos)
+                        if ignorados:
+                            selecionados = [membro[0] for membro in aceitos]
+                        membros = aceitos
+                    if membros is not None and not reservado:
+                        limites.verificar_membros(membros, caminho_arquivo.name, caminho_arquivo.stat().st_size)
+                        reservado = True
+                    if selecionados == []:
+                        os.makedirs(str(pasta_destino), exist_ok=True)
+                    else:
+                        tentou_extrair = True
+                        backend.extrair(caminho_arquivo, pasta_destino, selecionados)
+                    if not reservado:
+                        try:
+                            limites.reservar(_tamanho_pasta(str(pasta_destino)), caminho_arquivo.name)
+                        except LimiteExtracaoExcedido:
+                            # Sem listagem só dá para medir depois de extrair: o excesso não fica
+                            _remover_extracao(pasta_destino)
+                            raise
+                    if verbose:
+                        _emitir(f"✅ {extensao[1:].upper()} descompactado com sucesso! ({backend.nome})")
+                        if selecionados is not None:
+                            _emitir(f"🧹 {ignorados} arquivo(s) inútil(eis) não extraído(s)")
+                    return True
+                except LimiteExtracaoExcedido:
+                    raise
+                except Exception as e:
+                    # Tenta o próximo backend (ex.: py7zr sem suporte ao filtro usado no arquivo)
+                    ultimo_erro = f"{backend.nome}: {e}"
+
+            _emitir(f"❌ Erro ao descompactar {extensao}: {ultimo_erro}")
+            return False
+        else:
+            _emitir(f"❌ Formato não suportado: {extensao}")
+            return False
+            
+    except LimiteExtracaoExcedido as e:
+        _emitir(f"🛑 Extração recusada: {e}")
+        limites.recusado = limites.recusado or str(e)
+        return False
+    except Exception as e:
+        _emitir(f"❌ Erro geral: {e}")
+        return False
+
+#Verificação da extração: relê cada arquivo extraído UMA vez, calculando ao
+#mesmo tempo o CRC32 (comparado com o do diretório central do ZIP ou da
+#listagem do 7z/rar) e o SHA-256 (guardado no manifesto: numa próxima
+#execução o arquivo inalterado não é relido). Arquivos grandes são lidos por
+#mmap; zlib e hashlib liberam o GIL em blocos grandes, então as threads do
+#pool usam vários núcleos e quem limita é o disco.
+BLOCO_VERIFICACAO = 8 * 1024 * 1024
+
+def _threads_verificacao() -> int:
+    return min(8, (os.cpu_count() or 1) * 2)
+
+# (SHA-256 em hex, CRC32, bytes lidos) de um arquivo
+def _hash_e_crc(caminho: str) -> Tuple[str, int, int]:
+    h = hashlib.sha256()
+    crc = 0
+    lidos = 0
+    with open(caminho, 'rb') as f:
+        tamanho = os.fstat(f.fileno()).st_size
+        if tamanho > BLOCO_VERIFICACAO:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapa:
+                visao = memoryview(mapa)
+                try:
+                    for inicio in range(0, tamanho, BLOCO_VERIFICACAO):
+                        bloco = visao[inicio:inicio + BLOCO_VERIFICACAO]
+                        h.update(bloco)
+                        crc = zlib.crc32(bloco, crc)
+                        lidos += len(bloco)
+                        bloco.release()
+                finally:
+                    visao.release()
+        else:
+            bloco = f.read()
+            h.update(bloco)
+            crc = zlib.crc32(bloco)
+            lidos = len(bloco)
+    return h.hexdigest(), crc, lidos
+
+# Membro → (tamanho, CRC ou None) pelo cabeçalho do compactado, sem extrair nada
+def _crcs_esperados(caminho_compactado: Path) -> Optional[Dict[str, Tuple[int, Optional[int]]]]:
+    if caminho_compactado.suffix.lower() == '.zip':
+        with zipfile.ZipFile(str(caminho_compactado), 'r') as zip_ref:
+            return {info.filename: (info.file_size, info.CRC) for info in zip_ref.infolist() if not info.is_dir()}
+    for backend in backends_disponiveis().get(caminho_compactado.suffix.lower(), []):
+        try:
+            membros = backend.indexar(caminho_compactado)
+        except Exception:
+            continue
+        if membros is not None:
+            return {nome: (tamanho, crc) for nome, tamanho, _, crc in membros}
+    return None
+
+@_medido('verificacao', histograma=True)
+def verificar_extracao(caminho_compactado: Path, pasta_destino: Path, pool: ThreadPoolExecutor,
+                       filtro: Optional[Regras] = None, manifesto: Optional[Manifesto] = None,
+                       pasta_raiz: Optional[Path] = None) -> dict:
+    """
+    Args:
+        caminho_compactado: Compactado de onde os arquivos saíram
+        pasta_destino: Pasta onde foi extraído
+        pool: Pool de threads que calcula os hashes
+        filtro: As regras do filtro de membros, se a extração foi filtrada/seletiva
+        manifesto: Se informado, guarda o SHA-256 de cada arquivo que conferiu
+        pasta_raiz: Raiz (para o caminho relativo no manifesto)
+
+    Returns:
+        {'verificados', 'bytes', 'falhas': [mensagens]}
+    """
+    resultado = {'verificados': 0, 'bytes': 0, 'falhas': []}
+    esperados = _crcs_esperados(caminho_compactado)
+    if esperados is None:
+        resultado['falhas'].append(f"{caminho_compactado.name}: não foi possível ler os CRCs do compactado")
+        return resultado
+
+    raiz_str = str(pasta_raiz) if pasta_raiz is not None else None
+    tarefas = []
+    for nome_membro, (tamanho, crc) in esperados.items():
+        alvo = _destino_membro(nome_membro, str(pasta_destino))
+        if alvo is None:
+            continue
+        if filtro is not None and not filtro.manter_membro(nome_membro, tamanho):
+            continue
+        try:
+            st = os.stat(alvo)
+        except OSError:
+            resultado['falhas'].append(f"{caminho_compactado.name}: '{nome_membro}' não foi extraído")
+            continue
+        relativo = _relativo(alvo, raiz_str) if raiz_str is not None else None
+        tarefas.append((nome_membro, tamanho, crc, alvo, st, relativo, pool.submit(_hash_e_crc, alvo)))
+
+    for nome_membro, tamanho, crc, alvo, st, relativo, futuro in tarefas:
+        try:
+            hash_conteudo, crc_lido, lidos = futuro.result()
+        except OSError as e:
+            resultado['falhas'].append(f"{caminho_compactado.name}: '{nome_membro}' ilegível: {e}")
+            continue
+        resultado['bytes'] += lidos
+        if lidos != tamanho:
+            resultado['falhas'].append(f"{caminho_compactado.name}: '{nome_membro}' tem {lidos} bytes, "
+                                       f"o compactado diz {tamanho}")
+        elif crc is not None and crc_lido != crc:
+            resultado['falhas'].append(f"{caminho_compactado.name}: '{nome_membro}' com CRC32 {crc_lido:08x}, "
+                                       f"o compactado diz {crc:08x}")
+        else:
+            resultado['verificados'] += 1
+            if manifesto is not None and relativo is not None:
+                manifesto.registrar(relativo, st, hash_conteudo)
+    return resultado
+
+def _emitir_verificacao(resultado: dict):
+    if resultado['falhas']:
+        _emitir(f"🛑 Verificação: {len(resultado['falhas'])} arquivo(s) com problema")
+        for falha in resultado['falhas']:
+            _emitir(f"  • {falha}")
+    else:
+        _emitir(f"🔒 Verificado: {resultado['verificados']} arquivo(s) conferem com o CRC32 "
+                f"({resultado['bytes'] / (1024 * 1024):.2f} MB)")
+
+# Saída dos trabalhos de descompactação em paralelo.
+# Cada thread/processo guarda as mensagens e o processo principal imprime
+# na ordem original da lista, então a saída não se embaralha.
+_saida_local = threading.local()
+
+def _emitir(mensagem: str):
+    buffer = getattr(_saida_local, 'buffer', None)
+    if buffer is None:
+        print(mensagem)
+    else:
+        buffer.append(mensagem)
+
+#Descompacta um compactado da raiz e, com `varrer`, os compactados de dentro dele.
+#Retorna (sucesso, compactados internos descompactados, erros dos internos)
+def descompactar_recursivo(caminho_arquivo: Path, pasta_destino: Path, verbose: bool = True,
+                           filtrar: bool = False, regras: Optional[Regras] = None, varrer: bool = False,
+                           limites: Optional[LimitesExtracao] = None) -> Tuple[bool, int, List[str]]:
+    limites = (limites or LimitesExtracao()).novo()
+    if not descompactar_arquivo(caminho_arquivo, pasta_destino, verbose, filtrar, regras, limites):
+        return False, 0, []
+    if not varrer:
+        return True, 0, []
+    internos, erros = _descompactar_aninhados(pasta_destino, verbose, filtrar, regras, limites)
+    if limites.recusado:
+        # Um compactado interno estourou o orçamento do compactado de fora: o
+        # compactado inteiro é recusado e nada do que já saiu dele fica no disco
+        _emitir(f"🧹 Removendo a extração parcial de {caminho_arquivo.name}")
+        _remover_extracao(pasta_destino)
+        return False, 0, erros
+    return True, internos, erros
+
+# Executado dentro do pool: descompacta e devolve (resultado de descompactar_recursivo,
+# mensagens, métricas medidas no processo do pool ou None)
+def _descompactar_capturando(caminho_arquivo: str, pasta_destino: str, verbose: bool,
+                             filtrar: bool = False, regras: Optional[Regras] = None, varrer: bool = False,
+                             limites: Optional[LimitesExtracao] = None,
+                             medir: bool = False) -> Tuple[Tuple[bool, int, List[str]], List[str], Optional[dict]]:
+    _saida_local.buffer = []
+    # Em processo do pool, METRICAS é outra instância: mede só este trabalho e devolve
+    if medir:
+        METRICAS.zerar()
+        METRICAS.ativo = True
+    try:
+        resultado = descompactar_recursivo(Path(caminho_arquivo), Path(pasta_destino), verbose, filtrar, regras,
+                                           varrer, limites)
+        return resultado, _saida_local.buffer, METRICAS.instantaneo() if medir else None
+    finally:
+        _saida_local.buffer = None
+
+#Varre uma pasta já descompactada procurando compactados DENTRO dela e
+#descompacta cada um ao lado do original (sub.zip → sub_quak/), de forma recursiva.
+def _descompactar_aninhados(pasta: Path, verbose: bool = True, filtrar: bool = False,
+                            regras: Optional[Regras] = None,
+                            limites: Optional[LimitesExtracao] = None) -> Tuple[int, List[str]]:
+    """
+    Args:
+        pasta: Pasta recém descompactada
+        verbose: Se True, mostra detalhes
+        filtrar: Igual ao de descompactar_arquivo
+        regras: Igual ao de descompactar_arquivo
+        limites: Profundidade máxima e orçamento de bytes (compartilhado com o compactado de fora)
+
+    Returns:
+        (quantidade descompactada, lista de erros)
+    """
+    limites = limites or LimitesExtracao()
+    descompactados = 0
+    erros = []
+    pendentes = [(pasta, 1)]
+    while pendentes:
+        atual, profundidade = pendentes.pop()
+        for tipo, valor in percorrer_arvore(str(atual)):
+            if tipo != 'arquivo' or os.path.splitext(valor.name)[1].lower() not in {'.zip', '.rar', '.7z'}:
+                continue
+            caminho = Path(valor.path)
+            destino = caminho.parent / f"{caminho.stem}_quak"
+            if destino.exists():
+                continue
+            if profundidade > limites.profundidade_maxima:
+                _emitir(f"⏭️  Profundidade máxima ({limites.profundidade_maxima}) atingida: {caminho.name} não descompactado")
+                continue
+            destino.mkdir()
+            _emitir(f"📦 Descompactando compactado interno: {caminho.name}")
+            if descompactar_arquivo(caminho, destino, verbose, filtrar, regras, limites):
+                descompactados += 1
+                pendentes.append((destino, profundidade + 1))
+            else:
+                erros.append(f"{caminho.name}: Falha na descompactação")
+                try:
+                    destino.rmdir()
+                except OSError:
+                    pass
+                if limites.recusado:
+                    # Orçamento estourado: o compactado de fora inteiro vai ser descartado
+                    return descompactados, erros
+    return descompactados, erros
+
+#Descompacta todos os arquivos .zip, .rar, .7z encontrados.
+#Cria uma pasta ZIPS com o arquivo compactado e pasta_quak para descompactado
+@_medido('etapa_descompactar_compactados')
+def descompactar_compactados(pasta_raiz: str, arquivos_compactados: List[str], verbose: bool = True,
+                             trabalhadores: int = 1, filtrar_membros: bool = False,
+                             manifesto: Optional[Manifesto] = None, regras: Optional[Regras] = None,
+                             varrer_zips: bool = False, limites: Optional[LimitesExtracao] = None,
+                             registro: Optional[RegistroArquivos] = None, verificar: int = 0) -> dict:
+    
+    """
+    Args:
+        pasta_raiz: Caminho da pasta raiz
+        arquivos_compactados: Lista de arquivos compactados para descompactar
+        verbose: Se True, mostra detalhes
+        trabalhadores: Quantas descompactações ao mesmo tempo (1 = uma por vez).
+            ZIPs rodam num pool de processos; RAR/7Z em subprocessos limitados.
+        filtrar_membros: Se True, lixo dentro dos ZIPs não é extraído
+        manifesto: Se informado, compactados já descompactados (e inalterados) não são extraídos de novo
+        regras: Regras usadas por filtrar_membros
+        varrer_zips: Também descompacta compactados que estavam dentro dos compactados
+        limites: Profundidade, tamanho expandido e razão de compressão máximos
+        registro: Se informado, cada compactado descompactado/movido é gravado nele
+        verificar: Threads da verificação (CRC32 + SHA-256) de cada extração; 0 = não verifica
+
+    Returns:
+        Dicionário com estatísticas
+    """
+    
+    pasta_raiz = Path(pasta_raiz)
+    pasta_zips_path = pasta_raiz / PASTA_ZIPS
+    
+    estatisticas = {
+        'arquivos_descompactados': 0,
+        'erros': [],
+        'compactados_movidos': 0,
+        'ja_descompactados': 0,
+        'arquivos_verificados': 0,
+        'descompactados_incompletos': 0,
+    }
+
+    if not arquivos_compactados:
+        print("\n✅ Nenhum arquivo compactado encontrado!")
+        return estatisticas
+
+    # Cria pasta ZIPS se não existir
+    if not pasta_zips_path.exists():
+        pasta_zips_path.mkdir(exist_ok=True, parents=True)
+        print(f"📁 Pasta criada: {PASTA_ZIPS}/")
+
+    print(f"\n{'=' * 120}")
+    print(f"📦 DESCOMPACTANDO {len(arquivos_compactados)} ARQUIVO(S) COMPACTADO(S)")
+    print(f"{'=' * 120}")
+
+    pool_processos = None
+    pool_threads = None
+    if trabalhadores > 1:
+        pool_processos = ProcessPoolExecutor(max_workers=trabalhadores)
+        pool_threads = ThreadPoolExecutor(max_workers=trabalhadores)
+    pool_verificacao = ThreadPoolExecutor(max_workers=verificar) if verificar > 0 else None
+    filtro = (regras or REGRAS_PADRAO) if filtrar_membros else None
+
+    try:
+        # Prepara as pastas e (em paralelo) já dispara as descompactações
+        trabalhos = []
+        for nome_arquivo in arquivos_compactados:
+            caminho_arquivo = pasta_raiz / nome_arquivo
+            
+            if not caminho_arquivo.exists():
+                trabalhos.append((nome_arquivo, None, None, None))
+                continue
+
             try:
-                # Tenta localizar 7z ou WinRAR
-                programas = [
-                    'C:\\Program Files\\7-Zip\\7z.exe',
-                    'C:\\Program Files (x86)\\7-Zip\\7z.exe',
-                    'C:\\Program Files\\WinRAR\\UnRAR.exe',
-                    'C:\\Program Files (x86)\\WinRAR\\UnRAR.exe',
-                    '7z',
-                    'unrar',
-                ]
+                # Cria pasta com nome do arquivo + "quak" DENTRO de ZIPS
+                # voce pode mudar o sufixo se quiser
+                nome_base = Path(nome_arquivo).stem  # Nome sem extensão
+                nome_pasta = f"{nome_base}_quak" #<-- você pode mudar o sufixo aqui se quiser
+                pasta_destino = pasta_zips_path / nome_pasta
                 
-                executado = False
-                for programa in programas:
-                    try:
-                        if extensao == '.rar':
-                            # Tenta com UnRAR
-                            if 'unrar' in programa.lower() or 'winrar' in programa.lower():
-                                subprocess.run(
-                                    [programa, 'x', str(caminho_arquivo), str(pasta_destino)],
-                                    check=True,
-                                    capture_output=True,
-                                    timeout=60
-                                )
-                                executado = True
-                                if verbose:
-                                    print(f"✅ RAR descompactado com sucesso!")
-                                break
-                            # Tenta com 7z
-                            else:
-                                subprocess.run(
-                                    [programa, 'x', str(caminho_arquivo), f'-o{str(pasta_destino)}'],
-                                    check=True,
-                                    capture_output=True,
-                                    timeout=60
-                                )
-                                executado = True
-                                if verbose:
-                                    print(f"✅ RAR descompactado com sucesso!")
-                                break
-                        else:  # .7z
-                            subprocess.run(
-                                [programa, 'x', str(caminho_arquivo), f'-o{str(pasta_destino)}'],
-                                check=True,
-                                capture_output=True,
-                                timeout=60
-                            )
-                            executado = True
-                            if verbose:
-                                print(f"✅ 7Z descompactado com sucesso!")
-                            break
-                    except (FileNotFoundError, subprocess.CalledProcessError, subprocess.TimeoutExpired):
-                        continue
+                # Já descompactado numa execução anterior: não extrai de novo
+                st_compactado = caminho_arquivo.stat()
+                if manifesto is not None and pasta_destino.is_dir() and \
+                        manifesto.compactado_extraido(nome_arquivo, st_compactado):
+                    trabalhos.append((nome_arquivo, nome_pasta, pasta_destino, True))
+                    continue
+
+                # Cria a pasta de destino se não existir
+                pasta_destino.mkdir(exist_ok=True, parents=True)
+
+                futuro = None
+                if pool_processos is not None:
+                    # zipfile roda no próprio Python: processos usam todos os núcleos.
+                    # 7z/unrar já são processos externos: threads só esperam por eles.
+                    pool = pool_processos if caminho_arquivo.suffix.lower() == '.zip' else pool_threads
+                    processo = pool is pool_processos
+                    futuro = pool.submit(_descompactar_capturando, str(caminho_arquivo), str(pasta_destino),
+                                         verbose, filtrar_membros, regras, varrer_zips, limites,
+                                         METRICAS.ativo and processo)
+                trabalhos.append((nome_arquivo, nome_pasta, pasta_destino, futuro))
+            except Exception as e:
+                trabalhos.append((nome_arquivo, None, None, e))
+
+        # Resultados sempre na ordem da lista: saída e estatísticas determinísticas
+        for nome_arquivo, nome_pasta, pasta_destino, futuro in trabalhos:
+            caminho_arquivo = pasta_raiz / nome_arquivo
+
+            if pasta_destino is None:
+                if isinstance(futuro, Exception):
+                    print(f"❌ Erro geral ao processar {nome_arquivo}: {futuro}")
+                    estatisticas['erros'].append(f"{nome_arquivo}: {str(futuro)}")
+                else:
+                    print(f"\n⚠️  Arquivo não encontrado: {nome_arquivo}")
+                continue
+
+            try:
+                print(f"\n📦 Descompactando: {nome_arquivo}")
+                print(f"📁 Criando pasta: {PASTA_ZIPS}/{nome_pasta}/")
                 
-                if executado:
-                    return True
+                # Tenta descompactar
+                st_compactado = caminho_arquivo.stat()
+                internos, erros_internos = 0, []
+                if futuro is True:
+                    sucesso = True
+                    estatisticas['ja_descompactados'] += 1
+                    print(f"⏭️  Já descompactado antes (inalterado): {PASTA_ZIPS}/{nome_pasta}/")
+                elif futuro is None:
+                    sucesso, internos, erros_internos = descompactar_recursivo(
+                        caminho_arquivo, pasta_destino, verbose, filtrar_membros, regras, varrer_zips, limites)
                 else:
-                    print(f"⚠️  Nenhum descompactador disponível para {extensao}")
-                    print(f"    Instale: 7-Zip ou WinRAR para descompactar {extensao}")
-                    return False
+                    (sucesso, internos, erros_internos), mensagens, metricas = futuro.result()
+                    if metricas is not None:
+                        METRICAS.mesclar(metricas)
+                    for mensagem in mensagens:
+                        print(mensagem)
+                estatisticas['arquivos_descompactados'] += internos
+                estatisticas['erros'].extend(erros_internos)
+                
+                if sucesso:
+                    conferido = True
+                    if futuro is not True:
+                        extras = {'falhas_internas': len(erros_internos)} if erros_internos else {}
+                        if erros_internos:
+                            # O de fora saiu, mas algum compactado dentro dele não: extração incompleta
+                            # (fora do manifesto, como uma verificação que falhou)
+                            estatisticas['descompactados_incompletos'] += 1
+                            conferido = False
+                            print(f"⚠️  Descompactado em {PASTA_ZIPS}/{nome_pasta}/, mas "
+                                  f"{len(erros_internos)} compactado(s) interno(s) falharam")
+                        else:
+                            estatisticas['arquivos_descompactados'] += 1
+                            print(f"✅ Descompactado com sucesso em: {PASTA_ZIPS}/{nome_pasta}/")
+                        if registro is not None:
+                            registro.registrar('descompactar', 'extrair', nome_arquivo, f"{PASTA_ZIPS}/{nome_pasta}",
+                                               internos=internos, **extras)
+                        if pool_verificacao is not None:
+                            verificacao = verificar_extracao(caminho_arquivo, pasta_destino, pool_verificacao, filtro,
+                                                             manifesto, pasta_raiz)
+                            _emitir_verificacao(verificacao)
+                            estatisticas['arquivos_verificados'] += verificacao['verificados']
+                            estatisticas['erros'].extend(verificacao['falhas'])
+                            conferido = conferido and not verificacao['falhas']
+                            if registro is not None and verificacao['falhas']:
+                                registro.registrar('descompactar', 'verificar', nome_arquivo,
+                                                   falhas=verificacao['falhas'])
+                        # Compactado que falhou na verificação não entra no manifesto:
+                        # a próxima execução incremental extrai e confere de novo
+                        if manifesto is not None:
+                            manifesto.registrar_pasta(pasta_destino)
+                            if conferido:
+                                manifesto.registrar_compactado(nome_arquivo, st_compactado)
                     
+                    # Move o arquivo compactado para pasta ZIPS
+                    try:
+                        caminho_novo_zip = pasta_zips_path / nome_arquivo
+                        MOVEDOR.mover(str(caminho_arquivo), str(caminho_novo_zip), sobrescrever=True)
+                        estatisticas['compactados_movidos'] += 1
+                        print(f"📦 Arquivo compactado movido para: {PASTA_ZIPS}/{nome_arquivo}")
+                        if registro is not None:
+                            registro.registrar('descompactar', 'mover', nome_arquivo, f"{PASTA_ZIPS}/{nome_arquivo}")
+                        if manifesto is not None and conferido:
+                            manifesto.registrar(f"{PASTA_ZIPS}/{nome_arquivo}", st_compactado)
+                    except Exception as e:
+                        print(f"⚠️  Erro ao mover {nome_arquivo}: {e}")
+                else:
+                    estatisticas['erros'].append(f"{nome_arquivo}: Falha na descompactação")
+                    # Remove pasta vazia se falhou
+                    try:
+                        if pasta_destino.exists() and not any(pasta_destino.iterdir()):
+                            pasta_destino.rmdir()
+                    except:
+                        pass
+
             except Exception as e:
-                print(f"❌ Erro ao descompactar {extensao}: {e}")
-                return False
+                print(f"❌ Erro geral ao processar {nome_arquivo}: {e}")
+                estatisticas['erros'].append(f"{nome_arquivo}: {str(e)}")
+    finally:
+        if pool_processos is not None:
+            pool_processos.shutdown()
+            pool_threads.shutdown()
+        if pool_verificacao is not None:
+            pool_verificacao.shutdown()
+
+    return estatisticas
+
+# Nomes classificados da raiz que ficam na memória (em bytes de JSON) durante a
+# organização; além disso vão para um arquivo temporário
+MEMORIA_NOMES_RAIZ = 4 * 1024 * 1024
+
+#Organiza os arquivos em pastas de acordo com a extensão.
+#NÃO move compactados (.zip, .rar, .7z) e não move LimpaZipUTF.py
+@_medido('etapa_organizar_por_extensao')
+def organizar_por_extensao(pasta_raiz: str, modo_simulacao: bool = True, verbose: bool = True,
+                           manifesto: Optional[Manifesto] = None, regras: Optional[Regras] = None,
+                           nomes: Optional[List[str]] = None, plano: Optional[Plano] = None,
+                           registro: Optional[RegistroArquivos] = None, retomar: bool = False) -> dict:
+    
+    """
+    Args:
+        pasta_raiz: Caminho da pasta raiz
+        modo_simulacao: Se True, apenas mostra o que seria movido
+        verbose: Se True, mostra detalhes
+        manifesto: Se informado, registra onde cada arquivo foi parar
+        regras: Regras compiladas (None = regras embutidas no script)
+        nomes: Arquivos da raiz a considerar (None = lista a raiz). Usado pelo plano,
+            quando os arquivos ainda não foram movidos para a raiz
+        plano: Se informado, cada movimento (feito ou simulado) é gravado nele
+        registro: Se informado, cada arquivo movido é gravado nele (em disco)
+        retomar: Termina movimentos que ficaram pela metade numa execução interrompida
+
+    Returns:
+        Dicionário com estatísticas (só contadores: memória constante)
+    """
+    
+    pasta_raiz = Path(pasta_raiz)
+    regras = regras or REGRAS_PADRAO
+
+    if not pasta_raiz.exists():
+        raise ValueError(f"Pasta não encontrada: {pasta_raiz}")
+
+    estatisticas = {
+        'arquivos_movidos': 0,
+        'pastas_criadas': 0,
+        'por_categoria': {},
+    }
+
+    print(f"\n{'[SIMULAÇÃO]' if modo_simulacao else '[EXECUÇÃO]'} Organizando por extensão: {pasta_raiz}")
+    print("-" * 120)
+
+    def nomes_da_raiz() -> Iterator[str]:
+        if nomes is not None:
+            yield from nomes
+            return
+        with os.scandir(pasta_raiz) as it:
+            for entrada in it:
+                if entrada.is_file():
+                    yield entrada.name
+
+    # Classifica; devolve a categoria ou None (com o motivo, para o verbose)
+    def classificar(nome: str) -> Tuple[Optional[str], Optional[str]]:
+        categoria = regras.categoria(nome)
+        if categoria is None:
+            return None, None
+        # Pula o arquivo do organizador
+        if nome == ARQUIVO_ORGANIZADOR:
+            return None, f"⏭️  IGNORANDO: {nome} (arquivo do organizador)"
+        # Pula arquivos compactados (eles são movidos para ZIPS)
+        if os.path.splitext(nome)[1].lower() in {'.zip', '.rar', '.7z'}:
+            return None, f"⏭️  IGNORANDO: {nome} (arquivo compactado - será movido para ZIPS)"
+        return categoria, None
+
+    # Uma passada só pela raiz: cada nome é listado e classificado uma vez, e o
+    # preview sai das contagens dessa mesma passada. Os movimentos vêm depois,
+    # com a listagem já fechada: o POSIX não garante o que o readdir devolve
+    # quando entradas somem (arquivos movidos) ou surgem (pastas das categorias)
+    # no meio dela. Até lá os classificados ficam numa linha JSON cada, na
+    # memória até MEMORIA_NOMES_RAIZ e depois num arquivo temporário: a memória
+    # não cresce com o tamanho da raiz.
+    contagem_por_categoria = {cat: 0 for cat in regras.categorias}
+    with tempfile.SpooledTemporaryFile(max_size=MEMORIA_NOMES_RAIZ, mode='w+', encoding='utf-8') as classificados:
+        for nome in nomes_da_raiz():
+            categoria, motivo = classificar(nome)
+            if categoria is not None:
+                contagem_por_categoria[categoria] += 1
+                classificados.write(json.dumps([nome, categoria, None]) + '\n')
+            elif motivo and verbose:
+                classificados.write(json.dumps([nome, None, motivo]) + '\n')
+
+        # Mostrar preview
+        print("\n📊 PREVIEW - Arquivos por categoria:")
+        print("-" * 120)
+        for categoria, quantidade in contagem_por_categoria.items():
+            if quantidade > 0:
+                print(f"  📁 {categoria}: {quantidade} arquivo(s)")
+
+        # Processar movimentos, na ordem da listagem
+        pastas_prontas = set()
+        nomes_reservados = set() if modo_simulacao else None
+        classificados.seek(0)
+        for linha in classificados:
+            nome, categoria, motivo = json.loads(linha)
+            if categoria is None:
+                print(motivo)
+                continue
+            try:
+                _mover_para_categoria(pasta_raiz, nome, categoria, estatisticas, pastas_prontas, modo_simulacao,
+                                      verbose, manifesto, plano, nomes_reservados, registro, retomar)
+            except Exception as e:
+                print(f"⚠️  Erro ao mover {nome}: {e}")
+                if registro is not None:
+                    registro.registrar('organizar', 'erro', nome, erro=str(e))
+
+    return estatisticas
+
+
+# Move UM arquivo da raiz para a pasta da sua categoria
+# (usado pela organização por extensão e pelo modo pipeline)
+def _mover_para_categoria(pasta_raiz: Path, nome: str, categoria: str, estatisticas: dict,
+                          pastas_prontas: Set[str], modo_simulacao: bool, verbose: bool,
+                          manifesto: Optional[Manifesto] = None, plano: Optional[Plano] = None,
+                          nomes_reservados: Optional[Set[str]] = None,
+                          registro: Optional[RegistroArquivos] = None, retomar: bool = False):
+    # Cria pasta se não existir
+    pasta_categoria = pasta_raiz / categoria
+
+    if retomar and not modo_simulacao and _movimento_pela_metade(str(pasta_raiz / nome), str(pasta_categoria / nome)):
+        if verbose:
+            print(f"🔁 CONCLUÍDO (execução interrompida): {nome} → {categoria}/")
+        estatisticas['arquivos_movidos'] += 1
+        if registro is not None:
+            registro.registrar('organizar', 'mover', nome, f"{categoria}/{nome}", retomado=True)
+        return
+
+    if not modo_simulacao and categoria not in pastas_prontas:
+        if not pasta_categoria.exists():
+            pasta_categoria.mkdir(exist_ok=True)
+            estatisticas['pastas_criadas'] += 1
+        pastas_prontas.add(categoria)
+
+    # Mesmo nome já na categoria: não sobrescreve
+    novo_nome = _nome_livre(pasta_categoria, nome, nomes_reservados)
+    novo_caminho = pasta_categoria / novo_nome
+
+    if verbose:
+        print(f"📂 MOVENDO: {nome} → {categoria}/{novo_nome if novo_nome != nome else ''}")
+
+    estatisticas['arquivos_movidos'] += 1
+    por_categoria = estatisticas['por_categoria']
+    por_categoria[categoria] = por_categoria.get(categoria, 0) + 1
+    if plano is not None:
+        plano.registrar('mover', nome, f"{categoria}/{novo_nome}")
+    if registro is not None:
+        registro.registrar('organizar', 'mover', nome, f"{categoria}/{novo_nome}")
+
+    if not modo_simulacao:
+        arquivo = pasta_raiz / nome
+        st = arquivo.stat()
+        MOVEDOR.mover(str(arquivo), str(novo_caminho))
+        if manifesto is not None:
+            manifesto.registrar(f"{categoria}/{novo_nome}", st)
+
+#Índice do conteúdo dos compactados, sem descompactar nada: só o diretório
+#central do ZIP (ou a listagem do 7z/rar). Uma linha JSON por compactado:
+#  {"compactado": "Aula 1/slides.zip", "tamanho": ..., "mtime": ...,
+#   "membros": [[nome, tamanho, crc, categoria], ...]}
+#Compactados que não mudaram desde o último índice nem são abertos de novo.
+ARQUIVO_INDICE_COMPACTADOS = 'indice_compactados.jsonl'
+
+def _caminho_indice_compactados(pasta_raiz: str, caminho: Optional[str] = None) -> str:
+    return caminho or os.path.join(str(pasta_raiz), PASTA_ESTADO, ARQUIVO_INDICE_COMPACTADOS)
+
+# Membros de UM compactado: (lista de [nome, tamanho, crc, categoria], erro ou None)
+def _membros_compactado(caminho: str, regras: Regras) -> Tuple[List[list], Optional[str]]:
+    extensao = os.path.splitext(caminho)[1].lower()
+    try:
+        if extensao == '.zip':
+            with zipfile.ZipFile(caminho, 'r') as zip_ref:
+                membros = [(info.filename, info.file_size, info.compress_size, info.CRC)
+                           for info in zip_ref.infolist() if not info.is_dir()]
         else:
-            print(f"❌ Formato não suportado: {extensao}")
-            return False
-            
-    except Exception as e:
-        print(f"❌ Erro geral: {e}")
-        return False
+            membros = None
+            erro = f"nenhum descompactador disponível para {extensao}"
+            for backend in backends_disponiveis().get(extensao, []):
+                try:
+                    membros = backend.indexar(Path(caminho))
+                except Exception as e:
+                    erro = f"{backend.nome}: {e}"
+                    continue
+                if membros is not None:
+                    break
+            if membros is None:
+                return [], erro
+    except (OSError, zipfile.BadZipFile) as e:
+        return [], str(e)
+    return [[nome, tamanho, None if crc is None else f"{crc:08x}",
+             regras.categoria(nome.replace('\\', '/').rsplit('/', 1)[-1])]
+            for nome, tamanho, _, crc in membros], None
+
+@_medido('indexacao')
+def indexar_compactados(pasta_raiz: str, caminho_indice: Optional[str] = None, regras: Optional[Regras] = None,
+                        trabalhadores: int = 1, varredores: int = 1, verbose: bool = True) -> dict:
+    """
+    Args:
+        pasta_raiz: Pasta onde procurar compactados (em qualquer nível, inclusive ZIPS/)
+        caminho_indice: Arquivo do índice (None = .limpazip/indice_compactados.jsonl)
+        regras: Regras usadas para dar a categoria de cada membro
+        trabalhadores: Compactados lidos ao mesmo tempo (threads)
+        varredores: Igual ao de extrair_e_organizar
+
+    Returns:
+        Estatísticas: compactados, membros, bytes dos membros, reaproveitados, erros
+    """
+    raiz_str = str(pasta_raiz)
+    regras = regras or REGRAS_PADRAO
+    caminho_indice = _caminho_indice_compactados(raiz_str, caminho_indice)
+    estatisticas = {'compactados': 0, 'membros': 0, 'bytes_membros': 0, 'reaproveitados': 0, 'erros': []}
+
+    # Índice anterior: só (tamanho, mtime) e a linha pronta de cada compactado
+    anterior = {}
+    if os.path.isfile(caminho_indice):
+        with open(caminho_indice, 'r', encoding='utf-8') as f:
+            for linha in f:
+                try:
+                    dados = json.loads(linha)
+                    anterior[dados['compactado']] = (dados['tamanho'], dados['mtime'], linha.rstrip('\n'))
+                except (ValueError, KeyError):
+                    continue
+
+    encontrados = []
+    for tipo, valor in percorrer_arvore(raiz_str, {PASTA_ESTADO}, varredores):
+        if tipo == 'arquivo' and os.path.splitext(valor.name)[1].lower() in {'.zip', '.rar', '.7z'}:
+            try:
+                st = valor.stat()
+            except OSError:
+                continue
+            encontrados.append((_relativo(valor.path, raiz_str).replace(os.sep, "/"), valor.path, st))
+
+    def ler(item: Tuple[str, str, os.stat_result]) -> Tuple[str, Optional[str], int, int]:
+        relativo, caminho, st = item
+        antigo = anterior.get(relativo)
+        if antigo is not None and antigo[0] == st.st_size and antigo[1] == st.st_mtime:
+            dados = json.loads(antigo[2])
+            return antigo[2], None, len(dados['membros']), sum(membro[1] for membro in dados['membros'])
+        membros, erro = _membros_compactado(caminho, regras)
+        linha = json.dumps({'compactado': relativo, 'tamanho': st.st_size, 'mtime': st.st_mtime,
+                            'membros': membros}, ensure_ascii=False)
+        return linha, erro, len(membros), sum(membro[1] for membro in membros)
+
+    os.makedirs(os.path.dirname(caminho_indice) or os.curdir, exist_ok=True)
+    temporario = caminho_indice + '.tmp'
+    with open(temporario, 'w', encoding='utf-8') as f, ThreadPoolExecutor(max_workers=max(1, trabalhadores)) as pool:
+        # map devolve na ordem da varredura: o índice sai igual com 1 ou N threads
+        for (relativo, _, _), (linha, erro, quantidade, total) in zip(encontrados, pool.map(ler, encontrados)):
+            f.write(linha + '\n')
+            estatisticas['compactados'] += 1
+            estatisticas['membros'] += quantidade
+            estatisticas['bytes_membros'] += total
+            if relativo in anterior and erro is None and linha == anterior[relativo][2]:
+                estatisticas['reaproveitados'] += 1
+            if erro is not None:
+                estatisticas['erros'].append(f"{relativo}: {erro}")
+            if verbose:
+                print(f"🗂️  {relativo}: {quantidade} arquivo(s){' ⚠️  ' + erro if erro else ''}")
+    os.replace(temporario, caminho_indice)
+    return estatisticas
+
+#Procura no índice (sem abrir nenhum compactado). Gera
+#(compactado, membro, tamanho, crc, categoria) de cada membro escolhido.
+def buscar_no_indice(caminho_indice: str, selecao: SeletorMembros) -> Iterator[Tuple[str, str, int, Optional[str], Optional[str]]]:
+    with open(caminho_indice, 'r', encoding='utf-8') as f:
+        for linha in f:
+            try:
+                dados = json.loads(linha)
+            except ValueError:
+                continue
+            for nome, tamanho, crc, categoria in dados['membros']:
+                if selecao.aceita(nome, categoria):
+                    yield dados['compactado'], nome, tamanho, crc, categoria
+
+#Estimativa antes de executar (opcional, --estimar): quanto vai ser escrito,
+#quanto espaço falta e quanto tempo deve levar. O espaço vem dos cabeçalhos dos
+#compactados (sem descompactar) e dos arquivos que mudam de dispositivo (cópia,
+#não rename); o tempo vem de um teste rápido de escrita no próprio disco da raiz.
+#Com --incremental, o que o manifesto já conhece não entra na conta.
+TAMANHO_TESTE_DISCO = 32 * 1024 * 1024  # bytes escritos no teste de vazão
+OPERACOES_TESTE_DISCO = 200             # renomeações no teste de metadados
+MARGEM_ESPACO = 0.05                    # folga exigida além do estimado (5%)
+
+#Mede a vazão de escrita (MB/s, com fsync) e de operações de metadados
+#(renomeações por segundo) na pasta. O teste roda dentro de .limpazip (mesmo
+#disco, fora da árvore do usuário) e os arquivos de teste são apagados.
+def medir_vazao_disco(pasta: str, tamanho: int = TAMANHO_TESTE_DISCO,
+                      operacoes: int = OPERACOES_TESTE_DISCO) -> Tuple[float, float]:
+    pasta_teste = os.path.join(pasta, PASTA_ESTADO)
+    os.makedirs(pasta_teste, exist_ok=True)
+    descritor, caminho = tempfile.mkstemp(prefix='teste_disco_', dir=pasta_teste)
+    bloco = os.urandom(TAMANHO_BUFFER_ZIP)
+    try:
+        inicio = time.perf_counter()
+        escritos = 0
+        while escritos < tamanho:
+            escritos += os.write(descritor, bloco)
+        os.fsync(descritor)
+        segundos_escrita = time.perf_counter() - inicio
+    finally:
+        os.close(descritor)
+
+    try:
+        inicio = time.perf_counter()
+        atual = caminho
+        for i in range(operacoes):
+            proximo = f"{caminho}.{i % 2}"
+            os.replace(atual, proximo)
+            atual = proximo
+        segundos_metadados = time.perf_counter() - inicio
+    finally:
+        os.remove(atual)
+
+    mb_por_segundo = (escritos / (1024 * 1024)) / max(segundos_escrita, 1e-6)
+    operacoes_por_segundo = operacoes / max(segundos_metadados, 1e-6)
+    return mb_por_segundo, operacoes_por_segundo
+
+@_medido('estimativa')
+def estimar_execucao(pasta_raiz: str, regras: Optional[Regras] = None, filtrar: bool = False,
+                     varredores: int = 1, medir: bool = True, manifesto: Optional[Manifesto] = None) -> dict:
+    """
+    Args:
+        pasta_raiz: Caminho da pasta raiz
+        regras: Regras compiladas (None = regras embutidas no script)
+        filtrar: Igual ao --filtrar-compactados (só conta os membros que seriam extraídos)
+        varredores: Igual ao de extrair_e_organizar
+        medir: Se False, não faz o teste de disco (sem estimativa de tempo)
+        manifesto: Se informado (--incremental), pula arquivos inalterados e compactados já descompactados
+
+    Returns:
+        Dicionário com bytes a escrever, espaço livre/necessário, vazão medida e tempo estimado
+    """
+    raiz_str = str(pasta_raiz)
+    regras = regras or REGRAS_PADRAO
+    dispositivo_raiz = os.stat(raiz_str).st_dev
+    pasta_zips = os.path.join(raiz_str, PASTA_ZIPS)
+
+    estimativa = {
+        'arquivos_movidos': 0,
+        'bytes_movidos': 0,
+        'bytes_entre_dispositivos': 0,
+        'arquivos_removidos': 0,
+        'compactados': 0,
+        'bytes_compactados': 0,
+        'bytes_expandidos': 0,
+        'membros_extraidos': 0,
+        'compactados_sem_cabecalho': [],
+    }
+
+    for tipo, valor in percorrer_arvore(raiz_str, {PASTA_ESTADO}, varredores):
+        if tipo != 'arquivo':
+            continue
+        try:
+            if not valor.is_file():
+                continue
+            st = valor.stat()
+        except OSError:
+            continue
+        na_raiz = os.path.dirname(valor.path) == raiz_str
+        # Mesmo critério da execução incremental: o que não mudou não gera trabalho
+        if manifesto is not None and not na_raiz and \
+                manifesto.inalterado(_relativo(valor.path, raiz_str), st, marcar=False):
+            continue
+        if regras.classificar(valor.name, st.st_size, st.st_mtime) is None:
+            if not na_raiz:
+                estimativa['arquivos_removidos'] += 1
+            continue
+        if not na_raiz:
+            estimativa['arquivos_movidos'] += 1
+            estimativa['bytes_movidos'] += st.st_size
+            # Outro dispositivo: o "movimento" é uma cópia inteira para o disco da raiz
+            if st.st_dev != dispositivo_raiz:
+                estimativa['bytes_entre_dispositivos'] += st.st_size
+
+        # Compactados já guardados em ZIPS não são descompactados de novo
+        if os.path.splitext(valor.name)[1].lower() in {'.zip', '.rar', '.7z'} and \
+                not valor.path.startswith(os.path.join(pasta_zips, '')):
+            if manifesto is not None and na_raiz and manifesto.compactado_extraido(valor.name, st):
+                continue
+            estimativa['compactados'] += 1
+            estimativa['bytes_compactados'] += st.st_size
+            membros, erro = _membros_compactado(valor.path, regras)
+            if erro is not None:
+                estimativa['compactados_sem_cabecalho'].append(f"{_relativo(valor.path, raiz_str)}: {erro}")
+                continue
+            for nome, tamanho, _, _ in membros:
+                if not filtrar or regras.manter_membro(nome, tamanho):
+                    estimativa['membros_extraidos'] += 1
+                    estimativa['bytes_expandidos'] += tamanho
+
+    uso = shutil.disk_usage(raiz_str)
+    estimativa['bytes_escritos'] = estimativa['bytes_entre_dispositivos'] + estimativa['bytes_expandidos']
+    estimativa['espaco_necessario'] = int(estimativa['bytes_escritos'] * (1 + MARGEM_ESPACO))
+    estimativa['espaco_livre'] = uso.free
+    estimativa['espaco_suficiente'] = estimativa['espaco_necessario'] <= uso.free
+
+    estimativa['mb_por_segundo'] = estimativa['operacoes_por_segundo'] = estimativa['segundos_estimados'] = None
+    # Sem espaço, nem o arquivo do teste é escrito
+    if medir and estimativa['espaco_suficiente']:
+        try:
+            mb_por_segundo, operacoes_por_segundo = medir_vazao_disco(
+                raiz_str, min(TAMANHO_TESTE_DISCO, max(uso.free // 10, 1024 * 1024)))
+        except OSError as e:
+            print(f"⚠️  Teste de disco falhou ({e}): sem estimativa de tempo")
+        else:
+            # Movimento para a raiz + organização por categoria, remoções e um arquivo por membro extraído
+            operacoes = 2 * estimativa['arquivos_movidos'] + estimativa['arquivos_removidos'] + \
+                estimativa['membros_extraidos']
+            estimativa['mb_por_segundo'] = mb_por_segundo
+            estimativa['operacoes_por_segundo'] = operacoes_por_segundo
+            estimativa['segundos_estimados'] = estimativa['bytes_escritos'] / (1024 * 1024) / mb_por_segundo + \
+                operacoes / operacoes_por_segundo
+    return estimativa
+
+def imprimir_estimativa(estimativa: dict):
+    """Imprime a estimativa de espaço e tempo."""
+    def mb(valor: int) -> str:
+        return f"{valor / (1024 * 1024):.2f} MB"
+
+    print("\n" + "=" * 120)
+    print("🧮 ESTIMATIVA DA EXECUÇÃO")
+    print("=" * 120)
+    print(f"Arquivos a mover para a raiz: {estimativa['arquivos_movidos']} ({mb(estimativa['bytes_movidos'])}, "
+          f"{mb(estimativa['bytes_entre_dispositivos'])} copiados de outro dispositivo)")
+    print(f"Arquivos a remover: {estimativa['arquivos_removidos']}")
+    print(f"Compactados: {estimativa['compactados']} ({mb(estimativa['bytes_compactados'])}) → "
+          f"{estimativa['membros_extraidos']} arquivo(s), {mb(estimativa['bytes_expandidos'])} expandidos "
+          f"(pelos cabeçalhos)")
+    for aviso in estimativa['compactados_sem_cabecalho']:
+        print(f"  ⚠️  Tamanho desconhecido: {aviso}")
+    print(f"Bytes a escrever: {mb(estimativa['bytes_escritos'])} | Espaço necessário (com folga): "
+          f"{mb(estimativa['espaco_necessario'])} | Livre: {mb(estimativa['espaco_livre'])}")
+    if estimativa['segundos_estimados'] is not None:
+        print(f"Disco: {estimativa['mb_por_segundo']:.0f} MB/s, {estimativa['operacoes_por_segundo']:.0f} operações/s "
+              f"→ tempo estimado: {estimativa['segundos_estimados']:.1f}s")
+    if not estimativa['espaco_suficiente']:
+        print(f"🛑 ESPAÇO INSUFICIENTE: faltam "
+              f"{mb(estimativa['espaco_necessario'] - estimativa['espaco_livre'])}")
+    print("=" * 120)
+
+#Gera o plano completo (extrair → descompactar → organizar) numa única
+#varredura, sem mexer em nada. O plano pode ser revisado e depois aplicado.
+def gerar_plano(pasta_raiz: str, caminho_plano: str, verbose: bool = True, deduplicar: Optional[str] = None,
+                manifesto: Optional[Manifesto] = None, regras: Optional[Regras] = None,
+                filtrar_membros: bool = False, varredores: int = 1) -> dict:
+    """
+    Args:
+        pasta_raiz: Caminho da pasta raiz
+        caminho_plano: Arquivo .jsonl onde o plano será gravado
+        verbose: Se True, mostra detalhes
+        deduplicar: Igual ao de extrair_e_organizar
+        manifesto: Igual ao de extrair_e_organizar
+        regras: Regras compiladas (None = regras embutidas no script)
+        filtrar_membros: Grava nas extrações que o lixo dentro dos ZIPs deve ser pulado
+        varredores: Igual ao de extrair_e_organizar
+
+    Returns:
+        Estatísticas do passo 1 (mesmo formato de extrair_e_organizar) + 'operacoes_planejadas'
+    """
+    pasta_raiz = Path(pasta_raiz)
+
+    with Plano(caminho_plano, pasta_raiz) as plano:
+        # 1️⃣ Extração para a raiz (simulada, gravando as operações)
+        estatisticas = extrair_e_organizar(str(pasta_raiz), True, verbose, deduplicar, manifesto, regras, plano,
+                                            varredores=varredores)
+
+        # 2️⃣ Descompactação de cada compactado encontrado
+        for nome_arquivo in estatisticas['arquivos_compactados_encontrados']:
+            nome_pasta = f"{Path(nome_arquivo).stem}_quak"
+            extras = {'filtrar': True} if filtrar_membros else {}
+            plano.registrar('extrair', nome_arquivo, f"{PASTA_ZIPS}/{nome_pasta}", **extras)
+            plano.registrar('mover', nome_arquivo, f"{PASTA_ZIPS}/{nome_arquivo}")
+
+        # 3️⃣ Organização do que vai estar na raiz depois dos passos anteriores
+        with os.scandir(pasta_raiz) as it:
+            nomes = [entrada.name for entrada in it if entrada.is_file()]
+        nomes.extend(plano.nomes_na_raiz)
+        organizar_por_extensao(str(pasta_raiz), True, verbose, None, regras, nomes, plano)
+
+        estatisticas['operacoes_planejadas'] = plano.total
+
+    print(f"\n📝 Plano com {estatisticas['operacoes_planejadas']} operação(ões) salvo em: {caminho_plano}")
+    return estatisticas
+
+
+# Tamanho máximo de um lote de operações iguais executadas juntas
+TAMANHO_LOTE_PLANO = 10000
+
+#Executa um plano gerado por gerar_plano, sem varrer a árvore de novo.
+#Operações iguais e consecutivas são executadas em lotes ordenados por pasta
+#(melhor uso do cache de diretórios do sistema operacional) e os movimentos
+#usam o Movedor (rename no mesmo disco, cópia no kernel entre discos).
+@_medido('etapa_aplicar_plano')
+def aplicar_plano(pasta_raiz: str, caminho_plano: str, verbose: bool = True,
+                  regras: Optional[Regras] = None, limites: Optional[LimitesExtracao] = None,
+                  registro: Optional[RegistroArquivos] = None, pular: int = 0) -> dict:
+    """
+    Args:
+        pasta_raiz: Caminho da pasta raiz
+        caminho_plano: Arquivo .jsonl gerado por gerar_plano
+        verbose: Se True, mostra detalhes
+        regras: Regras usadas pelas extrações marcadas com 'filtrar'
+        limites: Limites de extração (cada compactado com orçamento próprio)
+        registro: Se informado, cada operação executada (ou ignorada) é gravada nele,
+            e um checkpoint com o total de operações concluídas a cada lote
+        pular: Operações do início do plano já concluídas (último checkpoint do --retomar)
+
+    Returns:
+        Dicionário com estatísticas
+    """
+    pasta_raiz = Path(pasta_raiz)
+    cabecalho, operacoes = Plano.ler(caminho_plano)
+
+    if cabecalho.get('raiz') and cabecalho['raiz'] != str(pasta_raiz.resolve()):
+        print(f"⚠️  O plano foi gerado para {cabecalho['raiz']}, aplicando em {pasta_raiz.resolve()}")
+
+    estatisticas = {
+        'arquivos_movidos': 0,
+        'arquivos_removidos': 0,
+        'duplicados_vinculados': 0,
+        'arquivos_descompactados': 0,
+        'pastas_vazias_removidas': 0,
+        'operacoes_ignoradas': 0,
+        'erros': [],
+    }
+
+    print(f"\n[EXECUÇÃO] Aplicando plano: {caminho_plano}")
+    print("-" * 120)
+
+    def absoluto(relativo: str) -> str:
+        return os.path.join(str(pasta_raiz), *relativo.split('/'))
+
+    pastas_prontas = set()
+    falhas_extracao = set()
+
+    # Devolve None se fez a operação, ou o motivo de ter pulado
+    def executar(op: dict) -> Optional[str]:
+        tipo = op['op']
+        origem = absoluto(op['de'])
+
+        if tipo == 'rmdir':
+            try:
+                with METRICAS.cronometro('rmdir'):
+                    os.rmdir(origem)
+                estatisticas['pastas_vazias_removidas'] += 1
+                if verbose:
+                    print(f"📁 PASTA VAZIA REMOVIDA: {op['de']}")
+            except OSError:
+                return 'pasta não vazia'
+            return None
+
+        # A árvore pode ter mudado desde a simulação
+        if not os.path.lexists(origem) or op['de'] in falhas_extracao:
+            estatisticas['operacoes_ignoradas'] += 1
+            return 'origem não existe'
+
+        if tipo == 'remover':
+            with METRICAS.cronometro('remover'):
+                os.unlink(origem)
+            estatisticas['arquivos_removidos'] += 1
+            if verbose:
+                print(f"🗑️  REMOVENDO: {op['de']}")
+            return None
+
+        destino = absoluto(op['para'])
+        pasta_destino = os.path.dirname(destino)
+        if tipo != 'extrair' and pasta_destino not in pastas_prontas:
+            os.makedirs(pasta_destino, exist_ok=True)
+            pastas_prontas.add(pasta_destino)
+
+        if tipo == 'extrair':
+            os.makedirs(destino, exist_ok=True)
+            if verbose:
+                print(f"📦 Descompactando: {op['de']} → {op['para']}/")
+            if descompactar_arquivo(Path(origem), Path(destino), verbose, op.get('filtrar', False), regras,
+                                    limites.novo() if limites is not None else None):
+                estatisticas['arquivos_descompactados'] += 1
+                return None
+            falhas_extracao.add(op['de'])
+            estatisticas['erros'].append(f"{op['de']}: Falha na descompactação")
+            return 'falha na descompactação'
+
+        if os.path.lexists(destino):
+            # Contado em operacoes_ignoradas; o detalhe de cada uma vai para o --registro
+            estatisticas['operacoes_ignoradas'] += 1
+            return 'destino já existe'
+
+        if tipo == 'vincular':
+            os.link(absoluto(op['original']), destino)
+            os.unlink(origem)
+            estatisticas['duplicados_vinculados'] += 1
+            if verbose:
+                print(f"🔗 DUPLICADO: {op['de']} → {op['para']} (hardlink de {op['original']})")
+            return None
+
+        MOVEDOR.mover(origem, destino)
+        estatisticas['arquivos_movidos'] += 1
+        if verbose:
+            print(f"📤 MOVENDO: {op['de']} → {op['para']}")
+        return None
+
+    def aplicar_lote(lote: List[dict]):
+        # Num lote de mover/remover/vincular nenhuma operação toca um caminho de
+        # outra (ver a montagem dos lotes abaixo): agrupar por pasta não muda o
+        # resultado. rmdir e extrair ficam na ordem do plano.
+        if lote and lote[0]['op'] in ('mover', 'remover', 'vincular'):
+            lote.sort(key=lambda op: (op['de'].rpartition('/')[0], op.get('para', '').rpartition('/')[0]))
+        for op in lote:
+            try:
+                pulada = executar(op)
+            except Exception as e:
+                print(f"⚠️  Erro ao aplicar {op['op']} {op['de']}: {e}")
+                estatisticas['erros'].append(f"{op['de']}: {e}")
+                pulada = f"erro: {e}"
+            if registro is not None:
+                extras = {'ignorada': pulada} if pulada else {}
+                registro.registrar('aplicar', op['op'], op['de'], op.get('para'), **extras)
+
+    # Os lotes são reordenados por pasta, então o checkpoint só vale por lote inteiro
+    consumidas = 0
+    def fechar_lote(lote: List[dict]):
+        nonlocal consumidas
+        aplicar_lote(lote)
+        consumidas += len(lote)
+        if registro is not None:
+            registro.checkpoint('aplicar', operacoes=consumidas)
+
+    if pular:
+        print(f"⏭️  Pulando {pular} operação(ões) já concluída(s)")
+
+    # Um lote fecha quando o tipo muda, quando enche, ou quando a operação toca um
+    # caminho que outra do lote já tocou (ex: 'mover a → b' seguido de 'mover b → c'):
+    # dependentes nunca ficam no mesmo lote e a ordem do plano é mantida entre elas
+    lote = []
+    tocados: Set[str] = set()
+    for op in operacoes:
+        if consumidas < pular:
+            consumidas += 1
+            continue
+        caminhos = {caminho for caminho in (op['de'], op.get('para'), op.get('original')) if caminho}
+        if lote and (op['op'] != lote[0]['op'] or len(lote) >= TAMANHO_LOTE_PLANO or
+                     not tocados.isdisjoint(caminhos)):
+            fechar_lote(lote)
+            lote = []
+            tocados = set()
+        lote.append(op)
+        tocados |= caminhos
+    fechar_lote(lote)
+
+    return estatisticas
+
+
+#Modo PIPELINE (não interativo): as três etapas rodam ao mesmo tempo, ligadas
+#por filas limitadas. A descompactação começa assim que o primeiro compactado
+#chega na raiz e a organização começa enquanto a varredura ainda está rodando.
+#O tempo total fica perto da etapa mais lenta, não da soma das três.
+@_medido('etapa_executar_pipeline')
+def executar_pipeline(pasta_raiz: str, verbose: bool = True, trabalhadores: int = 2,
+                      manifesto: Optional[Manifesto] = None, regras: Optional[Regras] = None,
+                      filtrar_membros: bool = False, varrer_zips: bool = False,
+                      tamanho_fila: int = 1000, limites: Optional[LimitesExtracao] = None,
+                      registro: Optional[RegistroArquivos] = None, retomar: bool = False,
+                      varredores: int = 1, verificar: int = 0) -> Tuple[dict, dict, dict]:
+    """
+    Args:
+        pasta_raiz: Caminho da pasta raiz
+        verbose: Se True, mostra detalhes
+        trabalhadores: Threads de descompactação
+        manifesto: Igual ao das etapas normais
+        regras: Regras compiladas (None = regras embutidas no script)
+        filtrar_membros: Não extrai lixo de dentro dos ZIPs
+        varrer_zips: Também descompacta compactados que estavam dentro dos compactados
+        tamanho_fila: Capacidade de cada fila (limita a memória se uma etapa atrasar)
+        limites: Profundidade, tamanho expandido e razão de compressão máximos
+        registro: Se informado, cada arquivo tratado é gravado nele (de qualquer thread)
+        retomar: Termina movimentos que ficaram pela metade numa execução interrompida
+        varredores: Threads listando subpastas ao mesmo tempo
+        verificar: Threads da verificação das extrações (0 = não verifica)
+
+    Returns:
+        (estatísticas da extração, da descompactação, da organização) nos formatos de sempre
+    """
+    pasta_raiz = Path(pasta_raiz)
+    regras = regras or REGRAS_PADRAO
+    pasta_zips_path = pasta_raiz / PASTA_ZIPS
+
+    fila_compactados = queue.Queue(tamanho_fila)
+    fila_organizar = queue.Queue(tamanho_fila)
+    trava_saida = threading.Lock()
+    trava_estatisticas = threading.Lock()
+
+    stats_descomp = {
+        'arquivos_descompactados': 0,
+        'erros': [],
+        'compactados_movidos': 0,
+        'ja_descompactados': 0,
+        'arquivos_verificados': 0,
+        'descompactados_incompletos': 0,
+    }
+    # Um pool só para as threads de descompactação: os hashes de todas disputam o mesmo disco
+    pool_verificacao = ThreadPoolExecutor(max_workers=verificar) if verificar > 0 else None
+    filtro = regras if filtrar_membros else None
+    stats_org = {
+        'arquivos_movidos': 0,
+        'pastas_criadas': 0,
+        'por_categoria': {},
+    }
+
+    # Chamada pela varredura para cada arquivo útil que chega na raiz
+    def encaminhar(nome: str):
+        if nome == ARQUIVO_ORGANIZADOR:
+            return
+        if os.path.splitext(nome)[1].lower() in {'.zip', '.rar', '.7z'}:
+            fila_compactados.put(nome)
+        elif regras.categoria(nome) is not None:
+            fila_organizar.put(nome)
+
+    def descompactador():
+        while True:
+            nome_arquivo = fila_compactados.get()
+            if nome_arquivo is None:
+                return
+
+            _saida_local.buffer = []
+            try:
+                caminho_arquivo = pasta_raiz / nome_arquivo
+                nome_pasta = f"{Path(nome_arquivo).stem}_quak"
+                pasta_destino = pasta_zips_path / nome_pasta
+                st_compactado = caminho_arquivo.stat()
+
+                if manifesto is not None and pasta_destino.is_dir() and \
+                        manifesto.compactado_extraido(nome_arquivo, st_compactado):
+                    _emitir(f"⏭️  Já descompactado antes (inalterado): {PASTA_ZIPS}/{nome_pasta}/")
+                    with trava_estatisticas:
+                        stats_descomp['ja_descompactados'] += 1
+                    sucesso = True
+                    conferido = True
+                else:
+                    _emitir(f"\n📦 Descompactando: {nome_arquivo}")
+                    pasta_destino.mkdir(exist_ok=True, parents=True)
+                    sucesso, internos, erros_internos = descompactar_recursivo(
+                        caminho_arquivo, pasta_destino, verbose, filtrar_membros, regras, varrer_zips, limites)
+                    conferido = not erros_internos
+                    if sucesso:
+                        extras = {'falhas_internas': len(erros_internos)} if erros_internos else {}
+                        if erros_internos:
+                            _emitir(f"⚠️  Descompactado em {PASTA_ZIPS}/{nome_pasta}/, mas "
+                                    f"{len(erros_internos)} compactado(s) interno(s) falharam")
+                        else:
+                            _emitir(f"✅ Descompactado com sucesso em: {PASTA_ZIPS}/{nome_pasta}/")
+                        if registro is not None:
+                            registro.registrar('descompactar', 'extrair', nome_arquivo,
+                                               f"{PASTA_ZIPS}/{nome_pasta}", internos=internos, **extras)
+                        with trava_estatisticas:
+                            stats_descomp['arquivos_descompactados'] += internos + (0 if erros_internos else 1)
+                            stats_descomp['descompactados_incompletos'] += 1 if erros_internos else 0
+                            stats_descomp['erros'].extend(erros_internos)
+                        if pool_verificacao is not None:
+                            verificacao = verificar_extracao(caminho_arquivo, pasta_destino, pool_verificacao, filtro,
+                                                             manifesto, pasta_raiz)
+                            _emitir_verificacao(verificacao)
+                            conferido = conferido and not verificacao['falhas']
+                            with trava_estatisticas:
+                                stats_descomp['arquivos_verificados'] += verificacao['verificados']
+                                stats_descomp['erros'].extend(verificacao['falhas'])
+                        if manifesto is not None:
+                            manifesto.registrar_pasta(pasta_destino)
+                            if conferido:
+                                manifesto.registrar_compactado(nome_arquivo, st_compactado)
+
+                if sucesso:
+                    MOVEDOR.mover(str(caminho_arquivo), str(pasta_zips_path / nome_arquivo), sobrescrever=True)
+                    _emitir(f"📦 Arquivo compactado movido para: {PASTA_ZIPS}/{nome_arquivo}")
+                    if registro is not None:
+                        registro.registrar('descompactar', 'mover', nome_arquivo, f"{PASTA_ZIPS}/{nome_arquivo}")
+                    with trava_estatisticas:
+                        stats_descomp['compactados_movidos'] += 1
+                    if manifesto is not None and conferido:
+                        manifesto.registrar(f"{PASTA_ZIPS}/{nome_arquivo}", st_compactado)
+                else:
+                    with trava_estatisticas:
+                        stats_descomp['erros'].append(f"{nome_arquivo}: Falha na descompactação")
+                    try:
+                        pasta_destino.rmdir()
+                    except OSError:
+                        pass
+            except Exception as e:
+                _emitir(f"❌ Erro geral ao processar {nome_arquivo}: {e}")
+                with trava_estatisticas:
+                    stats_descomp['erros'].append(f"{nome_arquivo}: {str(e)}")
+            finally:
+                mensagens = _saida_local.buffer
+                _saida_local.buffer = None
+                with trava_saida:
+                    for mensagem in mensagens:
+                        print(mensagem)
+
+    def organizador():
+        pastas_prontas = set()
+        while True:
+            nome = fila_organizar.get()
+            if nome is None:
+                return
+            categoria = regras.categoria(nome)
+            try:
+                with trava_saida:
+                    _mover_para_categoria(pasta_raiz, nome, categoria, stats_org, pastas_prontas,
+                                          False, verbose, manifesto, registro=registro, retomar=retomar)
+            except Exception as e:
+                print(f"⚠️  Erro ao mover {nome}: {e}")
+
+    pasta_zips_path.mkdir(exist_ok=True)
+    threads = [threading.Thread(target=descompactador, name=f"descompactador-{i}", daemon=True)
+               for i in range(max(1, trabalhadores))]
+    threads.append(threading.Thread(target=organizador, name='organizador', daemon=True))
+    for thread in threads:
+        thread.start()
+
+    try:
+        # A varredura roda aqui mesmo e alimenta as filas enquanto anda. ZIPS/ e as
+        # pastas das categorias ficam de fora: as outras threads escrevem nelas agora
+        stats_extrair = extrair_e_organizar(str(pasta_raiz), False, verbose, None, manifesto, regras,
+                                            None, encaminhar, registro, retomar, varredores,
+                                            ignorar=_pastas_de_saida(regras))
+    finally:
+        for _ in threads[:-1]:
+            fila_compactados.put(None)
+        fila_organizar.put(None)
+        for thread in threads:
+            thread.join()
+        if pool_verificacao is not None:
+            pool_verificacao.shutdown()
+
+    # Se ninguém usou a pasta ZIPS, não deixa ela vazia para trás
+    try:
+        pasta_zips_path.rmdir()
+    except OSError:
+        pass
+
+    return stats_extrair, stats_descomp, stats_org
+
+
+#Estimativa barata do tamanho de uma árvore, para o lote começar pelas maiores:
+#só as entradas da raiz e das subpastas do primeiro nível (no máximo
+#`limite_pastas` listagens), nunca uma varredura inteira.
+def _estimar_tamanho_arvore(pasta: str, limite_pastas: int = 100) -> int:
+    total = 0
+    subpastas = []
+    try:
+        with os.scandir(pasta) as it:
+            for entrada in it:
+                total += 1
+                try:
+                    if entrada.is_dir(follow_symlinks=False) and entrada.name != PASTA_ESTADO:
+                        subpastas.append(entrada.path)
+                except OSError:
+                    pass
+    except OSError:
+        return 0
+    for subpasta in subpastas[:limite_pastas]:
+        try:
+            with os.scandir(subpasta) as it:
+                total += sum(1 for _ in it)
+        except OSError:
+            pass
+    return total
+
+#Tira do lote pastas repetidas e pastas que estão dentro de outra pasta do lote
+#(seriam processadas duas vezes, por dois processos ao mesmo tempo)
+def _pastas_sem_sobreposicao(pastas: List[str]) -> List[str]:
+    reais = {pasta: os.path.realpath(pasta) for pasta in pastas}
+    todas = set(reais.values())
+    vistas = set()
+    aceitas = []
+    for pasta in pastas:
+        real = reais[pasta]
+        if real in vistas:
+            print(f"⚠️  Pasta repetida no lote (ignorada): {pasta}")
+            continue
+        acima = os.path.dirname(real)
+        while acima != os.path.dirname(acima) and acima not in todas:
+            acima = os.path.dirname(acima)
+        if acima in todas and acima != real:
+            print(f"⚠️  Pasta dentro de outra pasta do lote (ignorada, já entra com {acima}): {pasta}")
+            continue
+        vistas.add(real)
+        aceitas.append(pasta)
+    return aceitas
+
+#Executado no pool do lote: processa UMA pasta inteira (extrair → descompactar →
+#organizar), sem perguntas, com a saída capturada. Nunca levanta exceção.
+def _processar_pasta_lote(pasta: str, modo_simulacao: bool, verbose: bool, deduplicar: Optional[str],
+                          incremental: bool, regras: Regras, limites: LimitesExtracao,
+                          filtrar_membros: bool, varrer_zips: bool, varredores: int = 1,
+                          estimar: bool = False, verificar: int = 0) -> dict:
+    import contextlib
+    import io
+
+    resumo = {
+        'pasta': pasta,
+        'ok': False,
+        'erro': None,
+        'arquivos_movidos': 0,
+        'arquivos_removidos': 0,
+        'pastas_vazias_removidas': 0,
+        'espaco_liberado_mb': 0.0,
+        'compactados': 0,
+        'arquivos_descompactados': 0,
+        'arquivos_organizados': 0,
+        'arquivos_verificados': 0,
+        'erros_descompactacao': [],
+    }
+    movimentos_antes = (MOVEDOR.movimentos_rapidos, MOVEDOR.movimentos_lentos, MOVEDOR.bytes_copiados)
+    saida = io.StringIO()
+    inicio = time.perf_counter()
+    diario = None
+    with contextlib.redirect_stdout(saida):
+        try:
+            raiz = Path(pasta)
+            manifesto = Manifesto(raiz) if incremental else None
+            if estimar and not modo_simulacao:
+                # Sem teste de disco: as pastas do lote rodam juntas e atrapalhariam a medida
+                estimativa = estimar_execucao(pasta, regras, filtrar_membros, varredores, medir=False,
+                                              manifesto=manifesto)
+                if not estimativa['espaco_suficiente']:
+                    raise OSError(errno.ENOSPC, f"espaço insuficiente: precisa de "
+                                                f"{estimativa['espaco_necessario'] / (1024 * 1024):.2f} MB, "
+                                                f"livre {estimativa['espaco_livre'] / (1024 * 1024):.2f} MB")
+            diario = Diario(raiz, 'direto') if not modo_simulacao else None
+
+            stats = extrair_e_organizar(pasta, modo_simulacao, verbose, deduplicar, manifesto, regras,
+                                        registro=diario, varredores=varredores)
+            for chave in ('arquivos_movidos', 'arquivos_removidos', 'pastas_vazias_removidas', 'espaco_liberado_mb'):
+                resumo[chave] = stats[chave]
+            resumo['compactados'] = len(stats['arquivos_compactados_encontrados'])
 
-#Descompacta todos os arquivos .zip, .rar, .7z encontrados.
-#Cria uma pasta ZIPS com o arquivo compactado e pasta_quak para descompactado
-def descompactar_compactados(pasta_raiz: str, arquivos_compactados: List[str], verbose: bool = True) -> dict:
-    
+            if not modo_simulacao:
+                diario.checkpoint('extrair')
+                if stats['arquivos_compactados_encontrados']:
+                    # Uma pasta por trabalhador: o paralelismo do lote é entre pastas
+                    stats_descomp = descompactar_compactados(pasta, stats['arquivos_compactados_encontrados'],
+                                                             verbose, 1, filtrar_membros, manifesto, regras,
+                                                             varrer_zips, limites, diario, verificar)
+                    resumo['arquivos_descompactados'] = stats_descomp['arquivos_descompactados']
+                    resumo['arquivos_verificados'] = stats_descomp['arquivos_verificados']
+                    resumo['erros_descompactacao'] = stats_descomp['erros']
+                diario.checkpoint('descompactar')
+                stats_org = organizar_por_extensao(pasta, False, verbose, manifesto, regras, registro=diario)
+                resumo['arquivos_organizados'] = stats_org['arquivos_movidos']
+                diario.checkpoint('organizar')
+                if manifesto is not None:
+                    manifesto.salvar()
+                diario.terminar()
+            resumo['ok'] = True
+        except Exception as e:
+            resumo['erro'] = str(e)
+        finally:
+            if diario is not None:
+                diario.fechar()
+
+    resumo['segundos'] = time.perf_counter() - inicio
+    resumo['saida'] = saida.getvalue()
+    resumo['movimentos_rapidos'] = MOVEDOR.movimentos_rapidos - movimentos_antes[0]
+    resumo['movimentos_lentos'] = MOVEDOR.movimentos_lentos - movimentos_antes[1]
+    resumo['bytes_copiados'] = MOVEDOR.bytes_copiados - movimentos_antes[2]
+    return resumo
+
+#Modo LOTE: muitas pastas numa execução só, sem nenhuma pergunta.
+#Um único pool de processos atende todas as pastas, e as maiores (estimadas
+#pela quantidade de entradas) entram primeiro para nenhuma ficar sozinha no fim.
+def executar_lote(pastas: List[str], modo_simulacao: bool = True, verbose: bool = True, trabalhadores: int = 1,
+                  deduplicar: Optional[str] = None, incremental: bool = False, regras: Optional[Regras] = None,
+                  limites: Optional[LimitesExtracao] = None, filtrar_membros: bool = False,
+                  varrer_zips: bool = False, varredores: int = 1, estimar: bool = False,
+                  verificar: int = 0) -> List[dict]:
     """
     Args:
-        pasta_raiz: Caminho da pasta raiz
-        arquivos_compactados: Lista de arquivos compactados para descompactar
-        verbose: Se True, mostra detalhes
+        pastas: Pastas raiz a processar
+        modo_simulacao: Se True, só simula (em todas)
+        verbose: Se True, mostra os detalhes de cada pasta quando ela termina
+        trabalhadores: Pastas processadas ao mesmo tempo (processos)
+        deduplicar, incremental, regras, limites, filtrar_membros, varrer_zips, varredores, verificar: Iguais
+            aos do modo normal (a verificação usa `verificar` threads em cada pasta)
+        estimar: Se True (--estimar), confere o espaço de cada pasta antes de executá-la
 
     Returns:
-        Dicionário com estatísticas
+        Um resumo por pasta, na ordem recebida
     """
-    
-    pasta_raiz = Path(pasta_raiz)
-    pasta_zips_path = pasta_raiz / PASTA_ZIPS
-    
-    estatisticas = {
-        'arquivos_descompactados': 0,
-        'erros': [],
-        'compactados_movidos': 0,
-    }
+    regras = regras or REGRAS_PADRAO
+    limites = limites or LimitesExtracao()
 
-    if not arquivos_compactados:
-        print("\n✅ Nenhum arquivo compactado encontrado!")
-        return estatisticas
+    inexistentes = [pasta for pasta in pastas if not os.path.isdir(pasta)]
+    for pasta in inexistentes:
+        print(f"⚠️  Pasta não encontrada (ignorada): {pasta}")
+    pastas = _pastas_sem_sobreposicao([pasta for pasta in pastas if pasta not in inexistentes])
 
-    # Cria pasta ZIPS se não existir
-    if not pasta_zips_path.exists():
-        pasta_zips_path.mkdir(exist_ok=True, parents=True)
-        print(f"📁 Pasta criada: {PASTA_ZIPS}/")
+    # Só os primeiros níveis de cada pasta, em threads: com centenas de pastas
+    # a estimativa não pode virar uma varredura serial antes do pool começar
+    print(f"\n📏 Estimando o tamanho de {len(pastas)} pasta(s)...")
+    with ThreadPoolExecutor(max_workers=min(32, max(1, len(pastas)))) as pool:
+        tamanhos = dict(zip(pastas, pool.map(_estimar_tamanho_arvore, pastas)))
+    ordem = sorted(pastas, key=lambda pasta: -tamanhos[pasta])
 
     print(f"\n{'=' * 120}")
-    print(f"📦 DESCOMPACTANDO {len(arquivos_compactados)} ARQUIVO(S) COMPACTADO(S)")
+    print(f"🗂️  LOTE {'[SIMULAÇÃO]' if modo_simulacao else '[EXECUÇÃO]'}: {len(pastas)} pasta(s), "
+          f"{max(1, trabalhadores)} ao mesmo tempo")
     print(f"{'=' * 120}")
 
-    for nome_arquivo in arquivos_compactados:
-        caminho_arquivo = pasta_raiz / nome_arquivo
-        
-        if not caminho_arquivo.exists():
-            print(f"\n⚠️  Arquivo não encontrado: {nome_arquivo}")
-            continue
+    argumentos = (modo_simulacao, verbose, deduplicar, incremental, regras, limites, filtrar_membros, varrer_zips,
+                  varredores, estimar, verificar)
+    resultados = {}
 
-        try:
-            # Cria pasta com nome do arquivo + "quak" DENTRO de ZIPS
-            # voce pode mudar o sufixo se quiser
-            nome_base = Path(nome_arquivo).stem  # Nome sem extensão
-            nome_pasta = f"{nome_base}_quak" #<-- você pode mudar o sufixo aqui se quiser
-            pasta_destino = pasta_zips_path / nome_pasta
-            
-            print(f"\n📦 Descompactando: {nome_arquivo}")
-            print(f"📁 Criando pasta: {PASTA_ZIPS}/{nome_pasta}/")
-            
-            # Cria a pasta de destino se não existir
-            pasta_destino.mkdir(exist_ok=True, parents=True)
-            
-            # Tenta descompactar
-            sucesso = descompactar_arquivo(caminho_arquivo, pasta_destino, verbose)
-            
-            if sucesso:
-                estatisticas['arquivos_descompactados'] += 1
-                print(f"✅ Descompactado com sucesso em: {PASTA_ZIPS}/{nome_pasta}/")
-                
-                # Move o arquivo compactado para pasta ZIPS
-                try:
-                    caminho_novo_zip = pasta_zips_path / nome_arquivo
-                    shutil.move(str(caminho_arquivo), str(caminho_novo_zip))
-                    estatisticas['compactados_movidos'] += 1
-                    print(f"📦 Arquivo compactado movido para: {PASTA_ZIPS}/{nome_arquivo}")
-                except Exception as e:
-                    print(f"⚠️  Erro ao mover {nome_arquivo}: {e}")
+    def concluir(resumo: dict):
+        resultados[resumo['pasta']] = resumo
+        if verbose and resumo['saida']:
+            print(f"\n{'-' * 120}\n📁 {resumo['pasta']}\n{'-' * 120}")
+            print(resumo['saida'], end='')
+        estado = '✅' if resumo['ok'] else '❌'
+        print(f"{estado} [{len(resultados)}/{len(pastas)}] {resumo['pasta']} ({resumo['segundos']:.1f}s)")
+
+    if trabalhadores > 1 and len(ordem) > 1:
+        from concurrent.futures import as_completed
+        with ProcessPoolExecutor(max_workers=trabalhadores) as pool:
+            futuros = [pool.submit(_processar_pasta_lote, pasta, *argumentos) for pasta in ordem]
+            for futuro in as_completed(futuros):
+                concluir(futuro.result())
+    else:
+        for pasta in ordem:
+            concluir(_processar_pasta_lote(pasta, *argumentos))
+
+    return [resultados[pasta] for pasta in pastas]
+
+def imprimir_relatorio_lote(resultados: List[dict], modo_simulacao: bool = True):
+    """Imprime uma linha por pasta e o total do lote."""
+    print("\n" + "=" * 120)
+    print("📊 RELATÓRIO DO LOTE")
+    print("=" * 120)
+    print(f"{'Pasta':<50} {'Movidos':>8} {'Removidos':>9} {'MB liberados':>12} "
+          f"{'Descomp.':>8} {'Organiz.':>8} {'Tempo':>8}")
+    total = {'arquivos_movidos': 0, 'arquivos_removidos': 0, 'espaco_liberado_mb': 0.0,
+             'arquivos_descompactados': 0, 'arquivos_organizados': 0, 'segundos': 0.0}
+    falhas = []
+    for resumo in resultados:
+        nome = resumo['pasta'] if len(resumo['pasta']) <= 50 else '...' + resumo['pasta'][-47:]
+        print(f"{nome:<50} {resumo['arquivos_movidos']:>8} {resumo['arquivos_removidos']:>9} "
+              f"{resumo['espaco_liberado_mb']:>12.2f} {resumo['arquivos_descompactados']:>8} "
+              f"{resumo['arquivos_organizados']:>8} {resumo['segundos']:>7.1f}s")
+        for chave in total:
+            total[chave] += resumo[chave]
+        if not resumo['ok']:
+            falhas.append(f"{resumo['pasta']}: {resumo['erro']}")
+        falhas.extend(f"{resumo['pasta']}: {erro}" for erro in resumo['erros_descompactacao'])
+    print("-" * 120)
+    print(f"{'TOTAL (' + str(len(resultados)) + ' pastas)':<50} {total['arquivos_movidos']:>8} "
+          f"{total['arquivos_removidos']:>9} {total['espaco_liberado_mb']:>12.2f} "
+          f"{total['arquivos_descompactados']:>8} {total['arquivos_organizados']:>8} {total['segundos']:>7.1f}s")
+    print("=" * 120)
+    verificados = sum(resumo['arquivos_verificados'] for resumo in resultados)
+    if verificados:
+        print(f"🔒 Arquivos verificados: {verificados}")
+    if falhas:
+        print(f"\n⚠️  Erros encontrados:")
+        for falha in falhas:
+            print(f"  • {falha}")
+    if modo_simulacao:
+        print("\n💡 Para executar, rode novamente com --executar")
+
+
+#Modo VIGIA: fica rodando e organiza só o que chega. No Linux usa inotify
+#(via ctypes, sem dependências): parado, o processo fica bloqueado no select
+#e não gasta CPU. Em outros sistemas (ou se o inotify falhar) compara
+#varreduras periódicas. Rajadas de eventos são agrupadas (debounce) e cada
+#lote passa pelas mesmas regras de sempre: lixo sai, útil vai para a raiz,
+#compactado é descompactado e o resto vai para a pasta da categoria.
+DEBOUNCE_VIGIA = 0.5       # segundos sem eventos novos antes de processar o lote
+ESPERA_MAXIMA_VIGIA = 5.0  # processa mesmo com eventos chegando sem parar
+INTERVALO_POLLING = 2.0    # segundos entre varreduras, sem inotify
+
+# Pastas da raiz que o próprio LimpaZipUTF preenche: não são vigiadas (senão
+# cada arquivo organizado voltaria como "novo")
+def _pastas_de_saida(regras: Regras) -> Set[str]:
+    return {PASTA_ESTADO, PASTA_ZIPS} | set(regras.categorias)
+
+# Caminho dentro de uma pasta de saída (só o primeiro nível da raiz conta)
+def _em_pasta_de_saida(caminho: str, raiz_str: str, saida: Set[str]) -> bool:
+    relativo = _relativo(caminho, raiz_str)
+    return relativo.split(os.sep, 1)[0] in saida and os.sep in relativo
+
+
+class ObservadorInotify:
+    """Observa a árvore com inotify (Linux). `esperar` devolve caminhos alterados."""
+
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE_SELF = 0x00000400
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ISDIR = 0x40000000
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+    MASCARA = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF
+
+    def __init__(self, pasta_raiz: str, ignorar: Set[str]):
+        import ctypes
+        import ctypes.util
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._ctypes = ctypes
+        self.raiz = pasta_raiz
+        self.ignorar = ignorar
+        self.fd = self._libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 falhou')
+        self._pastas: Dict[int, str] = {}
+        self.vigiar_arvore(pasta_raiz)
+
+    def _vigiar(self, pasta: str) -> bool:
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(pasta), self.MASCARA)
+        if wd < 0:
+            erro = self._ctypes.get_errno()
+            if erro == errno.ENOSPC:
+                raise OSError(erro, 'limite de inotify atingido (aumente fs.inotify.max_user_watches)')
+            return False
+        self._pastas[wd] = pasta
+        return True
+
+    def vigiar_arvore(self, pasta: str) -> List[str]:
+        """Vigia a pasta e as subpastas; devolve os arquivos que já estão nelas."""
+        arquivos = []
+        if not self._vigiar(pasta):
+            return arquivos
+        for tipo, valor in percorrer_arvore(pasta, self.ignorar if pasta == self.raiz else frozenset()):
+            if tipo == 'pasta':
+                # Vigia depois de listar: o que chegar entre as duas coisas gera evento
+                self._vigiar(valor)
             else:
-                estatisticas['erros'].append(f"{nome_arquivo}: Falha na descompactação")
-                # Remove pasta vazia se falhou
+                arquivos.append(valor.path)
+        return arquivos
+
+    def esperar(self, tempo_maximo: Optional[float]) -> Optional[List[str]]:
+        """Bloqueia até haver eventos (ou até `tempo_maximo`). None = fila estourou (rever tudo)."""
+        prontos, _, _ = select.select([self.fd], [], [], tempo_maximo)
+        if not prontos:
+            return []
+        alterados = []
+        while True:
+            try:
+                dados = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            deslocamento = 0
+            while deslocamento < len(dados):
+                wd, mascara, _, tamanho = struct.unpack_from('iIII', dados, deslocamento)
+                nome = dados[deslocamento + 16:deslocamento + 16 + tamanho].rstrip(b'\0')
+                deslocamento += 16 + tamanho
+                if mascara & self.IN_Q_OVERFLOW:
+                    return None
+                pasta = self._pastas.get(wd)
+                if mascara & self.IN_IGNORED:
+                    self._pastas.pop(wd, None)
+                    continue
+                if pasta is None or not nome:
+                    continue
+                caminho = os.path.join(pasta, os.fsdecode(nome))
+                if pasta == self.raiz and os.fsdecode(nome) in self.ignorar:
+                    continue
+                if mascara & self.IN_ISDIR:
+                    if mascara & (self.IN_CREATE | self.IN_MOVED_TO):
+                        alterados.extend(self.vigiar_arvore(caminho))
+                elif mascara & (self.IN_CLOSE_WRITE | self.IN_MOVED_TO):
+                    # Só IN_CLOSE_WRITE: arquivo ainda sendo escrito não entra
+                    alterados.append(caminho)
+        return alterados
+
+    def fechar(self):
+        os.close(self.fd)
+
+
+class ObservadorPolling:
+    """Sem inotify: compara varreduras. Só informa arquivos estáveis (iguais em duas varreduras)."""
+
+    def __init__(self, pasta_raiz: str, ignorar: Set[str], intervalo: float = INTERVALO_POLLING,
+                 varredores: int = 1):
+        self.raiz = pasta_raiz
+        self.ignorar = ignorar
+        self.intervalo = intervalo
+        self.varredores = varredores
+        self._vistos: Dict[str, Tuple[int, int, bool]] = {}
+        self._proxima = 0.0
+
+    def vigiar_arvore(self, pasta: str) -> List[str]:
+        arquivos = []
+        for tipo, valor in percorrer_arvore(pasta, self.ignorar, self.varredores):
+            if tipo == 'arquivo':
+                arquivos.append(valor.path)
                 try:
-                    if pasta_destino.exists() and not any(pasta_destino.iterdir()):
-                        pasta_destino.rmdir()
-                except:
-                    pass
+                    st = valor.stat()
+                except OSError:
+                    continue
+                # Já entregue: só volta a ser informado se mudar
+                self._vistos[valor.path] = (st.st_size, st.st_mtime_ns, True)
+        return arquivos
 
-        except Exception as e:
-            print(f"❌ Erro geral ao processar {nome_arquivo}: {e}")
-            estatisticas['erros'].append(f"{nome_arquivo}: {str(e)}")
+    def esperar(self, tempo_maximo: Optional[float]) -> Optional[List[str]]:
+        agora = time.monotonic()
+        if agora < self._proxima:
+            espera = self._proxima - agora
+            if tempo_maximo is not None and tempo_maximo < espera:
+                time.sleep(tempo_maximo)
+                return []
+            time.sleep(espera)
+        self._proxima = time.monotonic() + self.intervalo
 
-    return estatisticas
+        alterados = []
+        vistos = {}
+        for tipo, valor in percorrer_arvore(self.raiz, self.ignorar, self.varredores):
+            if tipo != 'arquivo':
+                continue
+            try:
+                st = valor.stat()
+            except OSError:
+                continue
+            assinatura = (st.st_size, st.st_mtime_ns)
+            anterior = self._vistos.get(valor.path)
+            informado = False
+            if anterior is not None and anterior[:2] == assinatura:
+                informado = anterior[2]
+                if not informado:
+                    alterados.append(valor.path)
+                    informado = True
+            vistos[valor.path] = assinatura + (informado,)
+        self._vistos = vistos
+        return alterados
 
-#Organiza os arquivos em pastas de acordo com a extensão.
-#NÃO move compactados (.zip, .rar, .7z) e não move LimpaZipUTF.py
-def organizar_por_extensao(pasta_raiz: str, modo_simulacao: bool = True, verbose: bool = True) -> dict:
-    
+    def fechar(self):
+        self._vistos = {}
+
+
+#Aplica as regras só aos caminhos informados (arquivos novos ou alterados):
+#o mesmo extrair → descompactar → organizar, sem varrer a árvore.
+def organizar_alteracoes(pasta_raiz: str, caminhos: List[str], verbose: bool = True,
+                         regras: Optional[Regras] = None, trabalhadores: int = 1, filtrar_membros: bool = False,
+                         varrer_zips: bool = False, limites: Optional[LimitesExtracao] = None,
+                         registro: Optional[RegistroArquivos] = None, pastas: Optional[List[str]] = None) -> dict:
     """
     Args:
         pasta_raiz: Caminho da pasta raiz
-        modo_simulacao: Se True, apenas mostra o que seria movido
-        verbose: Se True, mostra detalhes
+        caminhos: Arquivos alterados (os que já sumiram são ignorados)
+        pastas: Pastas a remover se ficarem vazias, em pós-ordem (além das que perderam arquivos)
+        verbose, regras, trabalhadores, filtrar_membros, varrer_zips, limites, registro: Iguais aos do modo normal
 
     Returns:
-        Dicionário com estatísticas
+        Dicionário com estatísticas do lote
     """
-    
-    pasta_raiz = Path(pasta_raiz)
+    raiz = Path(pasta_raiz)
+    raiz_str = str(raiz)
+    regras = regras or REGRAS_PADRAO
+    saida = _pastas_de_saida(regras)
+    estatisticas = {'arquivos_movidos': 0, 'arquivos_removidos': 0, 'arquivos_descompactados': 0,
+                    'arquivos_organizados': 0, 'pastas_vazias_removidas': 0, 'bytes_liberados': 0}
 
-    if not pasta_raiz.exists():
-        raise ValueError(f"Pasta não encontrada: {pasta_raiz}")
+    na_raiz = []
+    pastas_tocadas = set()
+    for caminho in dict.fromkeys(caminhos):
+        if _em_pasta_de_saida(caminho, raiz_str, saida):
+            continue
+        try:
+            st = os.stat(caminho, follow_symlinks=False)
+        except OSError:
+            continue
+        nome = os.path.basename(caminho)
+        pasta = os.path.dirname(caminho)
+        if pasta == raiz_str and nome == ARQUIVO_ORGANIZADOR:
+            continue
+        relativo = _relativo(caminho, raiz_str)
+        categoria = regras.classificar(nome, st.st_size, st.st_mtime)
+        try:
+            if categoria is None:
+                if pasta == raiz_str:
+                    continue
+                with METRICAS.cronometro('remover'):
+                    os.unlink(caminho)
+                estatisticas['arquivos_removidos'] += 1
+                estatisticas['bytes_liberados'] += st.st_size
+                if registro is not None:
+                    registro.registrar('vigia', 'remover', relativo, bytes=st.st_size)
+                if verbose:
+                    print(f"🗑️  REMOVENDO: {relativo} ({st.st_size / (1024 * 1024):.2f} MB)")
+                pastas_tocadas.add(pasta)
+                continue
+            if pasta != raiz_str:
+                novo_nome = _nome_livre(raiz, nome)
+                MOVEDOR.mover(caminho, os.path.join(raiz_str, novo_nome))
+                estatisticas['arquivos_movidos'] += 1
+                if registro is not None:
+                    registro.registrar('vigia', 'mover', relativo, novo_nome)
+                if verbose:
+                    print(f"📤 MOVENDO: {relativo} → {novo_nome}")
+                pastas_tocadas.add(pasta)
+                nome = novo_nome
+            na_raiz.append(nome)
+        except OSError as e:
+            print(f"⚠️  Erro ao processar {relativo}: {e}")
 
-    estatisticas = {
-        'arquivos_movidos': 0,
-        'pastas_criadas': 0,
-        'movimentos': [],
-    }
+    compactados = [nome for nome in na_raiz if os.path.splitext(nome)[1].lower() in {'.zip', '.rar', '.7z'}]
+    if compactados:
+        stats_descomp = descompactar_compactados(raiz_str, compactados, verbose, trabalhadores, filtrar_membros,
+                                                 None, regras, varrer_zips, limites, registro)
+        estatisticas['arquivos_descompactados'] = stats_descomp['arquivos_descompactados']
+        for erro in stats_descomp['erros']:
+            print(f"  • {erro}")
 
-    print(f"\n{'[SIMULAÇÃO]' if modo_simulacao else '[EXECUÇÃO]'} Organizando por extensão: {pasta_raiz}")
-    print("-" * 120)
+    outros = [nome for nome in na_raiz if nome not in compactados]
+    if outros:
+        stats_org = organizar_por_extensao(raiz_str, False, verbose, None, regras, outros, registro=registro)
+        estatisticas['arquivos_organizados'] = stats_org['arquivos_movidos']
 
-    # Contar arquivos por categoria
-    contagem_por_categoria = {cat: 0 for cat in CATEGORIAS_EXTENSOES.keys()}
-    
-    for arquivo in pasta_raiz.glob('*'):
-        if arquivo.is_file():
-            # Pula o arquivo do organizador
-            if arquivo.name == ARQUIVO_ORGANIZADOR:
-                continue
-            
-            # Pula arquivos compactados (eles foram movidos para ZIPS)
-            if arquivo.suffix.lower() in {'.zip', '.rar', '.7z'}:
-                continue
-                
-            extensao = arquivo.suffix.lower()
-            for categoria, extensoes in CATEGORIAS_EXTENSOES.items():
-                if extensao in extensoes:
-                    contagem_por_categoria[categoria] += 1
-                    break
+    # Pastas que ficaram vazias, subindo até (sem incluir) a raiz
+    for pasta in pastas or []:
+        try:
+            os.rmdir(pasta)
+        except OSError:
+            continue
+        estatisticas['pastas_vazias_removidas'] += 1
+        if registro is not None:
+            registro.registrar('vigia', 'rmdir', _relativo(pasta, raiz_str))
+    for pasta in sorted(pastas_tocadas, key=len, reverse=True):
+        while pasta != raiz_str and pasta.startswith(os.path.join(raiz_str, '')):
+            try:
+                os.rmdir(pasta)
+            except OSError:
+                break
+            estatisticas['pastas_vazias_removidas'] += 1
+            if registro is not None:
+                registro.registrar('vigia', 'rmdir', _relativo(pasta, raiz_str))
+            pasta = os.path.dirname(pasta)
+    return estatisticas
 
-    # Mostrar preview
-    print("\n📊 PREVIEW - Arquivos por categoria:")
-    print("-" * 120)
-    for categoria, quantidade in contagem_por_categoria.items():
-        if quantidade > 0:
-            print(f"  📁 {categoria}: {quantidade} arquivo(s)")
-
-    # Processar movimentos
-    for arquivo in pasta_raiz.glob('*'):
-        if arquivo.is_file() and arquivo.suffix.lower() in EXTENSOES_PERMITIDAS:
-            # Pula o arquivo do organizador
-            if arquivo.name == ARQUIVO_ORGANIZADOR:
-                if verbose:
-                    print(f"⏭️  IGNORANDO: {arquivo.name} (arquivo do organizador)")
-                continue
-            
-            # Pula arquivos compactados
-            if arquivo.suffix.lower() in {'.zip', '.rar', '.7z'}:
-                if verbose:
-                    print(f"⏭️  IGNORANDO: {arquivo.name} (arquivo compactado - será movido para ZIPS)")
-                continue
-                
-            extensao = arquivo.suffix.lower()
-            
-            # Encontra a categoria
-            categoria = None
-            for cat, extensoes in CATEGORIAS_EXTENSOES.items():
-                if extensao in extensoes:
-                    categoria = cat
-                    break
+def vigiar(pasta_raiz: str, verbose: bool = True, regras: Optional[Regras] = None, trabalhadores: int = 1,
+           filtrar_membros: bool = False, varrer_zips: bool = False, limites: Optional[LimitesExtracao] = None,
+           registro: Optional[RegistroArquivos] = None, debounce: float = DEBOUNCE_VIGIA,
+           polling: Optional[float] = None, varredores: int = 1, parar: Optional[threading.Event] = None) -> dict:
+    """
+    Args:
+        pasta_raiz: Pasta a vigiar
+        debounce: Segundos sem eventos novos antes de processar um lote
+        polling: Se informado, usa varreduras a cada `polling` segundos em vez do inotify
+        parar: Evento que encerra a vigia (Ctrl+C e SIGTERM também encerram)
+        verbose, regras, trabalhadores, filtrar_membros, varrer_zips, limites, registro, varredores:
+            Iguais aos do modo normal
 
-            if categoria:
-                # Cria pasta se não existir
-                pasta_categoria = pasta_raiz / categoria
-                
-                if not modo_simulacao:
-                    pasta_categoria.mkdir(exist_ok=True)
-                    if not pasta_categoria.exists():
-                        estatisticas['pastas_criadas'] += 1
+    Returns:
+        Estatísticas somadas de todos os lotes
+    """
+    raiz_str = str(Path(pasta_raiz))
+    regras = regras or REGRAS_PADRAO
+    parar = parar or threading.Event()
+    ignorar = _pastas_de_saida(regras)
 
-                novo_caminho = pasta_categoria / arquivo.name
+    observador = None
+    if polling is None and sys.platform.startswith('linux'):
+        try:
+            observador = ObservadorInotify(raiz_str, ignorar)
+            print(f"👀 Vigiando {raiz_str} com inotify ({len(observador._pastas)} pasta(s))")
+        except (OSError, AttributeError) as e:
+            print(f"⚠️  inotify indisponível ({e}): usando varreduras periódicas")
+    if observador is None:
+        observador = ObservadorPolling(raiz_str, ignorar, polling or INTERVALO_POLLING, varredores)
+        print(f"👀 Vigiando {raiz_str} com varreduras a cada {observador.intervalo:g}s")
 
-                if verbose:
-                    print(f"📂 MOVENDO: {arquivo.name} → {categoria}/")
+    # SIGTERM (systemd, docker stop) encerra igual ao Ctrl+C
+    anterior_sigterm = None
+    if threading.current_thread() is threading.main_thread():
+        anterior_sigterm = signal.signal(signal.SIGTERM, lambda *_: parar.set())
 
-                estatisticas['arquivos_movidos'] += 1
-                estatisticas['movimentos'].append(f"{arquivo.name} → {categoria}/")
+    total = {}
+    def processar(caminhos: List[str], pastas: Optional[List[str]] = None):
+        inicio = time.perf_counter()
+        # Entre um lote e outro um disco pode ter sido desmontado e montado de novo
+        MOVEDOR.esquecer()
+        stats = organizar_alteracoes(raiz_str, caminhos, verbose, regras, trabalhadores, filtrar_membros,
+                                     varrer_zips, limites, registro, pastas)
+        if not any(stats.values()):
+            # Só ecos dos próprios movimentos (ou arquivos que já sumiram)
+            return
+        for chave, valor in stats.items():
+            total[chave] = total.get(chave, 0) + valor
+        total['lotes'] = total.get('lotes', 0) + 1
+        if registro is not None:
+            registro.checkpoint('vigia', **stats)
+        print(f"⚡ Lote de {len(caminhos)} caminho(s) em {time.perf_counter() - inicio:.2f}s: "
+              f"{stats['arquivos_movidos']} movido(s), {stats['arquivos_removidos']} removido(s), "
+              f"{stats['arquivos_descompactados']} descompactado(s), {stats['arquivos_organizados']} organizado(s)")
 
-                if not modo_simulacao:
-                    shutil.move(str(arquivo), str(novo_caminho))
+    try:
+        # O que já está lá quando a vigia começa (e as pastas vazias de antes)
+        existentes = []
+        pastas = []
+        for tipo, valor in percorrer_arvore(raiz_str, ignorar, varredores):
+            if tipo == 'arquivo':
+                existentes.append(valor.path)
+            else:
+                pastas.append(valor)
+        if isinstance(observador, ObservadorPolling):
+            observador.vigiar_arvore(raiz_str)
+        processar(existentes, pastas)
+        print("💤 Aguardando arquivos novos (Ctrl+C para sair)...")
 
-    return estatisticas
+        pendentes: Dict[str, None] = {}
+        primeiro = ultimo = 0.0
+        while not parar.is_set():
+            if pendentes:
+                agora = time.monotonic()
+                tempo_maximo = max(0.0, min(ultimo + debounce, primeiro + ESPERA_MAXIMA_VIGIA) - agora)
+            else:
+                # Acorda de vez em quando só para ver se pediram para parar
+                tempo_maximo = 1.0
+            alterados = observador.esperar(tempo_maximo)
+            agora = time.monotonic()
+            if alterados is None:
+                print("⚠️  Eventos demais de uma vez: revendo a árvore inteira")
+                alterados = [valor.path for tipo, valor in percorrer_arvore(raiz_str, ignorar, varredores)
+                             if tipo == 'arquivo']
+            if alterados:
+                if not pendentes:
+                    primeiro = agora
+                ultimo = agora
+                pendentes.update(dict.fromkeys(alterados))
+            if pendentes and (agora >= ultimo + debounce or agora >= primeiro + ESPERA_MAXIMA_VIGIA):
+                caminhos = list(pendentes)
+                pendentes = {}
+                processar(caminhos)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        observador.fechar()
+        if anterior_sigterm is not None:
+            signal.signal(signal.SIGTERM, anterior_sigterm)
+        print("\n👋 Vigia encerrada")
+    return total
+
+
+# Contagem por categoria numa linha só: "Documentos: 10 | Código: 3"
+def _imprimir_por_categoria(por_categoria: Dict[str, int]):
+    if por_categoria:
+        print("  por categoria: " + " | ".join(f"{categoria}: {quantidade}"
+                                              for categoria, quantidade in sorted(por_categoria.items())))
 
 
 def imprimir_estatisticas(stats: dict, modo_simulacao: bool = True):
@@ -486,9 +3990,25 @@ def imprimir_estatisticas(stats: dict, modo_simulacao: bool = True):
     print(f"Arquivos REMOVIDOS (lixo): {stats['arquivos_removidos']}")
     print(f"Pastas vazias removidas: {stats['pastas_vazias_removidas']}")
     print(f"Espaço liberado: {stats['espaco_liberado_mb']:.2f} MB")
+    _imprimir_por_categoria(stats.get('movidos_por_categoria', {}))
+    for regra, (quantidade, total) in sorted(stats.get('removidos_por_regra', {}).items()):
+        print(f"  🧹 Regra '{regra}': {quantidade} arquivo(s), {total / (1024 * 1024):.2f} MB")
+
+    if stats.get('arquivos_inalterados'):
+        print(f"Arquivos inalterados (já processados antes): {stats['arquivos_inalterados']}")
+
+    duplicados = stats.get('duplicados_removidos', 0) + stats.get('duplicados_vinculados', 0)
+    if duplicados:
+        print(f"Duplicados (mesmo conteúdo): {duplicados} "
+              f"({stats['duplicados_removidos']} removidos, {stats['duplicados_vinculados']} hardlinks) "
+              f"- {stats['espaco_duplicados_mb']:.2f} MB economizados")
     
     if stats['arquivos_compactados_encontrados']:
         print(f"Arquivos compactados encontrados: {len(stats['arquivos_compactados_encontrados'])}")
+
+    if 'bytes_liberados' in stats:
+        print(f"Total recuperado (lixo + duplicados): {stats['bytes_liberados'] / (1024 * 1024):.2f} MB "
+              f"({stats['bytes_liberados']} bytes)")
     
     print("=" * 120)
 
@@ -498,17 +4018,348 @@ def imprimir_estatisticas(stats: dict, modo_simulacao: bool = True):
         print("\n✅ Organização concluída!")
 
 
-def imprimir_extensoes():
+def imprimir_metricas(metricas: Optional[Metricas] = None):
+    """Imprime quanto tempo cada operação medida levou no total e em média."""
+    dados = (metricas or METRICAS).instantaneo()
+    print("\n" + "=" * 120)
+    print("📈 MÉTRICAS POR OPERAÇÃO")
+    print("=" * 120)
+    for nome, quantidade in sorted(dados['contadores'].items()):
+        segundos = dados['segundos'].get(nome)
+        if segundos is None:
+            print(f"{nome:<34} {quantidade:>10}")
+        else:
+            print(f"{nome:<34} {quantidade:>10} x | total {segundos:10.3f}s | média {segundos / quantidade * 1000:9.3f} ms")
+    print("=" * 120)
+
+
+def imprimir_extensoes(regras: Optional[Regras] = None):
     """Imprime as extensões organizadas por categoria."""
+    regras = regras or REGRAS_PADRAO
     print("\n" + "=" * 120)
     print("📋 EXTENSÕES PERMITIDAS")
     print("=" * 120)
-    for categoria, extensoes in CATEGORIAS_EXTENSOES.items():
+    for categoria, extensoes in regras.extensoes_por_categoria.items():
         print(f"\n{categoria}:")
         print(f"  {', '.join(sorted(extensoes))}")
+    print(f"\nRemovidos: {', '.join(sorted(regras.nomes_remover | set(regras.padroes_remover)))}")
+    backends = backends_disponiveis()
+    print("\nDescompactadores: .zip: zipfile | " + " | ".join(
+        f"{extensao}: {', '.join(backend.nome for backend in backends.get(extensao, [])) or 'nenhum'}"
+        for extensao in ('.7z', '.rar')))
     print("\n" + "=" * 120)
 
 
+#Gera uma árvore sintética parecida com uma pasta de disciplina
+#(subpastas, arquivos úteis e um pouco de lixo). Reprodutível pela semente.
+def gerar_arvore_sintetica(pasta: str, n_arquivos: int, arquivos_por_pasta: int = 100, semente: int = 42,
+                           profundidade: Optional[int] = None, largura: int = 10,
+                           mistura_extensoes: Optional[Dict[str, float]] = None, taxa_lixo: float = 0.05,
+                           compactados: List[Tuple[str, int, int]] = ()) -> Path:
+    """
+    Args:
+        pasta: Pasta onde a árvore será criada
+        n_arquivos: Quantidade total de arquivos
+        arquivos_por_pasta: Quantos arquivos em cada subpasta
+        semente: Semente do gerador aleatório
+        profundidade: Níveis de subpastas (None = aulaNNNN/parteNN, o formato antigo)
+        largura: Subpastas dentro de cada pasta (com profundidade)
+        mistura_extensoes: Peso de cada extensão (None = todas as permitidas, mais .tmp/.log/.bak)
+        taxa_lixo: Fração dos arquivos que são lixo (thumbs.db, index.html...)
+        compactados: (formato, quantidade, tamanho em bytes) dos compactados a gerar ('zip' ou '7z')
+
+    Returns:
+        Caminho da árvore gerada
+    """
+    import random
+
+    gerador = random.Random(semente)
+    pasta = Path(pasta)
+    if mistura_extensoes:
+        extensoes = sorted(mistura_extensoes)
+        pesos = [mistura_extensoes[extensao] for extensao in extensoes]
+    else:
+        extensoes = sorted(EXTENSOES_PERMITIDAS - {'.zip', '.rar', '.7z'}) + ['.tmp', '.log', '.bak']
+        pesos = None
+    lixo = sorted(ARQUIVOS_PARA_REMOVER)
+
+    def subpasta_de(indice_pasta: int) -> Path:
+        if profundidade is None:
+            return pasta / f"aula{indice_pasta // 100:04d}" / f"parte{indice_pasta % 100:02d}"
+        partes = []
+        for nivel in range(profundidade):
+            partes.append(f"n{nivel}_{indice_pasta % largura:03d}")
+            indice_pasta //= largura
+        return pasta.joinpath(*partes)
+
+    subpasta = pasta
+    for i in range(n_arquivos):
+        indice_pasta = i // arquivos_por_pasta
+        if i % arquivos_por_pasta == 0:
+            subpasta = subpasta_de(indice_pasta)
+            subpasta.mkdir(parents=True, exist_ok=True)
+
+        if gerador.random() < taxa_lixo:
+            nome = f"{i}_{gerador.choice(lixo)}"
+        elif pesos:
+            nome = f"arquivo{i}{gerador.choices(extensoes, pesos)[0]}"
+        else:
+            nome = f"arquivo{i}{gerador.choice(extensoes)}"
+
+        with open(subpasta / nome, 'wb') as f:
+            f.write(b'x' * gerador.randint(0, 512))
+
+    # Compactados: metade do conteúdo aleatório (não comprime), metade texto repetido
+    for formato, quantidade, tamanho in compactados:
+        for k in range(quantidade):
+            subpasta = subpasta_de(gerador.randrange(max(1, n_arquivos // arquivos_por_pasta)))
+            subpasta.mkdir(parents=True, exist_ok=True)
+            metade = tamanho // 2
+            conteudo = {
+                f"material{k}/dados.bin": gerador.getrandbits(8 * metade).to_bytes(metade, 'little') if metade else b'',
+                f"material{k}/notas.txt": (b'aula de hoje: ' * (tamanho // 14 + 1))[:tamanho - metade],
+                f"material{k}/Thumbs.db": b'x' * 64,
+            }
+            caminho = subpasta / f"compactado{k}.{formato}"
+            if formato == 'zip':
+                with zipfile.ZipFile(str(caminho), 'w', zipfile.ZIP_DEFLATED) as zip_ref:
+                    for nome, dados in conteudo.items():
+                        zip_ref.writestr(nome, dados)
+            elif formato == '7z' and py7zr is not None:
+                with py7zr.SevenZipFile(str(caminho), 'w') as arquivo:
+                    for nome, dados in conteudo.items():
+                        arquivo.writestr(dados, nome)
+            elif formato == '7z' and shutil.which('7z'):
+                temporaria = subpasta / f".gerando{k}"
+                for nome, dados in conteudo.items():
+                    (temporaria / nome).parent.mkdir(parents=True, exist_ok=True)
+                    (temporaria / nome).write_bytes(dados)
+                subprocess.run(['7z', 'a', str(caminho.resolve()), '.'], cwd=str(temporaria),
+                               check=True, capture_output=True)
+                shutil.rmtree(temporaria)
+            else:
+                print(f"⚠️  Sem como gerar .{formato} aqui (instale py7zr ou 7-Zip): {quantidade} compactado(s) pulado(s)")
+                break
+
+    return pasta
+
+
+#Compara a varredura antiga (rglob + is_file + stat + segundo rglob ordenado)
+#com a varredura única em pós-ordem do percorrer_arvore. Só leitura.
+def benchmark_varredura(pasta: str, tamanhos: List[int]) -> List[dict]:
+    """
+    Args:
+        pasta: Pasta de trabalho onde as árvores sintéticas ficam
+        tamanhos: Quantidades de arquivos a testar (ex: 10000, 100000, 1000000)
+
+    Returns:
+        Lista com um dicionário de tempos por tamanho
+    """
+    import time
+
+    def varredura_antiga(raiz: Path) -> int:
+        contador = 0
+        for item in raiz.rglob('*'):
+            if item.is_file():
+                if item.parent == raiz:
+                    continue
+                item.relative_to(raiz)
+                if not deve_manter_arquivo(item):
+                    item.stat()
+                contador += 1
+        for pasta_item in sorted(raiz.rglob('*'), key=lambda p: len(p.parts), reverse=True):
+            if pasta_item.is_dir():
+                any(pasta_item.iterdir())
+        return contador
+
+    def varredura_nova(raiz: Path) -> int:
+        contador = 0
+        raiz_str = str(raiz)
+        for tipo, valor in percorrer_arvore(raiz_str):
+            if tipo == 'pasta':
+                with os.scandir(valor) as it:
+                    next(it, None)
+                continue
+            if valor.is_file():
+                if os.path.dirname(valor.path) == raiz_str:
+                    continue
+                _relativo(valor.path, raiz_str)
+                if not _deve_manter_nome(valor.name):
+                    valor.stat()
+                contador += 1
+        return contador
+
+    resultados = []
+    for tamanho in tamanhos:
+        raiz = Path(pasta) / f"bench_{tamanho}"
+        if not raiz.exists():
+            print(f"🛠️  Gerando árvore sintética com {tamanho} arquivos em {raiz}...")
+            gerar_arvore_sintetica(str(raiz), tamanho)
+
+        inicio = time.perf_counter()
+        varredura_antiga(raiz)
+        tempo_antigo = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        varredura_nova(raiz)
+        tempo_novo = time.perf_counter() - inicio
+
+        resultados.append({
+            'arquivos': tamanho,
+            'antiga_s': tempo_antigo,
+            'nova_s': tempo_novo,
+            'ganho': tempo_antigo / tempo_novo if tempo_novo else 0,
+        })
+        print(f"  {tamanho:>9} arquivos | antiga: {tempo_antigo:8.2f}s | nova: {tempo_novo:8.2f}s | "
+              f"{resultados[-1]['ganho']:.1f}x")
+
+    return resultados
+
+
+#Contadores de E/S do processo (só Linux): syscr/syscw são as chamadas read()/write()
+def _ler_proc_io() -> Dict[str, int]:
+    try:
+        with open('/proc/self/io') as f:
+            return {chave: int(valor) for chave, valor in (linha.split(':') for linha in f if ':' in linha)}
+    except OSError:
+        return {}
+
+#Pico de memória (RSS) em MB deste processo e dos filhos (pools de descompactação)
+def _pico_rss_mb() -> Optional[float]:
+    try:
+        import resource
+    except ImportError:
+        return None
+    # ru_maxrss vem em KB no Linux e em bytes no macOS
+    unidade = 1 if sys.platform == 'darwin' else 1024
+    pico = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return round(pico * unidade / (1024 * 1024), 1)
+
+#Gera uma árvore sintética, roda as três etapas (em execução) e mede cada uma.
+#A árvore é apagada e gerada de novo a cada chamada, então dá para comparar
+#versões diferentes do script com a mesma semente.
+def benchmark_fases(pasta: str, n_arquivos: int = 10000, profundidade: int = 2, largura: int = 10,
+                    mistura_extensoes: Optional[Dict[str, float]] = None, taxa_lixo: float = 0.05,
+                    compactados: List[Tuple[str, int, int]] = (('zip', 4, 1024 * 1024),),
+                    semente: int = 42, trabalhadores: int = 1) -> dict:
+    """
+    Args:
+        pasta: Pasta de trabalho (a árvore fica em pasta/bench_fases)
+        n_arquivos, profundidade, largura, mistura_extensoes, taxa_lixo, compactados, semente:
+            Repassados para gerar_arvore_sintetica
+        trabalhadores: Igual ao --trabalhadores da descompactação
+
+    Returns:
+        Dicionário pronto para virar JSON: parâmetros, ambiente e métricas por etapa
+        (segundos, arquivos/s, MB/s, syscr/syscw, bytes lidos/escritos e pico de RSS).
+        Os contadores de E/S são só do processo principal.
+    """
+    import contextlib
+    import io
+    import platform
+
+    raiz = Path(pasta) / 'bench_fases'
+    if raiz.exists():
+        shutil.rmtree(raiz)
+    inicio = time.perf_counter()
+    with contextlib.redirect_stdout(sys.stderr):
+        gerar_arvore_sintetica(str(raiz), n_arquivos,
+                               arquivos_por_pasta=max(1, n_arquivos // max(1, largura ** profundidade)),
+                               semente=semente, profundidade=profundidade, largura=largura,
+                               mistura_extensoes=mistura_extensoes, taxa_lixo=taxa_lixo, compactados=compactados)
+    tempo_geracao = time.perf_counter() - inicio
+
+    fases = {}
+
+    def medir(nome: str, etapa: Callable[[], Tuple[int, int]]):
+        io_antes = _ler_proc_io()
+        inicio = time.perf_counter()
+        # As etapas imprimem bastante: a saída vai para o lixo para não sujar o JSON
+        with contextlib.redirect_stdout(io.StringIO()):
+            arquivos, bytes_processados = etapa()
+        tempo = time.perf_counter() - inicio
+        io_depois = _ler_proc_io()
+        fases[nome] = {
+            'segundos': round(tempo, 6),
+            'arquivos': arquivos,
+            'mb': round(bytes_processados / (1024 * 1024), 3),
+            'arquivos_por_s': round(arquivos / tempo, 1) if tempo else None,
+            'mb_por_s': round(bytes_processados / (1024 * 1024) / tempo, 3) if tempo else None,
+            'pico_rss_mb': _pico_rss_mb(),
+        }
+        for chave in ('syscr', 'syscw', 'read_bytes', 'write_bytes'):
+            if chave in io_antes:
+                fases[nome][chave] = io_depois[chave] - io_antes[chave]
+
+    resultado_extracao = {}
+
+    def extracao():
+        tamanho_total = sum(valor.stat().st_size for tipo, valor in percorrer_arvore(str(raiz)) if tipo == 'arquivo')
+        stats = extrair_e_organizar(str(raiz), False, False)
+        resultado_extracao.update(stats)
+        return stats['arquivos_movidos'] + stats['arquivos_removidos'], tamanho_total
+
+    def descompactacao():
+        nomes = resultado_extracao['arquivos_compactados_encontrados']
+        stats = descompactar_compactados(str(raiz), nomes, False, trabalhadores)
+        # Só o que foi extraído (as pastas _quak), não os compactados movidos para ZIPS
+        expandido = sum(_tamanho_pasta(str(raiz / PASTA_ZIPS / f"{Path(nome).stem}_quak")) for nome in nomes)
+        return stats['arquivos_descompactados'], expandido
+
+    def organizacao():
+        with os.scandir(str(raiz)) as entradas:
+            tamanho_raiz = sum(entrada.stat().st_size for entrada in entradas if entrada.is_file())
+        stats = organizar_por_extensao(str(raiz), False, False)
+        return stats['arquivos_movidos'], tamanho_raiz
+
+    medir('extrair_e_organizar', extracao)
+    medir('descompactar_compactados', descompactacao)
+    medir('organizar_por_extensao', organizacao)
+
+    return {
+        'parametros': {
+            'arquivos': n_arquivos,
+            'profundidade': profundidade,
+            'largura': largura,
+            'mistura_extensoes': mistura_extensoes,
+            'taxa_lixo': taxa_lixo,
+            'compactados': [list(item) for item in compactados],
+            'semente': semente,
+            'trabalhadores': trabalhadores,
+        },
+        'ambiente': {
+            'python': platform.python_version(),
+            'plataforma': platform.platform(),
+            'backends': {extensao: [backend.nome for backend in backends]
+                         for extensao, backends in backends_disponiveis().items()},
+        },
+        'geracao_s': round(tempo_geracao, 6),
+        'fases': fases,
+        'total_s': round(sum(fase['segundos'] for fase in fases.values()), 6),
+    }
+
+#Lê "pdf:3,java:2" → {'.pdf': 3.0, '.java': 2.0}
+def _ler_mistura_extensoes(texto: Optional[str]) -> Optional[Dict[str, float]]:
+    if not texto:
+        return None
+    mistura = {}
+    for item in texto.split(','):
+        extensao, _, peso = item.strip().partition(':')
+        mistura['.' + extensao.strip().lstrip('.').lower()] = float(peso or 1)
+    return mistura
+
+#Lê "zip:4:1,7z:2:10" → [('zip', 4, 1 MB), ('7z', 2, 10 MB)]
+def _ler_compactados_bench(texto: str) -> List[Tuple[str, int, int]]:
+    compactados = []
+    for item in filter(None, (parte.strip() for parte in texto.split(','))):
+        formato, quantidade, megabytes = item.split(':')
+        if formato not in ('zip', '7z'):
+            raise ValueError(f"formato de compactado inválido no benchmark: {formato} (use zip ou 7z)")
+        compactados.append((formato, int(quantidade), int(float(megabytes) * 1024 * 1024)))
+    return compactados
+
+
 def main():
     """Função principal."""
     import argparse
@@ -522,79 +4373,480 @@ Exemplos:
   python LimpaZipUTF.py /caminho/da/pasta --executar
   python LimpaZipUTF.py /caminho/da/pasta --executar --silencioso
   python LimpaZipUTF.py /caminho/da/pasta --extensoes
+  python LimpaZipUTF.py /cursos/A /cursos/B /cursos/C --executar --trabalhadores 4
+  python LimpaZipUTF.py cursos.txt --lista --executar --trabalhadores 8
+  python LimpaZipUTF.py /tmp/bench --benchmark-varredura 10000 100000 1000000
+  python LimpaZipUTF.py /tmp/bench --benchmark --bench-arquivos 100000 --bench-compactados zip:10:5
         """
     )
     # a cima são as opções do parser (comandos de terminal)
 
     # !!!NÃO ALTERE O CÓDIGO ABAIXO!!!
     parser.add_argument('pasta', help='Caminho da pasta a organizar')
+    parser.add_argument('outras_pastas', nargs='*', metavar='PASTA',
+                        help='Mais pastas: processa todas em lote, sem perguntas')
+    parser.add_argument('--lista', action='store_true',
+                        help='A "pasta" é um arquivo de texto com uma pasta por linha (lote, sem perguntas)')
     parser.add_argument('--executar', action='store_true', help='Executa a extração (padrão: simulação)')
     parser.add_argument('--silencioso', action='store_true', help='Modo menos verboso')
     parser.add_argument('--extensoes', action='store_true', help='Mostra extensões permitidas e sai')
+    parser.add_argument('--trabalhadores', type=int, default=1, metavar='N',
+                        help='Descompacta até N arquivos ao mesmo tempo (padrão: 1)')
+    parser.add_argument('--varredores', type=int, default=1, metavar='N',
+                        help='Lista até N subpastas ao mesmo tempo (padrão: 1; ajuda em NFS/SMB e HD, ex.: 8-16)')
+    parser.add_argument('--manter-mais-recente', action='store_true',
+                        help='Arquivo com o mesmo nome em várias subpastas: fica só a cópia mais recente')
+    parser.add_argument('--filtrar-compactados', action='store_true',
+                        help='Não extrai de ZIPs arquivos que seriam removidos (lixo, extensões não permitidas)')
+    parser.add_argument('--so-categorias', metavar='LISTA',
+                        help='Dos compactados, extrai só estas categorias (ex.: Documentos,Código)')
+    parser.add_argument('--so-padroes', metavar='LISTA',
+                        help='Dos compactados, extrai só o que casar com estes padrões (ex.: "*.pdf,Aula*/*.java")')
+    parser.add_argument('--indexar', nargs='?', const='', default=None, metavar='ARQUIVO',
+                        help='Só lista o conteúdo de todos os compactados num índice, sem descompactar '
+                             '(padrão: .limpazip/indice_compactados.jsonl)')
+    parser.add_argument('--buscar', action='store_true',
+                        help='Procura no índice os membros de --so-categorias/--so-padroes (atualiza o índice antes)')
+    parser.add_argument('--deduplicar', choices=['remover', 'hardlink'],
+                        help='Arquivos com conteúdo idêntico a um já organizado (raiz, categorias, ZIPS) '
+                             'são removidos ou viram hardlink')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Pula arquivos e compactados já processados (manifesto em .limpazip/)')
+    parser.add_argument('--regras', metavar='ARQUIVO',
+                        help='Arquivo .config com categorias, lixo e limites de tamanho próprios')
+    parser.add_argument('--plano', metavar='ARQUIVO',
+                        help='Na simulação, grava todas as operações num plano .jsonl para aplicar depois')
+    parser.add_argument('--aplicar', metavar='ARQUIVO',
+                        help='Executa um plano gravado com --plano, sem varrer a pasta de novo')
+    parser.add_argument('--pipeline', action='store_true',
+                        help='Com --executar: extrai, descompacta e organiza ao mesmo tempo, sem perguntas')
+    parser.add_argument('--varrer-zips', action='store_true',
+                        help='Também descompacta compactados encontrados dentro dos compactados')
+    parser.add_argument('--profundidade-maxima', type=int, default=PROFUNDIDADE_MAXIMA_PADRAO, metavar='N',
+                        help=f'Com --varrer-zips: níveis de compactados internos (padrão: {PROFUNDIDADE_MAXIMA_PADRAO})')
+    parser.add_argument('--limite-expandido-mb', type=float, default=None, metavar='MB',
+                        help='Recusa compactados que expandiriam além disso (somando os internos)')
+    parser.add_argument('--razao-maxima', type=float, default=RAZAO_MAXIMA_PADRAO, metavar='R',
+                        help=f'Recusa ZIPs com razão de compressão acima de R:1 (padrão: {RAZAO_MAXIMA_PADRAO}; 0 desliga)')
+    parser.add_argument('--vigiar', action='store_true',
+                        help='Com --executar: fica rodando e organiza cada arquivo novo assim que ele chega')
+    parser.add_argument('--debounce', type=float, default=DEBOUNCE_VIGIA, metavar='SEG',
+                        help=f'Com --vigiar: espera SEG segundos sem eventos antes de agir (padrão: {DEBOUNCE_VIGIA})')
+    parser.add_argument('--polling', type=float, default=None, metavar='SEG',
+                        help='Com --vigiar: varre a cada SEG segundos em vez de usar inotify (NFS/SMB, fora do Linux)')
+    parser.add_argument('--verificar', type=int, nargs='?', const=_threads_verificacao(), default=0, metavar='N',
+                        help='Confere cada arquivo extraído com o CRC32 do compactado e calcula o SHA-256 '
+                             f'(N threads, padrão: {_threads_verificacao()}; com --incremental os hashes ficam guardados)')
+    parser.add_argument('--estimar', action='store_true',
+                        help='Antes de começar, estima espaço/tempo e recusa executar se o disco não comportar '
+                             '(varredura extra; o teste de disco só roda com --executar)')
+    parser.add_argument('-y', '--sim', action='store_true',
+                        help="Responde 'y' para todas as perguntas (modo não interativo)")
+    parser.add_argument('--benchmark-varredura', type=int, nargs='*', metavar='N',
+                        help='Gera árvores sintéticas na pasta e compara a varredura antiga com a nova')
+    parser.add_argument('--retomar', action='store_true',
+                        help='Continua a última execução interrompida desta pasta (diário em .limpazip/): '
+                             'pula as etapas já concluídas e termina movimentos pela metade. A etapa '
+                             'interrompida é varrida de novo (só --aplicar pula operação por operação)')
+    parser.add_argument('--registro', metavar='ARQUIVO',
+                        help='Grava cada arquivo movido/removido/descompactado neste arquivo (JSON Lines, acrescenta; '
+                             'uma pasta só, não vale no lote)')
+    parser.add_argument('--metricas', metavar='ARQUIVO',
+                        help='Mede cada operação e grava as métricas (.prom = Prometheus textfile, senão JSON)')
+    parser.add_argument('--perfil', metavar='ARQUIVO',
+                        help='Roda sob cProfile, grava o perfil (.prof) e mostra as funções mais caras')
+    parser.add_argument('--memoria', action='store_true',
+                        help='Roda sob tracemalloc e mostra o pico e onde a memória foi alocada')
+    parser.add_argument('--benchmark', action='store_true',
+                        help='Gera uma árvore sintética na pasta, mede cada etapa e imprime JSON')
+    parser.add_argument('--bench-arquivos', type=int, default=10000, metavar='N',
+                        help='Benchmark: quantidade de arquivos (padrão: 10000)')
+    parser.add_argument('--bench-profundidade', type=int, default=2, metavar='N',
+                        help='Benchmark: níveis de subpastas (padrão: 2)')
+    parser.add_argument('--bench-largura', type=int, default=10, metavar='N',
+                        help='Benchmark: subpastas por pasta (padrão: 10)')
+    parser.add_argument('--bench-extensoes', metavar='EXT:PESO,...',
+                        help='Benchmark: mistura de extensões, ex: pdf:3,java:2,png:1')
+    parser.add_argument('--bench-lixo', type=float, default=0.05, metavar='FRAÇÃO',
+                        help='Benchmark: fração de arquivos lixo (padrão: 0.05)')
+    parser.add_argument('--bench-compactados', default='zip:4:1', metavar='FORMATO:QTD:MB,...',
+                        help='Benchmark: compactados a gerar, ex: zip:4:1,7z:2:10 (padrão: zip:4:1)')
+    parser.add_argument('--bench-semente', type=int, default=42, metavar='N',
+                        help='Benchmark: semente da árvore sintética (padrão: 42)')
+    parser.add_argument('--bench-json', metavar='ARQUIVO',
+                        help='Benchmark: grava o JSON neste arquivo além de imprimir')
 
     args = parser.parse_args()
+    return _com_instrumentacao(args, _executar_cli)
+
+#Liga métricas, cProfile e tracemalloc em volta de uma execução do programa
+def _com_instrumentacao(args, executar: Callable[[object], int]) -> int:
+    if not (args.metricas or args.perfil or args.memoria):
+        return executar(args)
+
+    import cProfile
+    import pstats
+    import tracemalloc
+
+    METRICAS.zerar()
+    METRICAS.ativo = bool(args.metricas)
+    perfil = cProfile.Profile() if args.perfil else None
+    if args.memoria:
+        tracemalloc.start(10)
+    if perfil is not None:
+        perfil.enable()
+    try:
+        return executar(args)
+    finally:
+        if perfil is not None:
+            perfil.disable()
+            perfil.dump_stats(args.perfil)
+            print(f"\n🔬 Perfil gravado em {args.perfil} (abra com: python -m pstats {args.perfil})")
+            pstats.Stats(perfil, stream=sys.stdout).sort_stats('cumulative').print_stats(15)
+        if args.memoria:
+            _, pico = tracemalloc.get_traced_memory()
+            fotografia = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+            print(f"\n🧠 Pico de memória do Python: {pico / (1024 * 1024):.2f} MB. Maiores alocações ainda vivas:")
+            for estatistica in fotografia.statistics('lineno')[:10]:
+                print(f"  • {estatistica}")
+        if args.metricas:
+            imprimir_metricas()
+            METRICAS.salvar(args.metricas)
+            print(f"📈 Métricas gravadas em {args.metricas}")
+
+def _executar_cli(args) -> int:
+    try:
+        regras = carregar_regras(args.regras)
+    except (ValueError, configparser.Error) as e:
+        print(f"\n❌ Erro nas regras: {e}")
+        return 1
+    if args.manter_mais_recente and not regras.manter_mais_recente:
+        regras = Regras(regras.extensoes_por_categoria, regras.nomes_remover, regras.padroes_remover,
+                        regras.tamanho_minimo, regras.tamanho_maximo / (1024 * 1024) if regras.tamanho_maximo else None,
+                        regras.politica, True)
+
+    if args.so_categorias or args.so_padroes:
+        selecao = SeletorMembros([categoria.strip() for categoria in (args.so_categorias or '').split(',')
+                                  if categoria.strip()],
+                                 [padrao.strip() for padrao in (args.so_padroes or '').split(',') if padrao.strip()])
+        desconhecidas = selecao.categorias - set(regras.categorias)
+        if desconhecidas:
+            print(f"\n❌ Categoria(s) desconhecida(s): {', '.join(sorted(desconhecidas))}. "
+                  f"Existem: {', '.join(regras.categorias)}")
+            return 1
+        regras = regras.com_selecao(selecao)
+        # Extração seletiva é um filtro de membros
+        args.filtrar_compactados = True
+
+    limites = LimitesExtracao(
+        args.profundidade_maxima,
+        int(args.limite_expandido_mb * 1024 * 1024) if args.limite_expandido_mb else None,
+        args.razao_maxima or None,
+    )
 
     if args.extensoes:
-        imprimir_extensoes()
+        imprimir_extensoes(regras)
+        return 0
+
+    if args.benchmark:
+        try:
+            resultado = benchmark_fases(args.pasta, args.bench_arquivos, args.bench_profundidade, args.bench_largura,
+                                        _ler_mistura_extensoes(args.bench_extensoes), args.bench_lixo,
+                                        _ler_compactados_bench(args.bench_compactados), args.bench_semente,
+                                        args.trabalhadores)
+        except ValueError as e:
+            print(f"\n❌ Parâmetros do benchmark: {e}")
+            return 1
+        texto = json.dumps(resultado, indent=2, ensure_ascii=False)
+        print(texto)
+        if args.bench_json:
+            with open(args.bench_json, 'w', encoding='utf-8') as f:
+                f.write(texto + '\n')
+        return 0
+
+    if args.benchmark_varredura is not None:
+        print("\n⏱️  BENCHMARK DA VARREDURA (somente leitura)")
+        benchmark_varredura(args.pasta, args.benchmark_varredura or [10000, 100000, 1000000])
+        return 0
+
+    if args.indexar is not None or args.buscar:
+        caminho_indice = _caminho_indice_compactados(args.pasta, args.indexar or None)
+        print(f"\n🗂️  INDEXANDO COMPACTADOS (sem descompactar): {args.pasta}")
+        stats = indexar_compactados(args.pasta, caminho_indice, regras, args.trabalhadores, args.varredores,
+                                    not args.silencioso and not args.buscar)
+        print(f"✅ {stats['compactados']} compactado(s), {stats['membros']} arquivo(s) dentro "
+              f"({stats['bytes_membros'] / (1024 * 1024):.2f} MB expandidos), "
+              f"{stats['reaproveitados']} sem mudança desde o último índice")
+        for erro in stats['erros']:
+            print(f"  ⚠️  {erro}")
+        print(f"📄 Índice: {caminho_indice}")
+        if args.buscar:
+            selecao = regras.selecao or SeletorMembros()
+            encontrados = 0
+            total = 0
+            print(f"\n🔎 RESULTADO DA BUSCA")
+            print("-" * 120)
+            for compactado, nome, tamanho, crc, categoria in buscar_no_indice(caminho_indice, selecao):
+                encontrados += 1
+                total += tamanho
+                print(f"  {compactado} → {nome} ({tamanho / (1024 * 1024):.2f} MB, {categoria or 'sem categoria'}, "
+                      f"crc {crc or '?'})")
+            print("-" * 120)
+            print(f"🔎 {encontrados} arquivo(s), {total / (1024 * 1024):.2f} MB")
+        return 0
+
+    if args.vigiar:
+        if not args.executar or args.lista or args.outras_pastas or args.plano or args.aplicar or args.retomar:
+            print("\n❌ --vigiar precisa de --executar e funciona com uma pasta só (sem --plano/--aplicar/--retomar).")
+            return 1
+        if not os.path.isdir(args.pasta):
+            print(f"\n❌ Pasta não encontrada: {args.pasta}")
+            return 1
+        registro = RegistroArquivos(args.registro, Path(args.pasta), False) if args.registro else None
+        try:
+            total = vigiar(args.pasta, not args.silencioso, regras, args.trabalhadores, args.filtrar_compactados,
+                           args.varrer_zips, limites, registro, args.debounce, args.polling, args.varredores)
+        finally:
+            if registro is not None:
+                registro.fechar()
+        print(f"📊 {total.get('lotes', 0)} lote(s): {total.get('arquivos_movidos', 0)} movido(s), "
+              f"{total.get('arquivos_removidos', 0)} removido(s), {total.get('arquivos_organizados', 0)} organizado(s)")
         return 0
 
+    # Modo lote: várias pastas (ou um arquivo com a lista delas)
+    if args.lista or args.outras_pastas:
+        if args.lista:
+            with open(args.pasta, 'r', encoding='utf-8') as f:
+                pastas = [linha.strip() for linha in f if linha.strip() and not linha.lstrip().startswith('#')]
+            pastas += args.outras_pastas
+        else:
+            pastas = [args.pasta] + args.outras_pastas
+        if args.plano or args.aplicar or args.pipeline or args.retomar:
+            print("\n❌ --plano, --aplicar, --pipeline e --retomar funcionam com uma pasta de cada vez.")
+            return 1
+        if args.registro:
+            # Vários processos escrevendo no mesmo arquivo embaralhariam as linhas
+            print("\n❌ --registro funciona com uma pasta de cada vez. No lote, cada pasta executada "
+                  f"tem o próprio diário em {PASTA_ESTADO}/diario.jsonl.")
+            return 1
+        resultados = executar_lote(pastas, not args.executar, not args.silencioso, args.trabalhadores,
+                                   args.deduplicar, args.incremental, regras, limites,
+                                   args.filtrar_compactados, args.varrer_zips, args.varredores, args.estimar,
+                                   args.verificar)
+        imprimir_relatorio_lote(resultados, not args.executar)
+        return 0 if all(resumo['ok'] for resumo in resultados) else 1
+
+    # Execução interrompida: o diário diz qual modo retomar e o que já terminou
+    anterior = None
+    if args.retomar:
+        anterior = Diario.ler(Path(args.pasta))
+        if anterior is None or anterior['terminada']:
+            print("\n✅ Nada para retomar: a última execução desta pasta terminou (ou nunca houve uma).")
+            return 0
+        print(f"\n🔁 Retomando execução interrompida ({anterior['modo']}, iniciada em "
+              f"{anterior['cabecalho'].get('inicio')}, {anterior['operacoes']} operação(ões) no diário)")
+        if anterior['modo'] != 'aplicar':
+            # Sem plano não há lista de operações para pular: a etapa interrompida é
+            # varrida de novo (o que já foi movido/removido nem está mais lá)
+            print("   A etapa interrompida será varrida de novo; as já concluídas são puladas")
+        args.executar = True
+        if anterior['modo'] == 'aplicar':
+            args.aplicar = anterior['cabecalho'].get('plano')
+        elif anterior['modo'] == 'pipeline':
+            args.pipeline = True
+
     modo_simulacao = not args.executar
     verbose = not args.silencioso
 
+    if args.plano and not modo_simulacao:
+        print("\n❌ --plano só funciona na simulação (sem --executar). Depois use --aplicar.")
+        return 1
+
+    if args.pipeline and (modo_simulacao or args.deduplicar):
+        print("\n❌ --pipeline precisa de --executar e não funciona com --deduplicar.")
+        return 1
+
+    # Pergunta y/n (ou responde sozinho com --sim)
+    def perguntar(texto: str) -> bool:
+        if args.sim:
+            print(f"{texto}y")
+            return True
+        return input(texto).strip().lower() == 'y'
+
+    if args.aplicar:
+        print("\n⚠️  APLICANDO PLANO - ARQUIVOS SERÃO MOVIDOS E REMOVIDOS!")
+        if not perguntar("Tem certeza? Digite 'y' para continuar: "):
+            print("Operação cancelada.")
+            return 0
+        registro = RegistroArquivos(args.registro, Path(args.pasta), False) if args.registro else None
+        diario = Diario(Path(args.pasta), 'aplicar', anterior is not None, registro,
+                        plano=str(Path(args.aplicar).resolve()))
+        pular = anterior['checkpoints'].get('aplicar', {}).get('operacoes', 0) if anterior else 0
+        try:
+            stats_plano = aplicar_plano(args.pasta, args.aplicar, verbose, regras, limites, diario, pular)
+            diario.terminar()
+        except (OSError, ValueError) as e:
+            print(f"\n❌ Erro: {e}")
+            return 1
+        finally:
+            diario.fechar()
+            if registro is not None:
+                registro.fechar()
+        print(f"\n✅ Movidos: {stats_plano['arquivos_movidos']} | Removidos: {stats_plano['arquivos_removidos']} | "
+              f"Descompactados: {stats_plano['arquivos_descompactados']} | "
+              f"Pastas removidas: {stats_plano['pastas_vazias_removidas']}")
+        if stats_plano['operacoes_ignoradas']:
+            print(f"⏭️  Operações ignoradas (a pasta mudou desde o plano): {stats_plano['operacoes_ignoradas']}")
+        for erro in stats_plano['erros']:
+            print(f"  • {erro}")
+        print(f"🚚 Movimentos: {MOVEDOR.resumo()}")
+        return 0
+
+    manifesto = Manifesto(Path(args.pasta)) if args.incremental else None
+
+    # Quanto vai ser escrito e se cabe no disco, ANTES de mexer em qualquer coisa
+    # (numa retomada parte já foi feita: a estimativa não vale mais). A simulação
+    # (e o --plano) não escreve nada na pasta, nem o arquivo do teste de disco.
+    if args.estimar and anterior is None:
+        try:
+            estimativa = estimar_execucao(args.pasta, regras, args.filtrar_compactados, args.varredores,
+                                          medir=not modo_simulacao, manifesto=manifesto)
+        except OSError as e:
+            print(f"\n❌ Erro: {e}")
+            return 1
+        imprimir_estimativa(estimativa)
+        if not modo_simulacao and not estimativa['espaco_suficiente']:
+            print("\n❌ Execução recusada: o disco encheria no meio do caminho. Libere espaço "
+                  "(ou rode sem --estimar por sua conta e risco).")
+            return 1
+
     if modo_simulacao:
         print("\n⚠️  MODO SIMULAÇÃO - Nenhum arquivo será movido ou removido")
         print("💡 Use --executar para realmente fazer a extração\n")
     else:
         print("\n⚠️  MODO EXECUÇÃO - ARQUIVOS SERÃO MOVIDOS E PASTAS REMOVIDAS!")
-        resposta = input("Tem certeza? Digite 'y' para continuar: ").strip().lower()
-        if resposta != 'y':
+        if not perguntar("Tem certeza? Digite 'y' para continuar: "):
             print("Operação cancelada.")
             return 0
         print()
 
+    espelho = RegistroArquivos(args.registro, Path(args.pasta), modo_simulacao) if args.registro else None
+    # Em execução, tudo passa pelo diário (que repassa ao --registro, se houver)
+    diario = None
+    if not modo_simulacao and not args.plano:
+        diario = Diario(Path(args.pasta), 'pipeline' if args.pipeline else 'direto', anterior is not None, espelho)
+    registro = diario or espelho
+    retomando = anterior is not None
+    etapas_feitas = anterior['checkpoints'] if anterior else {}
+
     try:
+        if args.plano:
+            stats = gerar_plano(args.pasta, args.plano, verbose, args.deduplicar, manifesto, regras,
+                                args.filtrar_compactados, args.varredores)
+            imprimir_estatisticas(stats, modo_simulacao)
+            print(f"💡 Para executar este plano: python LimpaZipUTF.py \"{args.pasta}\" --aplicar \"{args.plano}\"")
+            return 0
+
+        if args.pipeline:
+            stats, stats_descomp, stats_org = executar_pipeline(args.pasta, verbose, args.trabalhadores, manifesto,
+                                                                regras, args.filtrar_compactados, args.varrer_zips,
+                                                                limites=limites, registro=registro, retomar=retomando,
+                                                                varredores=args.varredores, verificar=args.verificar)
+            imprimir_estatisticas(stats, modo_simulacao)
+            print(f"\n✅ Descompactados: {stats_descomp['arquivos_descompactados']}")
+            if stats_descomp['descompactados_incompletos']:
+                print(f"⚠️  Descompactados com falha em compactado interno: "
+                      f"{stats_descomp['descompactados_incompletos']}")
+            print(f"📦 Compactados movidos para ZIPS: {stats_descomp['compactados_movidos']}")
+            if args.verificar:
+                print(f"🔒 Arquivos verificados: {stats_descomp['arquivos_verificados']}")
+            for erro in stats_descomp['erros']:
+                print(f"  • {erro}")
+            print(f"✅ Arquivos organizados: {stats_org['arquivos_movidos']}")
+            print(f"📁 Pastas criadas: {stats_org['pastas_criadas']}")
+            _imprimir_por_categoria(stats_org['por_categoria'])
+            if manifesto is not None:
+                manifesto.salvar()
+            diario.terminar()
+            print(f"\n🚚 Movimentos: {MOVEDOR.resumo()}")
+            return 0
+
         # 1️⃣ PASSO 1: Extrair e organizar
-        stats = extrair_e_organizar(args.pasta, modo_simulacao, verbose)
-        imprimir_estatisticas(stats, modo_simulacao)
+        if 'extrair' in etapas_feitas:
+            print("\n⏭️  Passo 1 (extrair) já tinha terminado antes da interrupção")
+            with os.scandir(args.pasta) as it:
+                compactados = sorted(entrada.name for entrada in it if entrada.is_file() and
+                                     os.path.splitext(entrada.name)[1].lower() in {'.zip', '.rar', '.7z'})
+        else:
+            stats = extrair_e_organizar(args.pasta, modo_simulacao, verbose, args.deduplicar, manifesto, regras,
+                                        registro=registro, retomar=retomando, varredores=args.varredores)
+            imprimir_estatisticas(stats, modo_simulacao)
+            compactados = stats['arquivos_compactados_encontrados']
+            if diario is not None:
+                diario.checkpoint('extrair')
 
         # 2️⃣ PASSO 2: Descompactar arquivos compactados (ANTES de organizar!)
-        if not modo_simulacao:
-            if stats['arquivos_compactados_encontrados']:
-                print(f"\n📦 Encontrados {len(stats['arquivos_compactados_encontrados'])} arquivo(s) compactado(s):")
-                for arquivo in stats['arquivos_compactados_encontrados']:
+        if not modo_simulacao and 'descompactar' in etapas_feitas:
+            print("\n⏭️  Passo 2 (descompactar) já tinha terminado antes da interrupção")
+        elif not modo_simulacao:
+            if compactados:
+                print(f"\n📦 Encontrados {len(compactados)} arquivo(s) compactado(s):")
+                for arquivo in compactados:
                     print(f"  • {arquivo}")
                 
-                resposta_descomp = input("\n[y/n] Descompactar todos? ").strip().lower()
-                
-                if resposta_descomp == 'y':
-                    stats_descomp = descompactar_compactados(args.pasta, stats['arquivos_compactados_encontrados'], verbose)
+                if perguntar("\n[y/n] Descompactar todos? "):
+                    stats_descomp = descompactar_compactados(args.pasta, compactados, verbose,
+                                                              args.trabalhadores, args.filtrar_compactados, manifesto,
+                                                              regras, args.varrer_zips, limites, registro, args.verificar)
                     print(f"\n✅ Descompactados: {stats_descomp['arquivos_descompactados']}")
+                    if stats_descomp['descompactados_incompletos']:
+                        print(f"⚠️  Descompactados com falha em compactado interno: "
+                              f"{stats_descomp['descompactados_incompletos']}")
                     print(f"📦 Compactados movidos para ZIPS: {stats_descomp['compactados_movidos']}")
+                    if args.verificar:
+                        print(f"🔒 Arquivos verificados: {stats_descomp['arquivos_verificados']}")
                     
                     if stats_descomp['erros']:
                         print(f"\n⚠️  Erros encontrados:")
                         for erro in stats_descomp['erros']:
                             print(f"  • {erro}")
+            diario.checkpoint('descompactar')
 
         # 3️⃣ PASSO 3: Organizar por extensão (DEPOIS de descompactar)
-        if not modo_simulacao:
-            resposta_org = input("\n[y/n] Organizar arquivos por extensão (Documentos, Código, Imagens, etc)? ").strip().lower()
-            
-            if resposta_org == 'y':
-                stats_org = organizar_por_extensao(args.pasta, False, verbose)
+        if not modo_simulacao and 'organizar' in etapas_feitas:
+            print("\n⏭️  Passo 3 (organizar) já tinha terminado antes da interrupção")
+        elif not modo_simulacao:
+            if perguntar("\n[y/n] Organizar arquivos por extensão (Documentos, Código, Imagens, etc)? "):
+                stats_org = organizar_por_extensao(args.pasta, False, verbose, manifesto, regras, registro=registro,
+                                                   retomar=retomando)
                 print(f"\n✅ Arquivos organizados: {stats_org['arquivos_movidos']}")
                 print(f"📁 Pastas criadas: {stats_org['pastas_criadas']}")
+                _imprimir_por_categoria(stats_org['por_categoria'])
+            diario.checkpoint('organizar')
+
+        if manifesto is not None and not modo_simulacao:
+            manifesto.salvar()
+
+        if not modo_simulacao:
+            diario.terminar()
+            print(f"\n🚚 Movimentos: {MOVEDOR.resumo()}")
 
     except Exception as e:
         print(f"\n❌ Erro: {e}")
         import traceback
         traceback.print_exc()
         return 1
+    finally:
+        # Sem terminar(): o diário fica aberto para um --retomar
+        if diario is not None:
+            diario.fechar()
+        if espelho is not None:
+            espelho.fechar()
+            print(f"📝 {espelho.total} operação(ões) gravada(s) em {espelho.caminho}")
 
     return 0
 
 
 if __name__ == '__main__':
     exit(main())
-
-# só 600 linhas de código! ufa!
\ No newline at end of file
@@ -0,0 +1,46 @@
+import os
+import sys
+import zipfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import LimpaZipUTF  # noqa: E402
+
+
+def escrever(raiz, relativo: str, conteudo: bytes = b'abc'):
+    caminho = os.path.join(str(raiz), relativo)
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    with open(caminho, 'wb') as f:
+        f.write(conteudo)
+    return caminho
+
+
+def listar(raiz) -> list:
+    """Todos os caminhos (relativos, com '/') da árvore, fora .limpazip."""
+    raiz = str(raiz)
+    caminhos = []
+    for pasta, subpastas, arquivos in os.walk(raiz):
+        subpastas[:] = sorted(s for s in subpastas if s != LimpaZipUTF.PASTA_ESTADO)
+        for nome in subpastas + arquivos:
+            caminhos.append(os.path.relpath(os.path.join(pasta, nome), raiz).replace(os.sep, '/'))
+    return sorted(caminhos)
+
+
+@pytest.fixture
+def arvore(tmp_path):
+    """Árvore típica de uma disciplina: úteis em subpastas, lixo, uma pasta vazia e um ZIP."""
+    escrever(tmp_path, 'raiz.pdf')
+    escrever(tmp_path, 'a/x.pdf', b'1')
+    escrever(tmp_path, 'a/b/c/thumbs.db', b'zz' * 100)
+    escrever(tmp_path, 'c/d/e/y.java')
+    escrever(tmp_path, 'c/junk.tmp')
+    escrever(tmp_path, 'c/index.html')
+    os.makedirs(str(tmp_path / 'vazia' / 'v2'))
+    caminho_zip = escrever(tmp_path, 'z/p.zip', b'')
+    with zipfile.ZipFile(caminho_zip, 'w') as zf:
+        zf.writestr('src/Main.java', 'class Main{}')
+        zf.writestr('Thumbs.db', 'x')
+        zf.writestr('doc/a.pdf', 'p' * 10000)
+    return tmp_path
@@ -0,0 +1,52 @@
+import os
+
+from conftest import escrever, listar
+
+from LimpaZipUTF import IndiceConteudo, extrair_e_organizar, organizar_por_extensao
+
+
+def _rodar(raiz, deduplicar):
+    stats = extrair_e_organizar(str(raiz), modo_simulacao=False, verbose=False, deduplicar=deduplicar)
+    organizar_por_extensao(str(raiz), modo_simulacao=False, verbose=False)
+    return stats
+
+
+def test_duplicado_de_arquivo_ja_organizado_e_removido(tmp_path):
+    escrever(tmp_path, 'aula1/slides.pdf', b'conteudo' * 1000)
+    escrever(tmp_path, 'aula1/Main.java', b'class Main {}')
+    _rodar(tmp_path, 'remover')
+    assert listar(tmp_path) == ['Código', 'Código/Main.java', 'Documentos', 'Documentos/slides.pdf']
+
+    # Execução seguinte: a raiz está vazia, os originais estão nas categorias
+    escrever(tmp_path, 'aula2/slides (1).pdf', b'conteudo' * 1000)
+    escrever(tmp_path, 'aula2/Main.java', b'class Main {}')
+    escrever(tmp_path, 'aula2/outro.pdf', b'diferente' * 1000)
+    stats = _rodar(tmp_path, 'remover')
+
+    assert stats['duplicados_removidos'] == 2
+    assert listar(tmp_path) == ['Código', 'Código/Main.java', 'Documentos', 'Documentos/outro.pdf',
+                                'Documentos/slides.pdf']
+
+
+def test_hardlink_aponta_para_o_arquivo_na_categoria(tmp_path):
+    escrever(tmp_path, 'aula1/slides.pdf', b'conteudo' * 1000)
+    _rodar(tmp_path, 'hardlink')
+
+    escrever(tmp_path, 'aula2/slides.pdf', b'conteudo' * 1000)
+    stats = _rodar(tmp_path, 'hardlink')
+
+    assert stats['duplicados_vinculados'] == 1
+    original = os.stat(str(tmp_path / 'Documentos' / 'slides.pdf'))
+    copia = os.stat(str(tmp_path / 'Documentos' / 'slides_copia.pdf'))
+    assert (original.st_ino, original.st_dev) == (copia.st_ino, copia.st_dev)
+
+
+def test_hashes_salvos_acompanham_o_arquivo_organizado(tmp_path):
+    escrever(tmp_path, 'aula1/slides.pdf', b'conteudo' * 1000)
+    escrever(tmp_path, 'aula2/slides_v2.pdf', b'conteudo' * 1000)
+    _rodar(tmp_path, 'remover')
+
+    # O índice foi salvo com o arquivo na raiz; a organização o levou para Documentos
+    indice = IndiceConteudo(tmp_path, ['Documentos'])
+    assert list(indice.entradas) == ['Documentos/slides.pdf']
+    assert indice.entradas['Documentos/slides.pdf']['parcial'] is not None
@@ -0,0 +1,41 @@
+import io
+import os
+import zipfile
+
+from conftest import escrever
+
+from LimpaZipUTF import Manifesto, descompactar_compactados
+
+
+def _zip(arquivos: dict) -> bytes:
+    dados = io.BytesIO()
+    with zipfile.ZipFile(dados, 'w') as zf:
+        for nome, conteudo in arquivos.items():
+            zf.writestr(nome, conteudo)
+    return dados.getvalue()
+
+
+def test_compactado_interno_corrompido_nao_conta_o_de_fora_como_descompactado(tmp_path):
+    escrever(tmp_path, 'fora.zip', _zip({'slides.pdf': b'pdf', 'interno.zip': b'isto nao e um zip'}))
+    manifesto = Manifesto(tmp_path)
+
+    stats = descompactar_compactados(str(tmp_path), ['fora.zip'], verbose=False, manifesto=manifesto,
+                                     varrer_zips=True)
+
+    assert stats['arquivos_descompactados'] == 0
+    assert stats['descompactados_incompletos'] == 1
+    assert stats['erros'] == ['interno.zip: Falha na descompactação']
+    # O que saiu fica em ZIPS, mas a próxima execução incremental tenta de novo
+    assert os.path.isfile(str(tmp_path / 'ZIPS' / 'fora_quak' / 'slides.pdf'))
+    assert not manifesto.compactado_extraido('fora.zip', os.stat(str(tmp_path / 'ZIPS' / 'fora.zip')))
+
+
+def test_compactados_aninhados_validos_contam_todos(tmp_path):
+    escrever(tmp_path, 'fora.zip', _zip({'slides.pdf': b'pdf', 'interno.zip': _zip({'Main.java': b'class'})}))
+
+    stats = descompactar_compactados(str(tmp_path), ['fora.zip'], verbose=False, varrer_zips=True)
+
+    assert stats['arquivos_descompactados'] == 2
+    assert stats['descompactados_incompletos'] == 0
+    assert stats['erros'] == []
+    assert os.path.isfile(str(tmp_path / 'ZIPS' / 'fora_quak' / 'interno_quak' / 'Main.java'))
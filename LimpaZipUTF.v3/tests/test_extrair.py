@@ -0,0 +1,23 @@
+from conftest import listar
+
+from LimpaZipUTF import extrair_e_organizar
+
+
+def test_simulacao_nao_altera_nada(arvore):
+    antes = listar(arvore)
+    stats = extrair_e_organizar(str(arvore), modo_simulacao=True, verbose=False)
+
+    assert listar(arvore) == antes
+    assert stats['arquivos_movidos'] == 3
+    assert stats['arquivos_removidos'] == 3
+    assert stats['arquivos_compactados_encontrados'] == ['p.zip']
+
+
+def test_execucao_move_uteis_remove_lixo_e_pastas_vazias(arvore):
+    simulado = extrair_e_organizar(str(arvore), modo_simulacao=True, verbose=False)
+    stats = extrair_e_organizar(str(arvore), modo_simulacao=False, verbose=False)
+
+    assert listar(arvore) == ['p.zip', 'raiz.pdf', 'x.pdf', 'y.java']
+    for chave in ('arquivos_movidos', 'arquivos_removidos', 'pastas_vazias_removidas'):
+        assert stats[chave] == simulado[chave]
+    assert stats['pastas_vazias_removidas'] == 9
@@ -0,0 +1,39 @@
+import os
+import subprocess
+import sys
+
+from conftest import escrever
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'LimpaZipUTF.py')
+
+
+def _rodar(*argumentos):
+    return subprocess.run([sys.executable, SCRIPT, *argumentos], stdout=subprocess.PIPE,
+                          stderr=subprocess.STDOUT, universal_newlines=True)
+
+
+def test_lote_recusa_registro(tmp_path):
+    escrever(tmp_path, 'p1/a/x.pdf')
+    escrever(tmp_path, 'p2/a/y.pdf')
+
+    saida = _rodar(str(tmp_path / 'p1'), str(tmp_path / 'p2'), '--executar', '--registro',
+                   str(tmp_path / 'registro.jsonl'))
+
+    assert saida.returncode == 1
+    assert '--registro funciona com uma pasta de cada vez' in saida.stdout
+    assert os.path.isfile(str(tmp_path / 'p1' / 'a' / 'x.pdf'))
+
+
+def test_lote_verifica_as_extracoes(tmp_path):
+    import zipfile
+
+    for pasta in ('p1', 'p2'):
+        caminho = escrever(tmp_path, f'{pasta}/a/aula.zip', b'')
+        with zipfile.ZipFile(caminho, 'w') as zf:
+            zf.writestr('slides.pdf', 'pdf')
+            zf.writestr('Main.java', 'class Main {}')
+
+    saida = _rodar(str(tmp_path / 'p1'), str(tmp_path / 'p2'), '--executar', '--verificar', '2')
+
+    assert saida.returncode == 0, saida.stdout
+    assert '🔒 Arquivos verificados: 4' in saida.stdout
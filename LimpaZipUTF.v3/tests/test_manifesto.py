@@ -0,0 +1,36 @@
+import os
+
+from conftest import escrever
+
+from LimpaZipUTF import Manifesto
+
+
+def _registrar(manifesto, raiz, relativo):
+    escrever(raiz, relativo)
+    manifesto.registrar(relativo, os.stat(os.path.join(str(raiz), relativo)))
+
+
+def test_descartar_so_esquece_o_que_foi_percorrido(tmp_path):
+    manifesto = Manifesto(tmp_path)
+    for relativo in ('Documentos/a.pdf', 'ZIPS/z_quak/b.java', 'aula/c.txt', 'aula/sumiu.txt'):
+        _registrar(manifesto, tmp_path, relativo)
+    manifesto.salvar()
+
+    # Nova execução: a varredura pulou Documentos e ZIPS e só viu aula/c.txt
+    manifesto = Manifesto(tmp_path)
+    relativo = os.path.join('aula', 'c.txt')
+    assert manifesto.inalterado(relativo, os.stat(str(tmp_path / relativo)))
+    manifesto.descartar_nao_vistos({'Documentos', 'ZIPS'})
+
+    assert sorted(manifesto.arquivos) == ['Documentos/a.pdf', 'ZIPS/z_quak/b.java', 'aula/c.txt']
+
+
+def test_descartar_sem_pastas_puladas_esquece_tudo_que_nao_foi_visto(tmp_path):
+    manifesto = Manifesto(tmp_path)
+    _registrar(manifesto, tmp_path, 'Documentos/a.pdf')
+    manifesto.salvar()
+
+    manifesto = Manifesto(tmp_path)
+    manifesto.descartar_nao_vistos()
+
+    assert manifesto.arquivos == {}
@@ -0,0 +1,64 @@
+import os
+
+from conftest import escrever, listar
+
+import LimpaZipUTF
+from LimpaZipUTF import organizar_por_extensao
+
+
+def _raiz_com_arquivos(raiz, quantidade):
+    for i in range(quantidade):
+        escrever(raiz, f'doc{i:04d}.pdf')
+        escrever(raiz, f'prog{i:04d}.java')
+    escrever(raiz, 'p.zip')
+    escrever(raiz, 'sem_categoria.xyz')
+
+
+def test_organiza_com_uma_unica_listagem_da_raiz(tmp_path, monkeypatch):
+    _raiz_com_arquivos(tmp_path, 50)
+    listagens = []
+    scandir = os.scandir
+
+    def contando(caminho='.'):
+        listagens.append(str(caminho))
+        return scandir(caminho)
+
+    monkeypatch.setattr(LimpaZipUTF.os, 'scandir', contando)
+    stats = organizar_por_extensao(str(tmp_path), modo_simulacao=False, verbose=False)
+
+    assert listagens == [str(tmp_path)]
+    assert stats['por_categoria'] == {'Documentos': 50, 'Código': 50}
+    assert [nome for nome in listar(tmp_path) if '/' not in nome] == ['Código', 'Documentos', 'p.zip',
+                                                                      'sem_categoria.xyz']
+    assert len(os.listdir(str(tmp_path / 'Documentos'))) == 50
+
+
+def test_simulacao_conta_o_mesmo_que_a_execucao(tmp_path):
+    _raiz_com_arquivos(tmp_path, 5)
+    antes = listar(tmp_path)
+    simulado = organizar_por_extensao(str(tmp_path), modo_simulacao=True, verbose=False)
+    assert listar(tmp_path) == antes
+
+    executado = organizar_por_extensao(str(tmp_path), modo_simulacao=False, verbose=False)
+    assert simulado['por_categoria'] == executado['por_categoria']
+    assert simulado['arquivos_movidos'] == executado['arquivos_movidos'] == 10
+
+
+def test_raiz_grande_passa_pelo_arquivo_temporario(tmp_path, monkeypatch):
+    _raiz_com_arquivos(tmp_path, 200)
+    escrever(tmp_path, 'acentuação ção.pdf')
+    monkeypatch.setattr(LimpaZipUTF, 'MEMORIA_NOMES_RAIZ', 256)
+    rolados = []
+    spooled = LimpaZipUTF.tempfile.SpooledTemporaryFile
+
+    class Espiao(spooled):
+        def rollover(self):
+            rolados.append(True)
+            super().rollover()
+
+    monkeypatch.setattr(LimpaZipUTF.tempfile, 'SpooledTemporaryFile', Espiao)
+    stats = organizar_por_extensao(str(tmp_path), modo_simulacao=False, verbose=True)
+
+    assert rolados
+    assert stats['por_categoria'] == {'Documentos': 201, 'Código': 200}
+    assert 'acentuação ção.pdf' in os.listdir(str(tmp_path / 'Documentos'))
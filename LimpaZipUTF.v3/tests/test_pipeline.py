@@ -0,0 +1,34 @@
+import json
+import os
+import subprocess
+import sys
+
+from conftest import listar
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'LimpaZipUTF.py')
+
+
+def _rodar(raiz, *opcoes):
+    saida = subprocess.run([sys.executable, SCRIPT, str(raiz), '--executar', '-y', *opcoes],
+                           stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True)
+    assert saida.returncode == 0, saida.stdout
+    return saida.stdout
+
+
+def test_pipeline_incremental_mantem_o_manifesto_para_a_execucao_direta(arvore):
+    _rodar(arvore, '--pipeline', '--incremental')
+    organizada = listar(arvore)
+    # Segunda vez: a varredura do pipeline pula ZIPS e as categorias, e o que já
+    # está lá não pode sumir do manifesto por não ter sido visto
+    _rodar(arvore, '--pipeline', '--incremental')
+    with open(str(arvore / '.limpazip' / 'manifesto.json'), encoding='utf-8') as f:
+        manifesto = json.load(f)
+    assert 'Documentos/x.pdf' in manifesto['arquivos']
+    assert 'ZIPS/p.zip' in manifesto['arquivos']
+    assert 'ZIPS/p_quak/src/Main.java' in manifesto['arquivos']
+    assert 'p.zip' in manifesto['compactados']
+
+    # A execução direta seguinte não desfaz nada nem descompacta de novo
+    saida = _rodar(arvore, '--incremental')
+    assert listar(arvore) == organizada
+    assert 'MOVENDO' not in saida and 'REMOVENDO' not in saida and 'Descompactando' not in saida
@@ -0,0 +1,43 @@
+import os
+
+from conftest import escrever, listar
+
+from LimpaZipUTF import Manifesto, Plano, aplicar_plano, gerar_plano
+
+
+def _planejar_e_aplicar(raiz, tmp_path, manifesto=None):
+    caminho_plano = str(tmp_path / 'plano.jsonl')
+    gerar_plano(str(raiz), caminho_plano, verbose=False, manifesto=manifesto)
+    stats = aplicar_plano(str(raiz), caminho_plano, verbose=False)
+    _, operacoes = Plano.ler(caminho_plano)
+    return stats, list(operacoes)
+
+
+def test_aplicar_respeita_operacoes_encadeadas_no_mesmo_lote(tmp_path):
+    raiz = tmp_path / 'raiz'
+    # old.pdf já processado (fica onde está, então Documentos não é removida)
+    antigo = escrever(raiz, 'Documentos/old.pdf', b'velho')
+    manifesto = Manifesto(raiz)
+    manifesto.registrar('Documentos/old.pdf', os.stat(antigo))
+    manifesto.salvar()
+    # new.pdf sobe para a raiz e volta como new_copia.pdf (na simulação ele
+    # ainda ocupa Documentos/new.pdf): dois 'mover' seguidos, o 2º depende do 1º
+    escrever(raiz, 'Documentos/new.pdf', b'novo')
+
+    stats, operacoes = _planejar_e_aplicar(raiz, tmp_path, Manifesto(raiz))
+
+    assert [(op['op'], op['de'], op['para']) for op in operacoes] == [
+        ('mover', 'Documentos/new.pdf', 'new.pdf'),
+        ('mover', 'new.pdf', 'Documentos/new_copia.pdf'),
+    ]
+    assert stats['operacoes_ignoradas'] == 0
+    assert stats['arquivos_movidos'] == 2
+    assert listar(raiz) == ['Documentos', 'Documentos/new_copia.pdf', 'Documentos/old.pdf']
+
+
+def test_aplicar_faz_o_que_a_simulacao_planejou(tmp_path, arvore):
+    stats, operacoes = _planejar_e_aplicar(arvore, tmp_path)
+
+    destinos = sorted(op['para'] for op in operacoes if op['op'] == 'mover' and '/' in op['para'])
+    assert stats['operacoes_ignoradas'] == 0
+    assert all(caminho in listar(arvore) for caminho in destinos)